@@ -99,13 +99,16 @@ def create_app(test_config: Mapping[str, Any] = None):
         app.logger.info("Found test configuration. Loading test config...")
         app.config.from_mapping(test_config)
 
-    # Assume "DATABASE" is in the instance directory if the paths are relative.
-    config_param = "DATABASE"
-    path = Path(app.config["DATABASE"]) 
+    # Assume the file paths are in the instance directory if the paths are relative.
+    for config_param in ["DATABASE", "QUERY_CACHE_FILE", "SIMILARITY_PROFILES"]:
+        if not app.config.get(config_param):
+            continue
 
-    if not path.is_absolute():
-        app.config[config_param] = str(instance_dir / path)
-        app.logger.info(f"'{config_param}' is a relative path. Destination set to '{app.config[config_param]}'.")
+        path = Path(app.config[config_param]) 
+
+        if not path.is_absolute():
+            app.config[config_param] = str(instance_dir / path)
+            app.logger.info(f"'{config_param}' is a relative path. Destination set to '{app.config[config_param]}'.")
 
     #*----- Add before and after request functions -----*#
     app.after_request(set_response_headers)
@@ -139,6 +142,9 @@ def create_app(test_config: Mapping[str, Any] = None):
     from . import session
     app.register_blueprint(session.bp)
 
+    from . import api
+    app.register_blueprint(api.bp)
+
     #*----- Return the constructed app -----*#
     app.logger.info("Application setup has been completed.")
     return app
\ No newline at end of file
@@ -0,0 +1,18 @@
+""" The endpoint for the JSON API used by programmatic clients. """
+#***===== Imports =====***#
+#*----- Standard Library -----*#
+
+#*----- Flask & Flask Extenstions -----*#
+import flask
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+
+#***===== Create Blueprint =====***#
+bp  = flask.Blueprint("api", __name__, url_prefix="/api")
+
+#***===== Import Sub-Modules =====***#
+from . import routes
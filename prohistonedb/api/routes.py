@@ -0,0 +1,102 @@
+""" The routes for the JSON API endpoint. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+import math
+
+#*----- Flask & Flask Extenstions -----*#
+import flask
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+from ..types import Field
+from ..database import get_db
+from ..search import sql
+from ..search.cache import cached
+from ..search.routes import prepare_args, filter_from_args
+
+#***===== Constants =====***#
+# The fields that can be requested, which are the columns of the search view.
+SELECTABLE_FIELDS = Field.metadata_fields() | {Field.CATEGORY}
+
+# The fields that are returned if no fields are requested.
+DEFAULT_FIELDS = [Field.UNIPROT_ID, Field.ORGANISM, Field.CATEGORY, Field.SEQUENCE_LEN]
+
+# The default and maximum number of results per page.
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+
+#***===== Blueprint Import =====***#
+from . import bp
+
+#***===== Route Definitions =====***#
+@bp.route("/search", methods=["GET"])
+def search():
+    """
+    Return the results of a search request as JSON. Takes the same filters as the search page, with
+    only the fields in the comma separated 'fields' argument (e.g. 'fields=uid,org,seql') selected
+    from the database and 'limit' results on every 'page'. The 'next' cursor of a response can be
+    passed as 'after' instead of a page to seek to the following results, and is null on the last page.
+    The page number is null for such requests, since it isn't known where the cursor is.
+    """
+    args = flask.request.args.copy()
+
+    try:
+        names = [name.strip() for name in args.pop("fields", "").split(",") if name.strip()]
+        fields = [Field(name) for name in names] if len(names) > 0 else DEFAULT_FIELDS
+        fields = list(dict.fromkeys(fields))
+
+        for field in fields:
+            if not field in SELECTABLE_FIELDS:
+                raise ValueError(f"'{field.search_name}' is not a field that can be selected.")
+
+        limit = int(args.pop("limit", DEFAULT_LIMIT))
+        page = int(args.pop("page", 1))
+        cursor = args.pop("after", None)
+
+        if limit <= 0 or limit > MAX_LIMIT:
+            raise ValueError(f"The limit should be between 1 and {MAX_LIMIT}.")
+
+        if page <= 0:
+            raise ValueError(f"{page} is not a valid page number.")
+
+        # Pre-process query parameters into a search filter
+        filter = filter_from_args(prepare_args(args))
+
+        # Count the results to manage the paging.
+        db = get_db()
+        counts_query = sql.Query(filter=filter)
+        counts = cached(("counts",) + counts_query.cache_key, lambda: counts_query.result_counts(db))
+        max_page = max(math.ceil(counts.total / limit), 1)
+
+        if page > max_page:
+            raise ValueError(f"Can't return page {page}. This request only has {max_page} pages.")
+
+        # Only select the requested fields, seeking past the previous page if its cursor is known.
+        # One more row than requested is fetched to find out whether there is a next page.
+        if cursor is None:
+            query = sql.Query(selection=fields, filter=filter, limit=limit + 1, offset=(page - 1) * limit)
+        else:
+            query = sql.Query(selection=fields, filter=filter, limit=limit + 1, after=cursor)
+            page = None
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    rows = cached(("rows",) + query.cache_key, lambda: [dict(row) for row in query.execute(db).fetchall()])
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = query.cursor(rows[-1])
+    else:
+        next_cursor = None
+
+    # Only the requested fields are decoded.
+    return {
+        "total": counts.total,
+        "page": page,
+        "max_page": max_page,
+        "next": next_cursor,
+        "results": [{field.search_name: field.value_from_db(row[field.db_name]) for field in fields} for row in rows]
+    }, 200
@@ -10,6 +10,7 @@ import flask
 #*----- Custom packages -----*#
 
 #*----- Local imports -----*#
+from .. import database
 
 #***===== Blueprint Import =====***#
 from . import bp
@@ -18,12 +19,32 @@ from . import bp
 @bp.route('/overview', methods=["GET"])
 def overview():
     """ Render an overview page for all the categories. """
-    return flask.render_template('pages/categories.html.j2')
+    return flask.render_template('pages/categories.html.j2', category_statistics=database.get_category_statistics())
 
 @bp.route("/<id>", methods=["GET"])
 def with_id(id: int):
     """ Render a page for a specific category. """
-    return flask.render_template("pages/categories.html.j2", id=id)
+    return flask.render_template(
+        "pages/categories.html.j2",
+        id=id,
+        category_statistics=database.get_category_statistics(),
+        bin_size=database.LENGTH_HISTOGRAM_BIN_SIZE
+    )
+
+@bp.route("/statistics", methods=["GET"])
+def statistics():
+    """ Return the statistics of the entries in all the categories as JSON, keyed by category ID. """
+    return {str(id): category_statistics.to_json() for (id, category_statistics) in database.get_category_statistics().items()}, 200
+
+@bp.route("/<int:id>/statistics", methods=["GET"])
+def statistics_with_id(id: int):
+    """ Return the statistics of the entries in a specific category as JSON. """
+    category_statistics = database.get_category_statistics().get(id)
+
+    if category_statistics is None:
+        flask.abort(404)
+
+    return category_statistics.to_json(), 200
 
 @bp.route("/viewer/<id>", methods=["GET"])
 def viewer_with_id(id: int):
@@ -2,11 +2,21 @@
 #***===== Imports =====***#
 #*----- Standard Library -----*#
 from pathlib import Path
-from typing import Union
+from typing import Union, Mapping, Sequence, Optional, Callable, Any, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+import collections
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
 
 #*----- Flask & Flask Extenstions -----*#
 import flask
 from flask import Flask, json
+from werkzeug.local import LocalProxy
 
 #*----- Other External packages -----*#
 import click
@@ -14,45 +24,311 @@ import click
 #*----- Custom packages -----*#
 
 #*----- Local imports -----*#
-from . import connections
-from .models import Multimer, Category
+from . import connections, ingest, profiles
+from .models import Multimer, Category, Lineage, FieldStatistics, CategoryStatistics
 
 from ..types import Field, FieldType
 
+#***===== Constants =====***#
+FULLTEXT_TABLE = "search_fts"
+VALUES_TABLE = "metadata_values"
+INFO_TABLE = "info"
+TAXA_TABLE = "taxa"
+CLOSURE_TABLE = "taxon_closure"
+KMER_TABLE = "sequence_kmers"
+STATISTICS_TABLE = "field_statistics"
+VOCABULARY_TABLE = "vocabulary"
+CATEGORY_STATISTICS_TABLE = "category_statistics"
+
+# The suffixes of the files next to the database file that hold a database that is being built, a
+# built database that is about to replace the database file and the database that it replaced.
+STAGING_SUFFIX = ".staging"
+NEW_SUFFIX = ".new"
+PREVIOUS_SUFFIX = ".previous"
+
+# The width of the sequence length bins in the histograms of the category statistics.
+LENGTH_HISTOGRAM_BIN_SIZE = 20
+
+# Guards the values that are shared by all requests of a server process.
+_APP_CACHE_LOCK = threading.Lock()
+
 #***===== Initialization & Teardown =====***#
 def init_app(app: Flask):
     """ Register the database teardown and CLI commands onto the Flask app. """
     app.teardown_appcontext(teardown_db)
     app.register_blueprint(bp)
 
+def get_db_pool() -> Optional[connections.ConnectionPool]:
+    """ Returns the pool of read-only database connections of the app, setting it up on first use. Returns None if pooling is disabled. """
+    app = flask.current_app
+
+    if not "database_pool" in app.extensions:
+        size = app.config.get("DATABASE_POOL_SIZE", 0)
+
+        if size > 0:
+            database_path = app.config["DATABASE"]
+            cache_size = app.config["DATABASE_STATEMENT_CACHE_SIZE"]
+            immutable = app.config.get("DATABASE_IMMUTABLE", False)
+            pragmas = app.config.get("DATABASE_PRAGMAS", {})
+            app.extensions["database_pool"] = connections.ConnectionPool(
+                lambda: connections.SQLiteConnection(database_path, cache_size, read_only=True, immutable=immutable, pragmas=pragmas),
+                size,
+                app.config.get("DATABASE_POOL_TIMEOUT", 10)
+            )
+        else:
+            app.extensions["database_pool"] = None
+
+    return app.extensions["database_pool"]
+
+def open_db(db_path: Union[str, Path], read_only: bool = False) -> connections.DatabaseConnection:
+    """ Opens a new connection to a database file with the pragmas of the app, which can write to it unless it is read-only. """
+    config = flask.current_app.config
+    conn = connections.SQLiteConnection(str(db_path), config["DATABASE_STATEMENT_CACHE_SIZE"], read_only=read_only, pragmas=config.get("DATABASE_PRAGMAS", {}))
+    conn.connect()
+    return conn
+
 def get_db() -> connections.DatabaseConnection:
-    """ Retrieve the Database connection from the app context. Also establishes the connection if necessary. """
+    """
+    Retrieve the Database connection from the app context. Also establishes the connection if necessary.
+    Requests use a read-only connection from the pool, while the CLI commands get their own connection
+    that can write to the database.
+    """
     if "db" not in flask.g:
-        flask.g.db = connections.SQLiteConnection(flask.current_app.config["DATABASE"])
-        flask.g.db.connect()
+        pool = get_db_pool() if flask.has_request_context() else None
+
+        if pool is None:
+            flask.g.db = open_db(flask.current_app.config["DATABASE"])
+        else:
+            try:
+                flask.g.db = pool.acquire()
+            except connections.PoolTimeoutError as e:
+                flask.current_app.logger.error(str(e))
+                flask.abort(503)
+
+            flask.g.db_pool = pool
     
     return flask.g.db
 
+def use_bulk_load_profile():
+    """
+    Sets the pragmas of the bulk-load profile on the database connection of the app context, which
+    trade durability for speed while the CLI commands fill the database.
+
+    WARNING: Currently sqlite only due to the use of pragmas!
+    """
+    get_db().set_pragmas(flask.current_app.config.get("DATABASE_BULK_PRAGMAS", {}))
+
 def teardown_db(exception: Exception):
-    """ Close down the database connection stored in the application context. """
+    """ Return the database connection stored in the application context to its pool, or close it down if it isn't pooled. """
     db = flask.g.pop("db", None)
+    pool = flask.g.pop("db_pool", None)
 
-    if db is not None:
+    if db is None:
+        return
+    elif pool is None:
         db.close()
+    else:
+        pool.release(db)
 
 #***===== Request level functions =====***#
 def get_categories() -> dict[int, Category]:
-    """ Returns the categories in the database from the app context. Queries the database if they haven't been set yet. """
-    if "categories" not in flask.g:
-        sql = "SELECT * FROM categories ORDER BY name"
-        db = get_db()
-        results = db.execute(sql)
-        categories = results.fetchall()
-        flask.g.categories = {category["id"]:Category(**category) for category in categories}
+    """ Returns the categories in the database, which are shared by all requests until the data changes. The result shouldn't be modified. """
+    def compute() -> dict[int, Category]:
+        results = get_db().execute("SELECT * FROM categories ORDER BY name").fetchall()
+        return {category["id"]:Category(**category) for category in results}
+
+    return get_app_cached("categories", compute)
+
+def get_max_sequence_length() -> int:
+    """ Returns the length of the longest sequence in the database, which is shared by all requests until the data changes. """
+    def compute() -> int:
+        max_seq_len = get_db().execute(f"SELECT MAX({Field.SEQUENCE_LEN.db_name}) FROM search").fetchone()[0]
+        return max_seq_len if max_seq_len else 0
+
+    return get_app_cached("max_seq_len", compute)
+
+def get_lineage(organism_id: str) -> list[Lineage]:
+    """ Returns the lineage of an organism from the taxonomy tables, starting with the lowest rank. """
+    sql = f"SELECT {TAXA_TABLE}.* FROM {CLOSURE_TABLE} JOIN {TAXA_TABLE} ON {TAXA_TABLE}.taxon_id = {CLOSURE_TABLE}.ancestor_id "
+    sql += f"WHERE {CLOSURE_TABLE}.descendant_id = ? ORDER BY {CLOSURE_TABLE}.depth"
+
+    db = get_db()
+    results = db.execute(sql, [organism_id]).fetchall()
+    return [Lineage(taxon["taxon_id"], taxon["name"], taxon["rank"], bool(taxon["hidden"])) for taxon in results]
+
+def _get_file_signature() -> tuple:
+    """ Returns the identity, size and modification time of the database file and its write-ahead log, which change whenever the data is written. """
+    signature = []
+
+    for path in [flask.current_app.config["DATABASE"], flask.current_app.config["DATABASE"] + "-wal"]:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+
+    return tuple(signature)
+
+def _query_data_version() -> str:
+    """ Returns the version of the data from the info table of the database. """
+    try:
+        result = get_db().execute(f"SELECT value FROM {INFO_TABLE} WHERE name = 'data_version'").fetchone()
+        return result[0]
+    except Exception:
+        # Databases that predate the info table can only change through 'flask database update', which adds it.
+        flask.current_app.logger.debug(f"No data version found in the database. Falling back to an empty version.")
+        return ""
+
+def get_data_version() -> str:
+    """
+    Returns the version of the data in the database from the app context. The version changes whenever
+    the data is changed by the CLI commands. Requests only query the database for it when the database
+    file has been written to since the last time it was queried by the server process.
+    """
+    if "data_version" not in flask.g:
+        if flask.has_request_context():
+            app = flask.current_app
+
+            # Take the signature before the query, so a write in between leads to another query next time.
+            signature = _get_file_signature()
+            known = app.extensions.get("data_version")
+
+            # The connection of the request may have been opened on a file that has been replaced since.
+            current = not signature[0] is None and get_db().file_id == signature[0][:2]
+
+            if current and not known is None and known[0] == signature:
+                flask.g.data_version = known[1]
+            else:
+                flask.g.data_version = _query_data_version()
+
+                # Only share the version if it belongs to the file at the path, which a swap during the query would have replaced.
+                if current and _get_file_signature() == signature:
+                    app.extensions["data_version"] = (signature, flask.g.data_version)
+        else:
+            # The CLI commands change the data themselves, so they always query it.
+            flask.g.data_version = _query_data_version()
     
-    return flask.g.categories
+    return flask.g.data_version
+
+def get_app_cached(name: str, compute: Callable[[], Any]) -> Any:
+    """
+    Returns a value derived from the data in the database that is shared by all requests of the server
+    process. The value is computed on first use and again once the data version has changed.
+    """
+    app = flask.current_app
+    version = get_data_version()
+
+    with _APP_CACHE_LOCK:
+        cache_version, values = app.extensions.get("data_cache", (None, {}))
+
+        if cache_version == version and name in values:
+            return values[name]
+
+    # Compute the value outside of the lock, since other requests don't have to wait for it.
+    value = compute()
+
+    with _APP_CACHE_LOCK:
+        cache_version, values = app.extensions.get("data_cache", (None, {}))
+
+        if cache_version != version:
+            values = {}
+            app.extensions["data_cache"] = (version, values)
+
+        values[name] = value
+
+    return value
+
+def get_kmer_size() -> Optional[int]:
+    """
+    Returns the length of the k-mers in the k-mer index of the sequences from the app context. Queries
+    the database if it hasn't been set yet. Returns None if the database doesn't have a k-mer index.
+    """
+    if "kmer_size" not in flask.g:
+        db = get_db()
+
+        try:
+            result = db.execute(f"SELECT value FROM {INFO_TABLE} WHERE name = 'kmer_size'").fetchone()
+            flask.g.kmer_size = None if result is None else int(result[0])
+        except Exception:
+            flask.current_app.logger.debug(f"No k-mer index found in the database.")
+            flask.g.kmer_size = None
+
+    return flask.g.kmer_size
+
+def get_field_statistics() -> dict[str, FieldStatistics]:
+    """
+    Returns the statistics of the search fields per search name, which are shared by all requests until
+    the data changes. Returns an empty dictionary if there are no statistics.
+    """
+    def compute() -> dict[str, FieldStatistics]:
+        try:
+            results = get_db().execute(f"SELECT * FROM {STATISTICS_TABLE}").fetchall()
+            return {row["field"]: FieldStatistics(row["field"], row["entries"], row["rows"], row["distinct_values"], bool(row["indexed"])) for row in results}
+        except Exception:
+            flask.current_app.logger.debug(f"No field statistics found in the database.")
+            return {}
+
+    return get_app_cached("field_statistics", compute)
+
+def get_category_statistics() -> dict[int, CategoryStatistics]:
+    """
+    Returns the statistics of the entries per category ID, which are shared by all requests until the
+    data changes. Returns an empty dictionary if there are no statistics.
+    """
+    def compute() -> dict[int, CategoryStatistics]:
+        try:
+            results = get_db().execute(f"SELECT * FROM {CATEGORY_STATISTICS_TABLE}").fetchall()
+        except Exception:
+            flask.current_app.logger.debug(f"No category statistics found in the database.")
+            return {}
+
+        return {row["category_id"]: CategoryStatistics(
+            row["category_id"],
+            row["entries"],
+            row["min_seq_len"],
+            row["max_seq_len"],
+            [tuple(bin) for bin in json.loads(row["length_histogram"])],
+            json.loads(row["superkingdoms"]),
+            {Multimer(multimer): entries for (multimer, entries) in json.loads(row["multimers"]).items()}
+        ) for row in results}
+
+    return get_app_cached("category_statistics", compute)
+
+def get_suggestions(field: Field, prefix: str, limit: int) -> list[tuple[str, int]]:
+    """ Returns the terms of a field in the vocabulary table that start with the prefix, together with their number of entries, starting with the most common one. """
+    # Any term that starts with the prefix sorts between the prefix and the prefix followed by the highest possible character.
+    sql = f"SELECT term, entries FROM {VOCABULARY_TABLE} WHERE field = ? AND term >= ? AND term < ? ORDER BY entries DESC, term LIMIT ?"
+
+    db = get_db()
+    results = db.execute(sql, [field.search_name, prefix, prefix + "\U0010ffff", limit]).fetchall()
+    return [(row[0], row[1]) for row in results]
+
+def bump_data_version():
+    """ Sets a new version for the data in the database, which invalidates anything cached for the previous version. Doesn't commit. """
+    conn = get_db()
+    conn.execute(f"UPDATE {INFO_TABLE} SET value = ? WHERE name = 'data_version'", [uuid.uuid4().hex])
+
+#***===== Sequence Functions =====***#
+def sequence_kmers(sequence: str, kmer_size: int) -> set[str]:
+    """ Returns the distinct k-mers of the given length in an amino acid sequence. """
+    sequence = sequence.upper()
+    return {sequence[i:i+kmer_size] for i in range(len(sequence) - kmer_size + 1)}
 
 #***===== Database Set-Up Functions =====***#
+def init_info_table():
+    """ Create the table for information about the database itself, like the version of its data. """
+    conn = get_db()
+
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {INFO_TABLE} (
+            name {conn.sql_field_type(FieldType.PRIMARY_TEXT)},
+            value {conn.sql_field_type(FieldType.TEXT)}
+        )
+    """)
+    conn.execute(f"INSERT OR IGNORE INTO {INFO_TABLE} (name, value) VALUES ('data_version', ?)", [uuid.uuid4().hex])
+
+    conn.commit()
+
 def init_metadata_table(name: str = "metadata"):
     """
     A function that generates an empty metadata table.
@@ -72,16 +348,14 @@ def init_metadata_table(name: str = "metadata"):
         "pdb_ids": FieldType.IDS,
         "rel_path": FieldType.TEXT,
         "ranks": FieldType.TEXT_OPTIONAL,
-        "publications": FieldType.TEXT_OPTIONAL
+        "publications": FieldType.TEXT_OPTIONAL,
+        "content_hash": FieldType.TEXT_OPTIONAL
     }
 
     all_columns = search_columns | info_columns
     
     for col, typ in all_columns.items():
         sql += f"    {col} {conn.sql_field_type(typ)},\n"
-
-        if col == Field.LINEAGE.db_name:
-            sql += f"    {Field.LINEAGE.db_name}_json {conn.sql_field_type(FieldType.TEXT)},\n"
     
     sql += f"    last_updated {conn.sql_field_type(FieldType.TIMESTAMP)} DEFAULT CURRENT_TIMESTAMP,\n"
     sql += f"    FOREIGN KEY ({Field.CATEGORY_ID.db_name}) REFERENCES categories(id)\n"
@@ -114,12 +388,252 @@ def init_search_view():
 
     conn.commit()
 
+def init_taxonomy_tables():
+    """
+    Create the taxonomy tables. The taxa table holds every taxon only once, while the closure table
+    links every taxon to all of its ancestors, including the organisms of the entries in the metadata table.
+    """
+
+    conn = get_db()
+
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TAXA_TABLE} (
+            taxon_id {conn.sql_field_type(FieldType.PRIMARY_TEXT)},
+            name {conn.sql_field_type(FieldType.TEXT)},
+            rank {conn.sql_field_type(FieldType.TEXT_OPTIONAL)},
+            hidden {conn.sql_field_type(FieldType.INTEGER)} CHECK( hidden IN (0, 1) )
+        )
+    """)
+
+    # The depth is the number of ranks between the ancestor and the descendant.
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CLOSURE_TABLE} (
+            ancestor_id {conn.sql_field_type(FieldType.TEXT_ID)},
+            descendant_id {conn.sql_field_type(FieldType.TEXT_ID)},
+            depth {conn.sql_field_type(FieldType.INTEGER)},
+            PRIMARY KEY (ancestor_id, descendant_id)
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CLOSURE_TABLE}_descendant_id ON {CLOSURE_TABLE}(descendant_id, depth)")
+
+    # Lineage searches match the names of the taxa regardless of their case.
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TAXA_TABLE}_name ON {TAXA_TABLE}(name COLLATE NOCASE)")
+
+    conn.commit()
+
+def init_fulltext_index():
+    """
+    Create the full-text index for the text search fields, together with the triggers that keep it
+    in sync with the metadata table. The index is (re)built from the current metadata table.
+
+    WARNING: Currently sqlite only due to the FTS5 virtual table!
+    """
+
+    conn = get_db()
+
+    columns = [field.db_name for field in sorted(Field.fulltext_fields(), key=lambda field: field.db_name)]
+    column_string = ", ".join(columns)
+    new_string = ", ".join([f"new.{column}" for column in columns])
+    old_string = ", ".join([f"old.{column}" for column in columns])
+
+    # The trigram tokenizer allows the index to be used for the substring matches that LIKE used to do.
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FULLTEXT_TABLE} USING fts5(
+            {column_string},
+            content='metadata',
+            tokenize='trigram'
+        )
+    """)
+
+    # Keep the external content index in sync with any changes to the metadata table.
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FULLTEXT_TABLE}_insert AFTER INSERT ON metadata BEGIN
+            INSERT INTO {FULLTEXT_TABLE} (rowid, {column_string}) VALUES (new.rowid, {new_string});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FULLTEXT_TABLE}_delete AFTER DELETE ON metadata BEGIN
+            INSERT INTO {FULLTEXT_TABLE} ({FULLTEXT_TABLE}, rowid, {column_string}) VALUES ('delete', old.rowid, {old_string});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {FULLTEXT_TABLE}_update AFTER UPDATE ON metadata BEGIN
+            INSERT INTO {FULLTEXT_TABLE} ({FULLTEXT_TABLE}, rowid, {column_string}) VALUES ('delete', old.rowid, {old_string});
+            INSERT INTO {FULLTEXT_TABLE} (rowid, {column_string}) VALUES (new.rowid, {new_string});
+        END
+    """)
+
+    # Rebuild the index from whatever is currently in the metadata table.
+    conn.execute(f"INSERT INTO {FULLTEXT_TABLE} ({FULLTEXT_TABLE}) VALUES ('rebuild')")
+
+    conn.commit()
+
+def init_values_table():
+    """
+    Create the table with the separate values of the metadata fields that hold a list of values,
+    together with the triggers that keep it in sync with the metadata table. The table is (re)filled
+    from the current metadata table.
+
+    WARNING: Currently sqlite only due to the `json_each` function!
+    """
+
+    conn = get_db()
+
+    columns = sorted([field.db_name for field in Field.multi_value_fields()] + ["pdb_ids"])
+    uid = Field.UNIPROT_ID.db_name
+
+    # The values are case insensitive, which also allows an index to be used for prefix matches with LIKE.
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VALUES_TABLE} (
+            field {conn.sql_field_type(FieldType.TEXT)},
+            value {conn.sql_field_type(FieldType.TEXT)} COLLATE NOCASE,
+            {uid} {conn.sql_field_type(FieldType.TEXT)}
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{VALUES_TABLE}_value ON {VALUES_TABLE}(field, value)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{VALUES_TABLE}_{uid} ON {VALUES_TABLE}({uid})")
+
+    # Keep the values in sync with any changes to the metadata table.
+    insert_string = "\n".join([f"INSERT INTO {VALUES_TABLE} (field, value, {uid}) SELECT '{column}', value, new.{uid} FROM json_each(new.{column});" for column in columns])
+    delete_string = f"DELETE FROM {VALUES_TABLE} WHERE {uid} = old.{uid};"
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {VALUES_TABLE}_insert AFTER INSERT ON metadata BEGIN
+            {insert_string}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {VALUES_TABLE}_delete AFTER DELETE ON metadata BEGIN
+            {delete_string}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {VALUES_TABLE}_update AFTER UPDATE ON metadata BEGIN
+            {delete_string}
+            {insert_string}
+        END
+    """)
+
+    # Refill the table from whatever is currently in the metadata table.
+    conn.execute(f"DELETE FROM {VALUES_TABLE}")
+
+    for column in columns:
+        conn.execute(f"INSERT INTO {VALUES_TABLE} (field, value, {uid}) SELECT '{column}', json_each.value, metadata.{uid} FROM metadata, json_each(metadata.{column})")
+
+    conn.commit()
+
+def init_kmer_index():
+    """
+    Create the k-mer index of the sequences in the metadata table, together with the trigger that
+    removes the k-mers of deleted entries. The length of the k-mers is taken from the app config and
+    stored in the info table, so that searches use the same length as the index. The index is
+    (re)filled from the current metadata table.
+
+    WARNING: Currently sqlite only due to the `WITHOUT ROWID` table!
+    """
+
+    conn = get_db()
+    uid = Field.UNIPROT_ID.db_name
+    kmer_size = int(flask.current_app.config["SEQUENCE_KMER_SIZE"])
+
+    if kmer_size < 1:
+        raise ValueError(f"The k-mer size should be at least 1, but it is {kmer_size}.")
+
+    # Every k-mer is stored once per entry, which makes the primary key the posting list of the k-mer.
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {KMER_TABLE} (
+            kmer {conn.sql_field_type(FieldType.TEXT)},
+            {uid} {conn.sql_field_type(FieldType.TEXT)},
+            PRIMARY KEY (kmer, {uid})
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{KMER_TABLE}_{uid} ON {KMER_TABLE}({uid})")
+
+    # New k-mers are added during ingest, but the k-mers of deleted entries are removed automatically.
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {KMER_TABLE}_delete AFTER DELETE ON metadata BEGIN
+            DELETE FROM {KMER_TABLE} WHERE {uid} = old.{uid};
+        END
+    """)
+
+    conn.execute(f"INSERT OR REPLACE INTO {INFO_TABLE} (name, value) VALUES ('kmer_size', ?)", [str(kmer_size)])
+    flask.g.pop("kmer_size", None)
+
+    # Refill the index from whatever is currently in the metadata table.
+    conn.execute(f"DELETE FROM {KMER_TABLE}")
+    results = conn.execute(f"SELECT {uid}, {Field.SEQUENCE.db_name} FROM metadata").fetchall()
+    update_db_kmers({row[0]: row[1] for row in results})
+
+    conn.commit()
+
+def init_statistics_table():
+    """ Create the table with the statistics of the search fields that are used to estimate the selectivity of search filters. """
+
+    conn = get_db()
+
+    # The rows are the number of values of the field, which can differ from the number of entries for fields with lists of values.
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATISTICS_TABLE} (
+            field {conn.sql_field_type(FieldType.PRIMARY_TEXT)},
+            entries {conn.sql_field_type(FieldType.INTEGER)},
+            rows {conn.sql_field_type(FieldType.INTEGER)},
+            distinct_values {conn.sql_field_type(FieldType.INTEGER)},
+            indexed {conn.sql_field_type(FieldType.INTEGER)} CHECK( indexed IN (0, 1) )
+        )
+    """)
+
+    conn.commit()
+
+def init_category_statistics_table():
+    """ Create the table with the aggregated statistics of the entries in every category, which the categories pages are rendered from. """
+
+    conn = get_db()
+
+    # The histogram, superkingdoms and multimers are stored as JSON, since they are always read as a whole.
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CATEGORY_STATISTICS_TABLE} (
+            category_id {conn.sql_field_type(FieldType.PRIMARY_INTEGER)} REFERENCES categories(id),
+            entries {conn.sql_field_type(FieldType.INTEGER)},
+            min_seq_len {conn.sql_field_type(FieldType.INTEGER)},
+            max_seq_len {conn.sql_field_type(FieldType.INTEGER)},
+            length_histogram {conn.sql_field_type(FieldType.TEXT)},
+            superkingdoms {conn.sql_field_type(FieldType.TEXT)},
+            multimers {conn.sql_field_type(FieldType.TEXT)}
+        )
+    """)
+
+    conn.commit()
+
+def init_vocabulary_table():
+    """
+    Create the vocabulary table with the distinct terms of the fields for which the search bar suggests
+    completions. The primary key keeps the terms of a field in (case insensitive) prefix order.
+
+    WARNING: Currently sqlite only due to the `WITHOUT ROWID` table!
+    """
+
+    conn = get_db()
+
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VOCABULARY_TABLE} (
+            field {conn.sql_field_type(FieldType.TEXT)},
+            term {conn.sql_field_type(FieldType.TEXT)} COLLATE NOCASE,
+            entries {conn.sql_field_type(FieldType.INTEGER)},
+            PRIMARY KEY (field, term)
+        ) WITHOUT ROWID
+    """)
+
+    conn.commit()
 
 def init_db():
     """ Creates a database with empty tables and corresponding indexes. """ 
     # Create the database
     conn = get_db()
 
+    # Create the info table
+    flask.current_app.logger.info(f"Creating the info table.")
+    init_info_table()
+
     # Create the categories table
     flask.current_app.logger.info(f"Creating the categories table.")
     multimer_options =  "', '".join([multimer.value for multimer in Multimer])
@@ -149,6 +663,34 @@ def init_db():
     # Create a view for accessing the necessary data in a search
     init_search_view()
 
+    # Create the taxonomy tables for the lineages of the organisms
+    flask.current_app.logger.info(f"Creating the taxonomy tables.")
+    init_taxonomy_tables()
+
+    # Create the full-text index for the text search fields
+    flask.current_app.logger.info(f"Creating the full-text index for the metadata table.")
+    init_fulltext_index()
+
+    # Create the table with the separate values of the fields that hold lists of values
+    flask.current_app.logger.info(f"Creating the values table for the metadata table.")
+    init_values_table()
+
+    # Create the k-mer index for the sequence searches
+    flask.current_app.logger.info(f"Creating the k-mer index for the sequences.")
+    init_kmer_index()
+
+    # Create the table with the statistics of the search fields
+    flask.current_app.logger.info(f"Creating the statistics table for the search fields.")
+    init_statistics_table()
+
+    # Create the vocabulary table for the suggestions of the search bar
+    flask.current_app.logger.info(f"Creating the vocabulary table for the search suggestions.")
+    init_vocabulary_table()
+
+    # Create the table with the statistics of the categories
+    flask.current_app.logger.info(f"Creating the statistics table for the categories.")
+    init_category_statistics_table()
+
 def get_column_names_for_table(table_name: str) -> set[str]:
     """
     Returns a set of the column names for a given table name.
@@ -161,11 +703,38 @@ def get_column_names_for_table(table_name: str) -> set[str]:
     result_metadata = conn.execute(f"PRAGMA table_info({table_name})")
     return {row[1] for row in result_metadata.fetchall()}
 
-def db_vc_update():
+def get_table_names() -> set[str]:
+    """
+    Returns a set of the names of all tables in the database.
+
+    WARNING: Currently sqlite only due to `sqlite_master` query!
+    """
+
+    conn = get_db()
+
+    result = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return {row[0] for row in result.fetchall()}
+
+def get_indexed_column_names(table_name: str) -> set[str]:
+    """
+    Returns a set of the names of the columns of a given table that are the first column of an index.
+
+    WARNING: Currently sqlite only due to `PRAGMA` query!
+    """
+
+    conn = get_db()
+    column_names = set()
+
+    for index in conn.execute(f"PRAGMA index_list({table_name})").fetchall():
+        column_names |= {row[2] for row in conn.execute(f"PRAGMA index_info({index[1]})").fetchall() if row[0] == 0}
+
+    return column_names
+
+def db_vc_update() -> bool:
     """
     A 'version control' function for that start of database updates that require more than just
     adding new data. For example, Adding new tables and columns or changing the constraints on an
-    existing column.
+    existing column. Returns whether anything had to be changed.
 
     WARNING: Currently sqlite only due to `PRAGMA` query!
     """
@@ -173,6 +742,9 @@ def db_vc_update():
     conn = get_db()
     metadata_columns = get_column_names_for_table("metadata")
 
+    # Every change to the tables, indexes and triggers increases the schema version.
+    schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+
     # 2025 update
     gene_names_field = Field.GENE_NAMES
     new_table_required = False
@@ -195,7 +767,19 @@ def db_vc_update():
         conn.execute(f"ALTER TABLE metadata ADD COLUMN {protein_names_field.db_name} {conn.sql_field_type(protein_names_field.type.to_optional_field_type())} DEFAULT '[]'")
         new_table_required = True
 
-    
+    # Delta update: entries without a content hash are always treated as changed.
+    if not "content_hash" in metadata_columns:
+        conn.execute(f"ALTER TABLE metadata ADD COLUMN content_hash {conn.sql_field_type(FieldType.TEXT_OPTIONAL)}")
+
+    # Taxonomy update, which only creates the tables and indexes that are missing.
+    init_taxonomy_tables()
+
+    # Move the lineages that used to be stored with every entry into the taxonomy tables.
+    if "lineage_json" in metadata_columns:
+        results = conn.execute(f"SELECT DISTINCT {Field.ORGANISM_ID.db_name}, lineage_json FROM metadata").fetchall()
+        update_db_taxonomy({row[0]: json.loads(row[1]) for row in results})
+        new_table_required = True
+
     conn.commit()
 
     # Generate a new metadata table if needed
@@ -214,8 +798,56 @@ def db_vc_update():
         init_metadata_indexes()
         init_search_view()
 
-def update_db_categories(filename: Path):
-    """ Update the database with the data in the categories JSON file. """
+    # Info table update
+    if INFO_TABLE not in get_table_names():
+        init_info_table()
+
+    # Full-text index update
+    # The triggers on the metadata table are dropped together with the table, so they need to be recreated after a new table.
+    # The index itself is recreated as well, since its columns follow those of the metadata table.
+    # It is also recreated when its columns are no longer those of the full-text fields, e.g. since sequences moved to the k-mer index.
+    fulltext_columns = {field.db_name for field in Field.fulltext_fields()}
+
+    if new_table_required or (FULLTEXT_TABLE in get_table_names() and get_column_names_for_table(FULLTEXT_TABLE) != fulltext_columns):
+        for trigger in ["insert", "delete", "update"]:
+            conn.execute(f"DROP TRIGGER IF EXISTS {FULLTEXT_TABLE}_{trigger}")
+
+        conn.execute(f"DROP TABLE IF EXISTS {FULLTEXT_TABLE}")
+
+    if FULLTEXT_TABLE not in get_table_names():
+        init_fulltext_index()
+
+    # Values table update
+    if new_table_required or VALUES_TABLE not in get_table_names():
+        init_values_table()
+
+    # K-mer index update
+    # The index is also rebuilt when the configured length of the k-mers has changed.
+    if new_table_required or KMER_TABLE not in get_table_names() or get_kmer_size() != flask.current_app.config["SEQUENCE_KMER_SIZE"]:
+        init_kmer_index()
+
+    # Statistics table update
+    if STATISTICS_TABLE not in get_table_names():
+        init_statistics_table()
+
+    # Vocabulary table update
+    if VOCABULARY_TABLE not in get_table_names():
+        init_vocabulary_table()
+
+    # Category statistics table update
+    if CATEGORY_STATISTICS_TABLE not in get_table_names():
+        init_category_statistics_table()
+
+    return conn.execute("PRAGMA schema_version").fetchone()[0] != schema_version
+
+def update_db_categories(filename: Path) -> int:
+    """
+    Update the database with the data in the categories JSON file. New categories are inserted and
+    existing ones are updated by name in a single statement. Returns the number of categories that
+    have been added or changed.
+
+    WARNING: Currently sqlite only due to `json_each` and the `ON CONFLICT` clause!
+    """
     # Get a database connection
     conn = get_db()
 
@@ -223,156 +855,558 @@ def update_db_categories(filename: Path):
     with open(filename, 'r') as f:
         categories_json = json.load(f)
 
-        # Load all the categories data into a list
-        categories_new = []
-        categories_update = []
+    for category in categories_json:
+        if not "preferredMultimer" in categories_json[category]:
+            raise ValueError(f"Category '{category}' doesn't have a preferred multimer.")
 
-        for category in categories_json:
-            # Retrieve the data from the JSON object
-            category_json = categories_json[category]
+    # The short name defaults to NULL and whether a category has a page to false.
+    # The 'WHERE true' is needed for SQLite to tell the 'ON CONFLICT' clause apart from a join.
+    sql = "INSERT INTO categories (name, preferred_multimer, short_name, has_page)\n"
+    sql += "SELECT key, json_extract(value, '$.preferredMultimer'), json_extract(value, '$.shortName'), COALESCE(json_extract(value, '$.hasPage'), 0)\n"
+    sql += "FROM json_each(?) WHERE true\n"
+    sql += "ON CONFLICT (name) DO UPDATE SET preferred_multimer = excluded.preferred_multimer, short_name = excluded.short_name, has_page = excluded.has_page\n"
+    sql += "WHERE (preferred_multimer, short_name, has_page) IS NOT (excluded.preferred_multimer, excluded.short_name, excluded.has_page)"
 
-            data = {}
-            data["name"] = category
-            data["preferred_multimer"] = category_json["preferredMultimer"]
-            if "shortName" in category_json:
-                data["short_name"] = category_json["shortName"]
-            else:
-                data["short_name"] = None
-            if "hasPage" in category_json:
-                data["has_page"] = int(category_json["hasPage"])
-            else:
-                data["has_page"] = int(False)
+    conn.execute(sql, [json.dumps(categories_json)])
+    changed = conn.execute("SELECT changes()").fetchone()[0]
 
-            # Determine whether the category already exists and store the data in the correct list
-            if conn.execute("SELECT id FROM categories WHERE name = ?", [category]).fetchone():
-                categories_update.append(data)
-            else:
-                categories_new.append(data)
+    # Commit the changes
+    if changed > 0:
+        bump_data_version()
+
+    conn.commit()
+    return changed
+
+def update_db_taxonomy(lineages: Mapping[str, Sequence[Mapping]]):
+    """
+    Update the taxonomy tables with the lineages of organisms. Takes a mapping from the taxon ID of
+    each organism to its lineage in the UniProt JSON format, starting with the highest rank. Doesn't commit.
+    """
+    conn = get_db()
 
-        # Insert the new categories into the database.
-        if len(categories_new) > 0:
-            sql = "INSERT INTO categories (name, preferred_multimer, short_name, has_page) VALUES (:name, :preferred_multimer, :short_name, :has_page)"
-            conn.executemany(sql, categories_new)
+    taxa = {}
+    closure = []
 
-        # Update the existing entries in the database.
-        if len(categories_update) > 0:
-            sql = "UPDATE categories SET preferred_multimer = :preferred_multimer, short_name = :short_name, has_page = :has_page WHERE name = :name"
-            conn.executemany(sql, categories_update)
+    for organism_id, lineage in lineages.items():
+        taxon_ids = [str(taxon["taxonId"]) for taxon in lineage] + [str(organism_id)]
 
-        # Commit the changes
-        conn.commit()
+        for taxon in lineage:
+            taxa[str(taxon["taxonId"])] = {"taxon_id": str(taxon["taxonId"]), "name": taxon["scientificName"], "rank": taxon["rank"], "hidden": int(taxon["hidden"])}
+
+        # Link every taxon in the lineage to all of the taxa below it, down to the organism itself.
+        for i, ancestor_id in enumerate(taxon_ids):
+            for depth, descendant_id in enumerate(taxon_ids[i+1:], start=1):
+                closure.append({"ancestor_id": ancestor_id, "descendant_id": descendant_id, "depth": depth})
+
+    if len(taxa) > 0:
+        conn.executemany(f"INSERT OR REPLACE INTO {TAXA_TABLE} (taxon_id, name, rank, hidden) VALUES (:taxon_id, :name, :rank, :hidden)", list(taxa.values()))
+
+    # The lineage of an organism may have changed, so its old ancestors are removed first.
+    if len(lineages) > 0:
+        conn.executemany(f"DELETE FROM {CLOSURE_TABLE} WHERE descendant_id = ?", [[str(organism_id)] for organism_id in lineages])
+
+    if len(closure) > 0:
+        conn.executemany(f"INSERT OR REPLACE INTO {CLOSURE_TABLE} (ancestor_id, descendant_id, depth) VALUES (:ancestor_id, :descendant_id, :depth)", closure)
+
+def update_db_kmers(sequences: Mapping[str, str]):
+    """
+    Add the k-mers of the sequences to the k-mer index. Takes a mapping from the UniProt ID of each
+    entry to its sequence. The k-mers of replaced entries are expected to be removed by the delete
+    trigger of the metadata table. Doesn't commit.
+    """
+    conn = get_db()
+    kmer_size = get_kmer_size()
+
+    kmers = [[kmer, uid] for uid, sequence in sequences.items() for kmer in sequence_kmers(sequence, kmer_size)]
+
+    if len(kmers) > 0:
+        conn.executemany(f"INSERT OR IGNORE INTO {KMER_TABLE} (kmer, {Field.UNIPROT_ID.db_name}) VALUES (?, ?)", kmers)
+
+def update_db_profiles():
+    """ Recompute the k-mer profiles of all the sequences in the metadata table that are used for similarity searches. """
+    conn = get_db()
+
+    # The sequences are read one at a time while the profiles are written.
+    count = conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+    results = conn.execute(f"SELECT {Field.UNIPROT_ID.db_name}, {Field.SEQUENCE.db_name} FROM metadata ORDER BY {Field.UNIPROT_ID.db_name}")
+    profiles.write_profiles(((row[0], row[1]) for row in results), count, int(flask.current_app.config["SIMILARITY_KMER_SIZE"]))
+
+def update_db_statistics():
+    """
+    Recompute the statistics of the search fields from the current data, together with the statistics
+    that the query planner uses to choose between indexes.
+
+    WARNING: Currently sqlite only due to the `ANALYZE` statement!
+    """
+    conn = get_db()
+
+    entries = conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+    indexed_columns = get_indexed_column_names("metadata")
+    has_kmer_index = KMER_TABLE in get_table_names()
+    statistics = []
+
+    for field in (Field.search_fields() | Field.facet_fields()) & Field.metadata_fields():
+        if field in Field.multi_value_fields():
+            sql = f"SELECT COUNT(*), COUNT(DISTINCT value) FROM {VALUES_TABLE} WHERE field = ?"
+            rows, distinct_values = conn.execute(sql, [field.db_name]).fetchone()
+            indexed = True
+        else:
+            sql = f"SELECT COUNT({field.db_name}), COUNT(DISTINCT {field.db_name}) FROM metadata"
+            rows, distinct_values = conn.execute(sql).fetchone()
+            indexed = field.db_name in indexed_columns or field in Field.fulltext_fields() or (field is Field.SEQUENCE and has_kmer_index)
+
+        statistics.append([field.search_name, entries, rows, distinct_values, int(indexed)])
+
+    # The lineage of an entry holds all the ancestors of its organism in the taxonomy tables.
+    sql = f"SELECT COUNT(*), COUNT(DISTINCT {CLOSURE_TABLE}.ancestor_id) FROM metadata "
+    sql += f"JOIN {CLOSURE_TABLE} ON {CLOSURE_TABLE}.descendant_id = metadata.{Field.ORGANISM_ID.db_name}"
+    rows, distinct_values = conn.execute(sql).fetchone()
+    statistics.append([Field.LINEAGE.search_name, entries, rows, distinct_values, int(True)])
+
+    conn.execute(f"DELETE FROM {STATISTICS_TABLE}")
+    conn.executemany(f"INSERT INTO {STATISTICS_TABLE} (field, entries, rows, distinct_values, indexed) VALUES (?, ?, ?, ?, ?)", statistics)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def update_db_category_statistics():
+    """ Recompute the aggregated statistics of the entries in every category from the current data. """
+    conn = get_db()
+    category = Field.CATEGORY_ID.db_name
+    sequence_len = Field.SEQUENCE_LEN.db_name
+
+    statistics = {row[0]: {"entries": 0, "min_seq_len": 0, "max_seq_len": 0, "length_histogram": [], "superkingdoms": {}, "multimers": {}} for row in conn.execute("SELECT id FROM categories")}
+
+    # Every aggregate is computed for all categories at once and then split up per category.
+    # The superkingdoms and multimers are stored in the order they should be shown in.
+    sql = f"SELECT {category}, COUNT(*), MIN({sequence_len}), MAX({sequence_len}) FROM metadata GROUP BY {category}"
+    for (category_id, entries, min_seq_len, max_seq_len) in conn.execute(sql).fetchall():
+        statistics[category_id].update(entries=entries, min_seq_len=min_seq_len, max_seq_len=max_seq_len)
+
+    sql = f"SELECT {category}, {sequence_len} / ? * ? AS bin, COUNT(*) FROM metadata GROUP BY {category}, bin ORDER BY {category}, bin"
+    for (category_id, bin, entries) in conn.execute(sql, [LENGTH_HISTOGRAM_BIN_SIZE, LENGTH_HISTOGRAM_BIN_SIZE]).fetchall():
+        statistics[category_id]["length_histogram"].append([bin, entries])
+
+    superkingdom = Field.LINEAGE_SUPERKINGDOM.db_name
+    sql = f"SELECT {category}, COALESCE({superkingdom}, 'Unknown'), COUNT(*) FROM metadata GROUP BY {category}, {superkingdom} ORDER BY COUNT(*) DESC"
+    for (category_id, name, entries) in conn.execute(sql).fetchall():
+        statistics[category_id]["superkingdoms"][name] = statistics[category_id]["superkingdoms"].get(name, 0) + entries
+
+    # The multimers that have models are the keys of the rankings of the models.
+    sql = f"SELECT metadata.{category}, ranks.key, COUNT(*) FROM metadata, json_each(metadata.ranks) AS ranks GROUP BY metadata.{category}, ranks.key"
+    for (category_id, multimer, entries) in conn.execute(sql).fetchall():
+        statistics[category_id]["multimers"][multimer] = entries
+
+    rows = [[
+        category_id,
+        values["entries"],
+        values["min_seq_len"],
+        values["max_seq_len"],
+        json.dumps(values["length_histogram"]),
+        json.dumps(values["superkingdoms"], sort_keys=False),
+        json.dumps(dict(sorted(values["multimers"].items(), key=lambda item: Multimer(item[0]))), sort_keys=False)
+    ] for (category_id, values) in statistics.items()]
+
+    conn.execute(f"DELETE FROM {CATEGORY_STATISTICS_TABLE}")
+    conn.executemany(f"INSERT INTO {CATEGORY_STATISTICS_TABLE} (category_id, entries, min_seq_len, max_seq_len, length_histogram, superkingdoms, multimers) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+
+def update_db_vocabulary():
+    """ Rebuild the vocabulary table from the current data, counting the entries that have every term. """
+    conn = get_db()
+    uid = Field.UNIPROT_ID.db_name
+
+    # The terms are case insensitive, so terms that only differ in case are counted together.
+    term_queries = {
+        Field.ORGANISM: f"SELECT {Field.ORGANISM.db_name}, COUNT(*) FROM metadata GROUP BY {Field.ORGANISM.db_name} COLLATE NOCASE",
+        Field.CATEGORY: f"SELECT categories.name, COUNT(*) FROM metadata JOIN categories ON categories.id = metadata.{Field.CATEGORY_ID.db_name} GROUP BY categories.name COLLATE NOCASE",
+        Field.LINEAGE: f"SELECT {TAXA_TABLE}.name, COUNT(DISTINCT metadata.{uid}) FROM metadata "
+                       f"JOIN {CLOSURE_TABLE} ON {CLOSURE_TABLE}.descendant_id = metadata.{Field.ORGANISM_ID.db_name} "
+                       f"JOIN {TAXA_TABLE} ON {TAXA_TABLE}.taxon_id = {CLOSURE_TABLE}.ancestor_id GROUP BY {TAXA_TABLE}.name COLLATE NOCASE"
+    }
+
+    for field in Field.multi_value_fields() & Field.suggest_fields():
+        term_queries[field] = f"SELECT value, COUNT(DISTINCT {uid}) FROM {VALUES_TABLE} WHERE field = '{field.db_name}' GROUP BY value"
+
+    conn.execute(f"DELETE FROM {VOCABULARY_TABLE}")
+
+    for field, sql in term_queries.items():
+        conn.execute(f"INSERT INTO {VOCABULARY_TABLE} (field, term, entries) SELECT '{field.search_name}', * FROM ({sql})")
+
+    conn.commit()
+
+def _get_content_hashes(uids: Sequence[str]) -> dict[str, Optional[str]]:
+    """ Returns the content hashes of the entries in the database with one of the UniProt IDs. """
+    sql = f"SELECT {Field.UNIPROT_ID.db_name}, content_hash FROM metadata WHERE {Field.UNIPROT_ID.db_name} IN (SELECT value FROM json_each(?))"
+    return {row[0]: row[1] for row in get_db().execute(sql, [json.dumps(list(uids))]).fetchall()}
+
+def _transform_batches(batches: Iterator[tuple[list, int]], kmer_size: Optional[int]) -> Iterator[tuple[ingest.TransformedBatch, int]]:
+    """
+    Yields the transformed batches in their original order, together with the number of bytes of the
+    file that had been read for them. The batches are transformed by a pool of processes if the config
+    allows more than one, with a limited number of batches in flight to bound the memory usage. The
+    content hashes of the entries that are already in the database are looked up before a batch is
+    transformed, so unchanged entries can be skipped.
+    """
+    processes = flask.current_app.config.get("INGEST_PROCESSES")
+
+    # Use all the available cores by default.
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes <= 1:
+        for (batch, position) in batches:
+            yield ingest.transform_batch(batch, kmer_size, _get_content_hashes([uid for (uid, _) in batch])), position
+
+        return
+
+    # Spawn the processes, since the parent process has an open database connection.
+    with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = collections.deque()
+
+        for (batch, position) in batches:
+            content_hashes = _get_content_hashes([uid for (uid, _) in batch])
+            pending.append((pool.submit(ingest.transform_batch, batch, kmer_size, content_hashes), position))
 
-def update_db_metadata(filename: Path):
-    """ Update the database with the data in the metadata JSON file.  """
+            if len(pending) >= 2 * processes:
+                future, position = pending.popleft()
+                yield future.result(), position
+
+        while len(pending) > 0:
+            future, position = pending.popleft()
+            yield future.result(), position
+
+def update_db_metadata(filename: Path, prune: bool = False) -> collections.Counter:
+    """
+    Update the database with the data in the metadata file. The entries are read in batches that are
+    transformed in parallel, so only a few batches are kept in memory. The entries are written in a
+    single transaction, unless 'INGEST_TRANSACTION_SIZE' sets the number of entries after which they
+    are committed. See 'ingest.read_entry_batches' for the supported file formats.
+
+    Entries with the same content hash as the entry in the database are skipped. If pruning, the
+    entries that aren't in the file are removed. Returns the number of entries that have been added,
+    changed, removed and left unchanged.
+    """
     # Get a database connection
     conn = get_db()
 
     # Set-up some useful variables
     search_fields = ((Field.search_fields() | Field.facet_fields()) & Field.metadata_fields()) - {Field.CATEGORY_ID}
-    
-    # Open the metadata JSON file and load the data
-    with open(filename, 'r') as f:
-        metadata_json = json.load(f)
-
-        # Load all the metadata into a list
-        metadata = []
-
-        for uid in metadata_json:
-            data = {}
-            data[Field.UNIPROT_ID.db_name] = uid
-            uid_json = metadata_json[uid]
-
-            # Add the searchable fields
-            data = {field.db_name:field.value_from_json(uid_json) for field in (search_fields | {Field.CATEGORY})- {Field.UNIPROT_ID}}
-            data[Field.UNIPROT_ID.db_name] = uid
-            
-            # Add additional information
-            multimers_json = uid_json["histoneDB"]["multimer"]
-            ranks = {}
-
-            for multimer in multimers_json:
-                # skip any non-valid multimers
-                try:
-                    Multimer(multimer)
-                except:
-                    flask.current_app.logger.warning(f"Entry {uid}: Unknown multimer '{multimer}' found. Skipping...")
-                    continue
-
-                if not multimers_json[multimer]:
-                    continue
-                
-                ranks_json = uid_json["histoneDB"]["rankModel"][multimer]
-                ranks[multimer] = [int(ranks_json["rank_" + str(n)].replace("model_", "")) for n in range(1, 6)]
-            
-            pdb_ids = [pdb_id for pdb_id in uid_json["histoneDB"]["PDB"]]
-            data["pdb_ids"] = json.dumps(pdb_ids)
-            protein_names = [protein_name for protein_name in uid_json["histoneDB"]["proteinNames"]]
-            data["protein_names"] = json.dumps(protein_names)
-            data["ranks"] = json.dumps(ranks)
-            publications = [pub for pub in uid_json["histoneDB"]["publications"]]
-            data["publications"] = json.dumps(publications)
-            data["rel_path"] = uid_json["histoneDB"]["relPath"]
-            data[Field.LINEAGE.db_name+"_json"] = json.dumps(uid_json["uniprot"]["lineages"])
-
-            # Apply all the fields for this uid
-            metadata.append(data)
-
-        # Execute the SQL query on the database
-        fields = {field.db_name for field in search_fields}
-        fields = fields | {Field.LINEAGE.db_name+"_json", "rel_path", "ranks", "publications", "pdb_ids"} - {Field.CATEGORY_ID.db_name}
-
-        sql = "INSERT OR REPLACE INTO metadata (\n    "
-        sql += ",\n    ".join(fields)
-        sql += f",\n    {Field.CATEGORY_ID.db_name}\n)\n"
-        sql += "SELECT\n    :"
-        sql += ",\n    :".join(fields)
-        sql += f",\n    categories.id\n"
-        sql += "FROM categories\n"
-        sql += f"WHERE name = :{Field.CATEGORY.db_name}"
-
-        conn.executemany(sql, metadata)
-        conn.commit()
+    batch_size = max(flask.current_app.config.get("INGEST_BATCH_SIZE", 1000), 1)
+    transaction_size = flask.current_app.config.get("INGEST_TRANSACTION_SIZE", 0)
+
+    fields = {field.db_name for field in search_fields}
+    fields = fields | {"rel_path", "ranks", "publications", "pdb_ids", "content_hash"} - {Field.CATEGORY_ID.db_name}
+
+    sql = "INSERT OR REPLACE INTO metadata (\n    "
+    sql += ",\n    ".join(fields)
+    sql += f",\n    {Field.CATEGORY_ID.db_name}\n)\n"
+    sql += "SELECT\n    :"
+    sql += ",\n    :".join(fields)
+    sql += f",\n    categories.id\n"
+    sql += "FROM categories\n"
+    sql += f"WHERE name = :{Field.CATEGORY.db_name}"
+
+    # The UniProt IDs in the file are kept in a temporary table to find the entries that should be pruned.
+    if prune:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ingest_uids (uid TEXT PRIMARY KEY) WITHOUT ROWID")
+        conn.execute("DELETE FROM temp.ingest_uids")
+
+    # The progress is measured in bytes of the file, since the number of entries isn't known up front.
+    summary = collections.Counter(added=0, changed=0, unchanged=0, removed=0)
+    uncommitted = 0
+    start = time.perf_counter()
+    batches = ingest.read_entry_batches(filename, batch_size)
+
+    with click.progressbar(length=Path(filename).stat().st_size, label=f"Loading '{Path(filename).name}'") as progress:
+        for (transformed, position) in _transform_batches(batches, get_kmer_size()):
+            for warning in transformed.warnings:
+                flask.current_app.logger.warning(warning)
+
+            if len(transformed.rows) > 0:
+                # Execute the SQL query on the database
+                conn.executemany(sql, transformed.rows)
+                update_db_taxonomy(transformed.lineages)
+
+            if len(transformed.kmers) > 0:
+                conn.executemany(f"INSERT OR IGNORE INTO {KMER_TABLE} (kmer, {Field.UNIPROT_ID.db_name}) VALUES (?, ?)", transformed.kmers)
+
+            if prune and len(transformed.uids) > 0:
+                conn.executemany("INSERT OR IGNORE INTO temp.ingest_uids (uid) VALUES (?)", [[uid] for uid in transformed.uids])
+
+            summary.update(transformed.counts)
+            uncommitted += len(transformed.rows)
+            progress.update(position - progress.pos)
+
+            # Commit in chunks if configured, which keeps the journal small at the cost of an atomic update.
+            # Every chunk changes the data, so anything cached for the previous chunk is discarded.
+            if transaction_size > 0 and uncommitted >= transaction_size:
+                bump_data_version()
+                conn.commit()
+                uncommitted = 0
+
+    if prune:
+        summary["removed"] = _delete_entries("NOT IN (SELECT uid FROM temp.ingest_uids)")
+        conn.execute("DROP TABLE temp.ingest_uids")
+
+    duration = time.perf_counter() - start
+    entries = sum(summary.values()) - summary["removed"]
+    click.echo(f"Read {entries} entries from '{Path(filename).name}' in {duration:.1f} s ({entries / max(duration, 1e-9):.0f} entries/s).")
+    click.echo(f"{summary['added']} added, {summary['changed']} changed, {summary['unchanged']} unchanged, {summary['removed']} removed.")
+
+    # Anything cached for the data only has to be discarded if the data has actually changed since the last commit.
+    if uncommitted + summary["removed"] > 0:
+        bump_data_version()
+
+    conn.commit()
+    return summary
 
+def _delete_entries(condition: str) -> int:
+    """
+    Deletes the entries with a UniProt ID that matches the SQL condition, e.g. 'IN (SELECT ...)',
+    together with their rows in the tables that hang off the metadata table. Returns the number of
+    deleted entries. Doesn't commit.
+    """
+    conn = get_db()
+    uid = Field.UNIPROT_ID.db_name
 
-def remove_db_entries(filename: Path):
-    """ Remove all entries with a Uniprot ID in the give JSON file from the database. """   
+    # Clearing the side tables for all entries at once leaves nothing for the delete triggers to do per
+    # entry. The full-text index is left to its trigger, since it needs the values of the deleted rows.
+    for table in [VALUES_TABLE, KMER_TABLE]:
+        conn.execute(f"DELETE FROM {table} WHERE {uid} {condition}")
+
+    conn.execute(f"DELETE FROM metadata WHERE {uid} {condition}")
+    return conn.execute("SELECT changes()").fetchone()[0]
+
+def remove_db_entries(filename: Path) -> int:
+    """ Remove all entries with a Uniprot ID in the give JSON file from the database. Returns the number of removed entries. """   
     # Get a database connection
     conn = get_db()
 
     # Open the JSON file and load the data
     with open(filename, 'r') as f:
-        remove_uids = [[uid] for uid in json.load(f)]
+        remove_uids = list(json.load(f))
+
+    # Collect the UniProt IDs in a temporary table, so all entries are removed in a single pass.
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS remove_uids (uid TEXT PRIMARY KEY) WITHOUT ROWID")
+    conn.execute("DELETE FROM temp.remove_uids")
+    conn.execute("INSERT OR IGNORE INTO temp.remove_uids (uid) SELECT value FROM json_each(?)", [json.dumps(remove_uids)])
+
+    removed = _delete_entries("IN (SELECT uid FROM temp.remove_uids)")
+    conn.execute("DROP TABLE temp.remove_uids")
+
+    click.echo(f"{removed} entries removed.")
 
-    # Set-up an SQL query to execute.
-    #? This is hard-coded for now since rewriting ComparisonType and SQLCondition would require a code reorganization to avoid circular dependencies.
-    sql = "DELETE FROM metadata\n"
-    sql += f"WHERE {Field.UNIPROT_ID.db_name} = ?" 
+    if removed > 0:
+        bump_data_version()
 
-    conn.executemany(sql, remove_uids)
     conn.commit()
+    return removed
+
+#***===== Snapshot Functions =====***#
+#* The CLI commands never write to the database file itself. They build the new database in a staging file, which replaces the
+#* database file once it is complete. Running servers keep reading the replaced file until they switch to the new one.
+def _sibling_path(db_path: Path, suffix: str) -> Path:
+    """ Returns the path of a file next to the database file with the suffix added to its name. """
+    return Path(str(db_path) + suffix)
+
+def _remove_wal_files(db_path: Path):
+    """ Removes the write-ahead log of a database file that isn't in use, which must never be applied to another file by the same name. """
+    for suffix in ["-wal", "-shm"]:
+        _sibling_path(db_path, suffix).unlink(missing_ok=True)
+
+def _delete_db_file(db_path: Path):
+    """ Removes a database file that isn't in use together with its write-ahead log. """
+    db_path.unlink(missing_ok=True)
+    _remove_wal_files(db_path)
+
+def _checkpoint_db(db_path: Path):
+    """
+    Writes the write-ahead log of a database file into the file itself and removes the log, so that the
+    file holds all of its data. SQLite applies any log that it finds next to a database file, whatever
+    its journal mode, so the log of a file must be gone before another file takes its name. Raises an
+    Exception if the log couldn't be written completely, e.g. because of a running update.
+
+    WARNING: Currently sqlite only due to the use of `wal_checkpoint`!
+    """
+    wal_path = _sibling_path(db_path, "-wal")
+
+    if wal_path.is_file():
+        with connections.SQLiteConnection(str(db_path)) as conn:
+            busy = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]
+
+        if busy or (wal_path.is_file() and wal_path.stat().st_size > 0):
+            raise Exception(f"Couldn't checkpoint the database '{db_path}', since it is in use by another update.")
+
+    # Connections that still read the file find all of its pages in the file itself after the checkpoint.
+    _remove_wal_files(db_path)
+
+def _use_rollback_journal(db_path: Path):
+    """
+    Switches a database file that isn't in use from the write-ahead log to a rollback journal, which
+    writes any log into the file. Connections that only read the file then don't create a log next to it.
+
+    WARNING: Currently sqlite only due to the use of `journal_mode`!
+    """
+    with connections.SQLiteConnection(str(db_path)) as conn:
+        mode = conn.execute("PRAGMA journal_mode = DELETE").fetchone()[0]
+
+    if mode != "delete":
+        raise Exception(f"Couldn't switch the database '{db_path}' to a rollback journal.")
+
+def _link_or_copy(source: Path, target: Path):
+    """ Makes the target another name for the source file, or a copy of it if the file system doesn't support links. """
+    _delete_db_file(target)
+
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def optimize_db(target: Path):
+    """
+    Compacts the database of the app context into the target file, after merging the segments of its
+    full-text index. The target file holds the whole database without a write-ahead log.
+
+    WARNING: Currently sqlite only due to `VACUUM INTO`!
+    """
+    conn = get_db()
+    conn.execute(f"INSERT INTO {FULLTEXT_TABLE}({FULLTEXT_TABLE}) VALUES ('optimize')")
+    conn.commit()
+
+    conn.execute("VACUUM INTO ?", [str(target)])
+
+def validate_db(db_path: Path):
+    """
+    Raises a ValueError if a database file is damaged or doesn't hold any entries.
+
+    WARNING: Currently sqlite only due to `PRAGMA quick_check`!
+    """
+    with connections.SQLiteConnection(str(db_path), read_only=True) as conn:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+
+        if result != "ok":
+            raise ValueError(f"The database '{db_path}' is damaged: {result}")
+
+        if conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0] == 0:
+            raise ValueError(f"The database '{db_path}' doesn't hold any entries.")
+
+def swap_db(new_path: Path):
+    """
+    Atomically replaces the database file of the app with a new database file, after checking it. The
+    replaced file is kept as the previous database for 'flask database rollback'. Running servers switch
+    to the new file on their next request, since their connections to the replaced file are no longer
+    reused. The write-ahead log of the replaced file is written into it and removed before the swap, so
+    that it isn't applied to the new file.
 
-def delete_db():
+    WARNING: Currently sqlite only due to the write-ahead log!
+    """
     db_path = Path(flask.current_app.config["DATABASE"])
-    db_path.unlink(missing_ok=True)
+
+    _use_rollback_journal(new_path)
+    validate_db(new_path)
+
+    if db_path.is_file():
+        _checkpoint_db(db_path)
+        _link_or_copy(db_path, _sibling_path(db_path, PREVIOUS_SUFFIX))
+
+    os.replace(new_path, db_path)
+
+def rollback_db():
+    """
+    Atomically switches the database file of the app back to the previous database, which in turn keeps
+    the replaced file. Rolling back twice restores the original database file. As with a swap, the
+    write-ahead log of the replaced file is written into it and removed first.
+
+    WARNING: Currently sqlite only due to the write-ahead log!
+    """
+    db_path = Path(flask.current_app.config["DATABASE"])
+    previous_path = _sibling_path(db_path, PREVIOUS_SUFFIX)
+
+    if not previous_path.is_file():
+        raise Exception(f"There is no previous database to roll back to at '{previous_path}'.")
+
+    _use_rollback_journal(previous_path)
+    validate_db(previous_path)
+
+    # Keep a second name for the current file, so it can become the previous database after the swap.
+    swapped_path = _sibling_path(db_path, NEW_SUFFIX)
+
+    if db_path.is_file():
+        _checkpoint_db(db_path)
+        _link_or_copy(db_path, swapped_path)
+
+    os.replace(previous_path, db_path)
+
+    if swapped_path.is_file():
+        os.replace(swapped_path, previous_path)
+
+def open_staging_db(copy: bool):
+    """
+    Sets the database connection of the app context to the staging file, which the CLI commands fill
+    with the bulk-load profile. If copying, the staging file starts as a copy of the database file.
+    Anything left over by a build that didn't finish is removed first.
+
+    WARNING: Currently sqlite only due to `VACUUM INTO`!
+    """
+    db_path = Path(flask.current_app.config["DATABASE"])
+    staging_path = _sibling_path(db_path, STAGING_SUFFIX)
+
+    _delete_db_file(staging_path)
+    _delete_db_file(_sibling_path(db_path, NEW_SUFFIX))
+
+    if copy:
+        if not db_path.is_file():
+            raise Exception("There is no database file yet. Use 'flask database create' to create it.")
+
+        with connections.SQLiteConnection(str(db_path), read_only=True) as conn:
+            conn.execute("VACUUM INTO ?", [str(staging_path)])
+
+    flask.g.db = open_db(staging_path)
+    use_bulk_load_profile()
+
+def discard_staging_db():
+    """ Closes the database connection of the app context to the staging file and removes the staging file. """
+    flask.g.pop("db").close()
+    _delete_db_file(_sibling_path(Path(flask.current_app.config["DATABASE"]), STAGING_SUFFIX))
+
+def swap_staging_db():
+    """
+    Compacts the database in the staging file into a new database file and swaps it in for the database
+    file. Afterwards the profiles for similarity searches are computed from the database that's in use.
+    """
+    db_path = Path(flask.current_app.config["DATABASE"])
+    new_path = _sibling_path(db_path, NEW_SUFFIX)
+
+    click.echo("Compacting the new database...")
+    optimize_db(new_path)
+    discard_staging_db()
+
+    # Replace the database file, keeping the current one for a rollback.
+    swap_db(new_path)
+    click.echo(f"The new database is now in use at '{db_path}'.")
+
+    update_live_db_profiles()
+
+def update_live_db_profiles():
+    """
+    Computes the profiles for similarity searches from the database file of the app. The database file is
+    only read, so that it stays without a write-ahead log for the running servers.
+    """
+    flask.g.db = open_db(flask.current_app.config["DATABASE"], read_only=True)
+    update_db_profiles()
 
 #***===== Create Blueprint =====***#
 bp  = flask.Blueprint("database", __name__, cli_group="database")
 
 #***===== Register Jinja Context Processors =====***#
+# Both are only looked up when a template uses them, so other templates don't need the database.
 @bp.app_context_processor
 def inject_categories():
-    categories = get_categories()
-    flask.current_app.logger.debug(f"Categories present in the database: {[(id, category.name) for (id, category) in categories.items()]}")
-    return {"categories": categories}
+    return {"categories": LocalProxy(get_categories)}
 
 @bp.app_context_processor
 def inject_max_sequence_length():
-    db = get_db()
-    max_seq_len = db.execute(f"SELECT MAX({Field.SEQUENCE_LEN.db_name}) FROM search").fetchone()[0]
-    if not max_seq_len:
-        max_seq_len = 0
-    flask.current_app.logger.debug(f"The maximum sequence lengths found in the database is {max_seq_len}.")
-    return {"max_seq_len": max_seq_len}
+    return {"max_seq_len": LocalProxy(get_max_sequence_length)}
 
 #***===== Register CLI commands =====***#
 @bp.cli.command("create")
@@ -384,18 +1418,17 @@ def create(
     categories_filename: Path,
     force: bool = False
     ):
-    """ Create a new database from the 'DB_FILENAME' and 'CATEGORIES_FILENAME' JSON files. """
-    if force:
-        # If overwriting is forced, delete the current database.
-        delete_db()
-    else:
-        # Otherwise, make sure the database file does not exist yet.
-        db_path = Path(flask.current_app.config["DATABASE"])
-
-        if db_path.is_file():
-            raise Exception("A database file already exists. If you want to update it, use 'flask database update' instead.")
+    """
+        Create a new database from the 'DB_FILENAME' and 'CATEGORIES_FILENAME' JSON files. The database
+        is built in a separate file and only replaces the database file once it is complete, so servers
+        keep serving the current database in the meantime.
+    """
+    # Make sure the database file does not exist yet, unless overwriting is forced.
+    if Path(flask.current_app.config["DATABASE"]).is_file() and not force:
+        raise Exception("A database file already exists. If you want to update it, use 'flask database update' instead.")
 
-    # Create an empty database.
+    # Create an empty database in the staging file.
+    open_staging_db(copy=False)
     init_db()
 
     # Fill the categories table from the categories json file.
@@ -404,30 +1437,101 @@ def create(
     # Fill the metadata table from the metadata json file.
     update_db_metadata(db_filename)
 
+    # Compute the statistics of the search fields.
+    update_db_statistics()
+
+    # Compute the statistics of the categories.
+    update_db_category_statistics()
+
+    # Fill the vocabulary for the search suggestions.
+    update_db_vocabulary()
+
+    # Replace the database file by the new database.
+    swap_staging_db()
+
 @bp.cli.command("update")
 @click.argument("db-filename", type=click.Path(exists=True, dir_okay=False, path_type=Path))
 @click.option('-c', '--categories-file', type=click.Path(exists=True, dir_okay=False, path_type=Path), help="A JSON file for supplying updates to the categories available in the database.")
+@click.option('-p', '--prune', is_flag=True, help="Removes the entries that aren't in the supplied JSON file.")
 def update(
     db_filename: Path,
-    categories_file: Union[Path, None]
+    categories_file: Union[Path, None],
+    prune: bool = False
     ):
     """ 
-        Updates the database based on the supplied JSON file.
+        Updates the database based on the supplied JSON file. Only entries that have changed are written.
+        The update is applied to a copy of the database, which replaces the database file once it is complete.
+        The database file is left as it is if nothing has changed.
         WARNING: Existing entries will be overwritten where needed.
     """
 
     # Make any necessary to the database itself.
-    db_vc_update()
+    open_staging_db(copy=True)
+    changed = db_vc_update()
 
     # Update the categories table with data from the categories json file.
     if categories_file:
-        update_db_categories(categories_file)
+        changed = update_db_categories(categories_file) > 0 or changed
 
     # Update the metadata table with data from the metadata json file.
-    update_db_metadata(db_filename)
+    summary = update_db_metadata(db_filename, prune)
+    changed = changed or summary["added"] + summary["changed"] + summary["removed"] > 0
+
+    # Keep the database file and its previous database for a rollback if there is nothing new.
+    if not changed:
+        discard_staging_db()
+        click.echo("Nothing has changed, so the database file is left as it is.")
+        return
+
+    # Recompute the statistics of the search fields.
+    update_db_statistics()
+
+    # Recompute the statistics of the categories.
+    update_db_category_statistics()
+
+    # Rebuild the vocabulary for the search suggestions.
+    update_db_vocabulary()
+
+    # Replace the database file by the updated database.
+    swap_staging_db()
 
 @bp.cli.command("remove")
 @click.argument('filename', type=click.Path(exists=True, dir_okay=False, path_type=Path))
 def remove(filename: Path):
-    """ Remove all entries from the database that have an Uniprot ID that is found in the supplied JSON file. """
-    remove_db_entries(filename)
+    """
+        Remove all entries from the database that have an Uniprot ID that is found in the supplied JSON file.
+        The entries are removed from a copy of the database, which replaces the database file once it is complete.
+        The database file is left as it is if none of the entries were found.
+    """
+    # Make any necessary changes to the database itself.
+    open_staging_db(copy=True)
+    changed = db_vc_update()
+
+    changed = remove_db_entries(filename) > 0 or changed
+
+    # Keep the database file and its previous database for a rollback if nothing was removed.
+    if not changed:
+        discard_staging_db()
+        click.echo("Nothing has changed, so the database file is left as it is.")
+        return
+
+    # Recompute the statistics of the search fields.
+    update_db_statistics()
+
+    # Recompute the statistics of the categories.
+    update_db_category_statistics()
+
+    # Rebuild the vocabulary for the search suggestions.
+    update_db_vocabulary()
+
+    # Replace the database file by the updated database.
+    swap_staging_db()
+
+@bp.cli.command("rollback")
+def rollback():
+    """ Switch back to the database that was replaced by the last 'flask database create', 'update', 'remove' or 'rollback'. """
+    rollback_db()
+    click.echo(f"Rolled back to the previous database at '{flask.current_app.config['DATABASE']}'.")
+
+    # Recompute the profiles for similarity searches, since they belong to the replaced database.
+    update_live_db_profiles()
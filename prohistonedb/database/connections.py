@@ -4,12 +4,16 @@
 import abc
 from abc import ABC
 
-from typing import Union, Sequence, Mapping, Optional
+from typing import Union, Sequence, Mapping, Optional, Callable
 from collections.abc import Iterable
 
 from pathlib import Path
 
+import os
+import queue
+import re
 import sqlite3
+import threading
 
 import logging
 
@@ -26,6 +30,14 @@ from ..types import Field, FieldType
 #***===== Type Aliases =====***#
 _DatabaseParameters = Union[Sequence, Mapping]
 _DatabaseRow = Union[Sequence, Mapping]
+_PragmaValue = Union[str, int]
+
+#***===== Constants =====***#
+# Pragmas can't be passed as parameters, so their names and values are restricted to plain words and numbers.
+_PRAGMA_PATTERN = re.compile(r"-?\w+")
+
+# Pragmas that change the database file itself, which read-only connections aren't allowed to do.
+_FILE_PRAGMAS = {"journal_mode", "page_size", "auto_vacuum"}
 
 #***===== Abstract Base Class 'DatabaseResult' =====***#
 class DatabaseResult(ABC, Iterable):
@@ -100,6 +112,19 @@ class DatabaseConnection:
     def commit(self):
         """ Commit any pending queries to the database. """
 
+    @property
+    @abc.abstractmethod
+    def file_id(self) -> Optional[tuple]:
+        """ Returns the identity of the database file that the connection has open, which differs for a file that replaced it. """
+
+    @abc.abstractmethod
+    def is_healthy(self) -> bool:
+        """ Returns whether the connection is open and can still execute queries. """
+
+    @abc.abstractmethod
+    def reset(self):
+        """ Ends any unfinished query or transaction so the connection can be reused. """
+
 #***===== SQLiteResult Class =====***#
 class SQLiteResult(DatabaseResult):
     #*----- Variable type declarations -----*#
@@ -138,16 +163,68 @@ class SQLiteConnection(DatabaseConnection):
     _cursor: Union[sqlite3.Cursor, None]
 
     #*----- Constructors -----*#
-    def __init__(self, db_path: Path):
+    def __init__(
+            self,
+            db_path: Path,
+            cached_statements: int = 128,
+            read_only: bool = False,
+            immutable: bool = False,
+            pragmas: Optional[Mapping[str, _PragmaValue]] = None
+        ):
+        """
+        Takes the path of the database file and the number of prepared statements that the connection
+        keeps for reuse. Read-only connections can't change the database, but can be shared between
+        threads as long as only one thread uses them at a time. Immutable connections are read-only
+        connections that also skip all locking, so the file must not change while they are open.
+        The pragmas are set every time the connection is opened.
+        """
         self._db_path = db_path
+        self._cached_statements = cached_statements
+        self._read_only = read_only or immutable
+        self._immutable = immutable
+        self._pragmas = dict(pragmas) if not pragmas is None else {}
+        self._file_id = None
         self._connection = None
         self._cursor = None
 
     def connect(self):
         """ Opens a database connection. I'd recommend using the 'with' statement, but otherwise don't forget to clean-up with 'close(). """    
-        self._connection = sqlite3.connect(database=self._db_path)
+        # Statements are cached by their SQL, so executing the same SQL again skips parsing it.
+        if self._read_only:
+            # Opening the file in read-only mode also makes sure a missing database isn't created.
+            uri = Path(self._db_path).resolve().as_uri() + "?mode=ro"
+
+            if self._immutable:
+                uri += "&immutable=1"
+
+            self._connection = sqlite3.connect(database=uri, uri=True, cached_statements=self._cached_statements, check_same_thread=False)
+        else:
+            self._connection = sqlite3.connect(database=self._db_path, cached_statements=self._cached_statements)
+
+        self._file_id = self._get_file_id()
         self._connection.row_factory = sqlite3.Row
         self._cursor = self._connection.cursor()
+
+        # Rows deleted by 'INSERT OR REPLACE' only fire delete triggers with recursive triggers enabled.
+        # The full-text index relies on those triggers to stay in sync with the metadata table.
+        self._cursor.execute("PRAGMA recursive_triggers = ON")
+
+        self.set_pragmas(self._pragmas)
+
+    def set_pragmas(self, pragmas: Mapping[str, _PragmaValue]):
+        """
+        Sets the pragmas on the open connection, e.g. {"cache_size": -65536}. Pragmas that change the
+        file itself, like 'journal_mode', are skipped on read-only connections. Raises a ValueError for
+        names or values that aren't plain words or numbers.
+        """
+        for (name, value) in pragmas.items():
+            if _PRAGMA_PATTERN.fullmatch(name) is None or _PRAGMA_PATTERN.fullmatch(str(value)) is None:
+                raise ValueError(f"'{name} = {value}' is not a valid pragma.")
+
+            if self._read_only and name in _FILE_PRAGMAS:
+                continue
+
+            self._cursor.execute(f"PRAGMA {name} = {value}").fetchall()
     
     #*----- Destructors -----*#
     def close(self):
@@ -240,4 +317,99 @@ class SQLiteConnection(DatabaseConnection):
             return [SQLiteResult(cursor) for cursor in self._cursor.executemany(sql, seq_of_parameters)]
     
     def commit(self):
-        self._connection.commit()
\ No newline at end of file
+        self._connection.commit()
+
+    @property
+    def file_id(self) -> Optional[tuple[int, int]]:
+        return self._file_id
+
+    def _get_file_id(self) -> Optional[tuple[int, int]]:
+        """ Returns the device and inode of the database file, which change when the file is replaced. """
+        try:
+            stat = os.stat(self._db_path)
+            return (stat.st_dev, stat.st_ino)
+        except OSError:
+            return None
+
+    def is_healthy(self) -> bool:
+        # A connection keeps reading the old file if the database file has been replaced.
+        if self._connection is None or self._get_file_id() != self._file_id:
+            return False
+
+        try:
+            self._connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        # A cursor that hasn't been read until the end keeps its read transaction open.
+        self._cursor.close()
+
+        if self._connection.in_transaction:
+            self._connection.rollback()
+
+        self._cursor = self._connection.cursor()
+
+#***===== ConnectionPool Class =====***#
+class PoolTimeoutError(Exception):
+    """ Raised when no connection of a pool became available in time. """
+
+class ConnectionPool:
+    """
+    A thread-safe pool of long-lived database connections. Connections are opened when they are first
+    needed and returned to the pool after use, so later users get a connection with a warm cache.
+    At most 'max_size' connections are in use at once and others wait for up to 'timeout' seconds.
+    """
+    #*----- Constructors -----*#
+    def __init__(self, connection_factory: Callable[[], DatabaseConnection], max_size: int, timeout: float):
+        """ Takes a function that returns a new (unopened) connection, the maximum number of connections and the wait timeout in seconds. """
+        self._connection_factory = connection_factory
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+
+        # The most recently used connection is handed out first, since its cache is the warmest.
+        self._idle = queue.LifoQueue()
+
+    #*----- Other public functions -----*#
+    def acquire(self) -> DatabaseConnection:
+        """ Returns a healthy connection from the pool. Raises a PoolTimeoutError if none became available in time. """
+        if not self._slots.acquire(timeout=self._timeout):
+            raise PoolTimeoutError(f"No database connection became available within {self._timeout} seconds.")
+
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+
+                if connection.is_healthy():
+                    return connection
+
+                connection.close()
+
+            connection = self._connection_factory()
+            connection.connect()
+            return connection
+        except:
+            self._slots.release()
+            raise
+
+    def release(self, connection: DatabaseConnection):
+        """ Returns a connection to the pool. Connections that can't be reset are closed instead. """
+        try:
+            connection.reset()
+            self._idle.put_nowait(connection)
+        except Exception:
+            connection.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """ Closes all the idle connections in the pool. """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,273 @@
+""" Incremental reading of the metadata files, so that the size of the files doesn't affect the memory usage. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+from typing import Any, BinaryIO, Iterator, Mapping, Optional, Sequence, TextIO
+from dataclasses import dataclass
+from pathlib import Path
+
+import bz2
+import collections
+import gzip
+import hashlib
+import io
+import json
+import lzma
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+from ..types import Field
+from .models import Multimer
+
+#***===== Constants =====***#
+# The number of characters that are read from the file at once.
+_READ_SIZE = 1 << 16
+
+# The functions that decompress an opened binary file by the extension of its compressed format.
+_COMPRESSIONS = {".gz": lambda raw: gzip.GzipFile(fileobj=raw), ".bz2": bz2.BZ2File, ".xz": lzma.LZMAFile}
+
+# The file extensions of files with a JSON object on every line.
+_LINE_EXTENSIONS = {".ndjson", ".jsonl"}
+
+#***===== TransformedBatch Dataclass =====***#
+@dataclass
+class TransformedBatch:
+    """
+    A basic dataclass holding a batch of entries that has been transformed for the database: the rows
+    of the metadata table, the lineages by organism ID, the k-mers of the sequences as (k-mer, UniProt
+    ID) pairs and any warnings about the entries. Only the added and changed entries are transformed,
+    but the UniProt IDs of all entries in the batch are kept together with the number of entries that
+    have been added, changed or left unchanged.
+    """
+    rows: list[dict[str, Any]]
+    lineages: dict[str, list[Mapping]]
+    kmers: list[tuple[str, str]]
+    warnings: list[str]
+    uids: list[str]
+    counts: collections.Counter
+
+#***===== Functions =====***#
+def _open_text(raw: BinaryIO, path: Path) -> TextIO:
+    """ Returns the file as text, decompressing it first if its extension is that of a compressed format. """
+    compression = _COMPRESSIONS.get(path.suffix.lower())
+
+    if not compression is None:
+        raw = compression(raw)
+
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+def _skip_whitespace(buffer: str, position: int) -> int:
+    """ Returns the position of the first character at or after the position that isn't whitespace. """
+    while position < len(buffer) and buffer[position].isspace():
+        position += 1
+
+    return position
+
+def _iter_object(file: TextIO) -> Iterator[tuple[str, Any]]:
+    """
+    Yields the keys and values of the JSON object in the file one at a time. Only the value that is
+    being parsed is kept in memory, so the file can be much larger than the available memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    read_size = _READ_SIZE
+    at_end = False
+    expected = "{"
+
+    while True:
+        position = _skip_whitespace(buffer, position)
+
+        # Read more of the file if the buffer doesn't hold the next token yet.
+        if position >= len(buffer):
+            if at_end:
+                raise ValueError("The JSON file ended before the object was closed.")
+
+            chunk = file.read(read_size)
+            at_end = len(chunk) < read_size
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        # The object ends either after a value or right after it has been opened.
+        if buffer[position] == "}" and expected in ["key", ","]:
+            return
+
+        if expected in ["{", ":", ","]:
+            if buffer[position] != expected:
+                raise ValueError(f"Expected '{expected}' in the JSON file, but found '{buffer[position]}'.")
+
+            position += 1
+            expected = "key" if expected != ":" else "value"
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+
+            # A value at the end of the buffer might continue in the part of the file that hasn't been read yet.
+            if end >= len(buffer) and not at_end:
+                raise json.JSONDecodeError("Incomplete value", buffer, position)
+        except json.JSONDecodeError:
+            if at_end:
+                raise
+
+            # Read larger chunks for large values, so they aren't parsed again for every chunk.
+            chunk = file.read(read_size)
+            at_end = len(chunk) < read_size
+            buffer = buffer[position:] + chunk
+            position = 0
+            read_size *= 2
+            continue
+
+        read_size = _READ_SIZE
+        position = end
+
+        if expected == "key":
+            if not isinstance(value, str):
+                raise ValueError(f"Expected a key in the JSON file, but found '{value}'.")
+
+            key = value
+            expected = ":"
+        else:
+            yield key, value
+            expected = ","
+
+def _iter_lines(file: TextIO) -> Iterator[tuple[str, Any]]:
+    """ Yields the keys and values of the JSON objects on every line of the file. """
+    for line in file:
+        if line.strip():
+            yield from json.loads(line).items()
+
+def read_entry_batches(path: Path, batch_size: int) -> Iterator[tuple[list[tuple[str, Any]], int]]:
+    """
+    Yields the UniProt IDs and metadata of the entries in a metadata file in batches, together with
+    the number of bytes of the file that have been read. The last batch can be empty. The file either
+    holds a single JSON object with the entries by their UniProt ID, or a JSON object on every line if
+    its extension is '.ndjson' or '.jsonl'. Files that are compressed with gzip, bzip2 or xz are
+    decompressed while they're read.
+    """
+    path = Path(path)
+    uncompressed_path = path.with_suffix("") if path.suffix.lower() in _COMPRESSIONS else path
+
+    with open(path, "rb") as raw, _open_text(raw, path) as file:
+        entries = _iter_lines(file) if uncompressed_path.suffix.lower() in _LINE_EXTENSIONS else _iter_object(file)
+        batch = []
+
+        for entry in entries:
+            batch.append(entry)
+
+            if len(batch) >= batch_size:
+                yield batch, raw.tell()
+                batch = []
+
+        yield batch, raw.tell()
+
+def _json_list(values: Sequence) -> Optional[str]:
+    """ Returns the values as a JSON list, or None if there aren't any. """
+    return json.dumps(values) if len(values) > 0 else None
+
+def _entry_row(uid: str, entry: Mapping, warnings: list[str]) -> dict[str, Any]:
+    """
+    Returns the columns of the metadata table for an entry in the metadata file, which is the only place
+    where the values of the fields are read from the metadata file. Every part of the entry is only walked
+    once. Warnings about invalid parts of the entry are added to the list of warnings.
+    """
+    uniprot = entry["uniprot"]
+    histone_db = entry["histoneDB"]
+
+    superkingdoms = [lineage["scientificName"] for lineage in uniprot["lineages"] if lineage["rank"] == "superkingdom"]
+
+    if len(superkingdoms) > 1:
+        raise ValueError("Supplied json data has multiple superkingdoms within one lineage")
+
+    # Split the cross references into their different kinds of IDs in a single pass.
+    protein_ids = []
+    proteome_ids = []
+    genome_ids = []
+
+    for reference in uniprot["uniProtKBCrossReferences"]:
+        protein_ids += [property["value"] for property in reference["properties"] if property["key"] == "ProteinId"]
+
+        if reference["database"] == "Proteomes":
+            proteome_ids.append(reference["id"])
+        elif reference["database"] == "EMBL":
+            genome_ids.append(reference["id"])
+
+    ranks = {}
+
+    for multimer in histone_db["multimer"]:
+        # skip any non-valid multimers
+        try:
+            Multimer(multimer)
+        except ValueError:
+            warnings.append(f"Entry {uid}: Unknown multimer '{multimer}' found. Skipping...")
+            continue
+
+        if not histone_db["multimer"][multimer]:
+            continue
+
+        ranks_json = histone_db["rankModel"][multimer]
+        ranks[multimer] = [int(ranks_json["rank_" + str(n)].replace("model_", "")) for n in range(1, 6)]
+
+    return {
+        Field.UNIPROT_ID.db_name: uid,
+        Field.ORGANISM.db_name: uniprot["organism"]["scientificName"],
+        Field.ORGANISM_ID.db_name: uniprot["organism"]["taxonId"],
+        Field.SEQUENCE.db_name: uniprot["sequence"]["value"],
+        Field.SEQUENCE_LEN.db_name: uniprot["sequence"]["length"],
+        Field.CATEGORY.db_name: histone_db["category"],
+        Field.LINEAGE_SUPERKINGDOM.db_name: superkingdoms[0] if len(superkingdoms) > 0 else None,
+        Field.PROTEIN_IDS.db_name: _json_list(protein_ids),
+        Field.PROTEOME_IDS.db_name: _json_list(proteome_ids),
+        Field.GENOME_IDS.db_name: _json_list(genome_ids),
+        Field.GENE_NAMES.db_name: json.dumps(list(histone_db["geneNames"])),
+        Field.PROTEIN_NAMES.db_name: json.dumps(list(histone_db["proteinNames"])),
+        "pdb_ids": json.dumps(list(histone_db["PDB"])),
+        "ranks": json.dumps(ranks, sort_keys=True),
+        "publications": json.dumps(list(histone_db["publications"])),
+        "rel_path": histone_db["relPath"]
+    }
+
+def content_hash(entry: Mapping) -> str:
+    """ Returns a hash of the content of an entry in the metadata file that doesn't depend on the order of its keys. """
+    content = json.dumps(entry, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+def transform_batch(batch: Sequence[tuple[str, Mapping]], kmer_size: Optional[int], content_hashes: Optional[Mapping[str, Optional[str]]] = None) -> TransformedBatch:
+    """
+    Transforms a batch of UniProt IDs and entries into the rows, lineages and k-mers that are written
+    to the database. Doesn't need the app, so batches can be transformed in other processes. No k-mers
+    are computed if there is no k-mer size. Takes the content hashes of the entries that are already in
+    the database, so entries with the same content can be skipped.
+    """
+    # Imported here since the database package imports this module.
+    from . import sequence_kmers
+
+    content_hashes = {} if content_hashes is None else content_hashes
+    transformed = TransformedBatch([], {}, [], [], [], collections.Counter())
+
+    for (uid, entry) in batch:
+        transformed.uids.append(uid)
+        entry_hash = content_hash(entry)
+
+        if not uid in content_hashes:
+            transformed.counts["added"] += 1
+        elif content_hashes[uid] != entry_hash:
+            transformed.counts["changed"] += 1
+        else:
+            transformed.counts["unchanged"] += 1
+            continue
+
+        row = _entry_row(uid, entry, transformed.warnings)
+        row["content_hash"] = entry_hash
+        transformed.rows.append(row)
+        transformed.lineages[str(row[Field.ORGANISM_ID.db_name])] = entry["uniprot"]["lineages"]
+
+        if not kmer_size is None:
+            transformed.kmers += [(kmer, uid) for kmer in sequence_kmers(row[Field.SEQUENCE.db_name], kmer_size)]
+
+    return transformed
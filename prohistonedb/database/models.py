@@ -4,12 +4,13 @@
 from dataclasses import dataclass
 from enum import Enum
 
-from typing import Optional, Union
+from typing import Optional, Union, Callable, Mapping, Any
 
 from pathlib import Path
 
 import functools
 import datetime
+import json
 
 #*----- External packages -----*#
 
@@ -102,25 +103,158 @@ class Category:
     @property
     def static_phylotree_path(self):
         return (Path("phylotrees") / self.name).with_suffix(".xml").as_posix()
+
+#***===== Statistics Dataclass =====***#
+@dataclass(frozen=True)
+class FieldStatistics:
+    """ A basic dataclass holding the statistics of a search field that are used to estimate the selectivity of filters. """
+    field: str
+    entries: int
+    rows: int
+    distinct_values: int
+    indexed: bool
+
+    @property
+    def selectivity(self) -> float:
+        """ Returns the average fraction of the entries that match a single value of the field. """
+        if self.entries == 0 or self.distinct_values == 0:
+            return 0.0
+        else:
+            return min(self.rows / self.distinct_values / self.entries, 1.0)
+
+@dataclass(frozen=True)
+class CategoryStatistics:
+    """
+    A basic dataclass holding the aggregated statistics of the entries in a category. The histogram
+    holds the start of every sequence length bin together with its number of entries.
+    """
+    category_id: int
+    entries: int
+    min_seq_len: int
+    max_seq_len: int
+    length_histogram: list[tuple[int, int]]
+    superkingdoms: dict[str, int]
+    multimers: dict[Multimer, int]
+
+    def to_json(self) -> dict[str, Any]:
+        """ Returns the statistics as a dictionary that can be serialized to JSON. """
+        return {
+            "category_id": self.category_id,
+            "entries": self.entries,
+            "min_seq_len": self.min_seq_len,
+            "max_seq_len": self.max_seq_len,
+            "length_histogram": [[start, entries] for (start, entries) in self.length_histogram],
+            "superkingdoms": self.superkingdoms,
+            "multimers": {multimer.value: entries for (multimer, entries) in self.multimers.items()}
+        }
             
-@dataclass(eq=False, frozen=True)
+#***===== Histone Class =====***#
+class _RowAttribute:
+    """ A descriptor for a Histone attribute that is decoded from a column of the database row on first access. """
+    def __init__(self, column: str, decode: Optional[Callable[[Any], Any]] = None):
+        self._column = column
+        self._decode = decode
+
+    def __set_name__(self, owner: type, name: str):
+        # The decoded value is stored in a slot with the same name prefixed by an underscore.
+        self._slot = "_" + name
+
+    def __get__(self, instance: Optional["Histone"], owner: type) -> Any:
+        if instance is None:
+            return self
+
+        try:
+            return getattr(instance, self._slot)
+        except AttributeError:
+            value = instance._row[self._column]
+
+            if not self._decode is None:
+                value = self._decode(value)
+
+            object.__setattr__(instance, self._slot, value)
+            return value
+
+def _decode_optional_json(value: Optional[str]) -> Any:
+    """ Decodes a JSON column that may be NULL. """
+    if value is None:
+        return None
+    else:
+        return json.loads(value)
+
+def _decode_rankings(ranks_json: str) -> dict[Multimer, list[int]]:
+    """ Decodes the model rankings JSON of a row into a dictionary with the rankings per multimer. """
+    ranks = json.loads(ranks_json)
+    return {Multimer(multimer):ranks[multimer] for multimer in ranks.keys()}
+
+def _decode_timestamp(timestamp: str) -> datetime.datetime:
+    """ Decodes an SQL timestamp. """
+    return datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+
 class Histone:
-    """ A compound dataclass to hold all the metadata for a single histone. """
-    uniprot_id: str
-    organism: Organism
-    sequence: Sequence
+    """
+    A class to hold all the metadata for a single histone. It is backed by a row of the search view
+    and only decodes the columns of the row when the corresponding attribute is first accessed. The
+    lineage isn't part of the row and is only loaded from the taxonomy tables when it is first accessed.
+    """
+    __slots__ = (
+        "_row", "_lineage_loader", "category",
+        "_organism", "_sequence", "_lineage", "_protein_ids", "_proteome_ids", "_gene_names", "_protein_names",
+        "_genome_ids", "_pdb_ids", "_multimer_rankings", "_publications", "_rel_path", "_last_updated"
+    )
+
+    _row: Mapping
+    _lineage_loader: Optional[Callable[[str], list[Lineage]]]
     category: Category
-    lineage: list[Lineage]
-    protein_ids: list[str]
-    proteome_ids: Union[list[str], None]
-    gene_names: list[str]
-    protein_names: list[str]
-    genome_ids: list[str]
-    pdb_ids: list[str]
-    multimer_rankings: dict[Multimer, list[int]]
-    publications: Union[list[str], None]
-    rel_path: Path
-    last_updated: datetime.datetime
+
+    sequence: Sequence = _RowAttribute("sequence", Sequence)
+    protein_ids: list[str] = _RowAttribute("protein_ids", json.loads)
+    proteome_ids: Union[list[str], None] = _RowAttribute("proteome_ids", _decode_optional_json)
+    gene_names: list[str] = _RowAttribute("gene_names", json.loads)
+    protein_names: list[str] = _RowAttribute("protein_names", json.loads)
+    genome_ids: list[str] = _RowAttribute("genome_ids", json.loads)
+    pdb_ids: list[str] = _RowAttribute("pdb_ids", json.loads)
+    multimer_rankings: dict[Multimer, list[int]] = _RowAttribute("ranks", _decode_rankings)
+    publications: Union[list[str], None] = _RowAttribute("publications", json.loads)
+    rel_path: Path = _RowAttribute("rel_path", Path)
+    last_updated: datetime.datetime = _RowAttribute("last_updated", _decode_timestamp)
+
+    def __init__(self, row: Mapping, category: Category, lineage_loader: Optional[Callable[[str], list[Lineage]]] = None):
+        """
+        Takes a row of the search view, the Category corresponding to its category ID and a function
+        that returns the lineage for the ID of the organism.
+        """
+        object.__setattr__(self, "_row", row)
+        object.__setattr__(self, "_lineage_loader", lineage_loader)
+        object.__setattr__(self, "category", category)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"Can't set attribute '{name}' of a Histone.")
+
+    def __repr__(self) -> str:
+        return f"Histone({self.uniprot_id})"
+
+    @property
+    def uniprot_id(self) -> str:
+        return self._row["uniprot_id"]
+
+    @property
+    def organism(self) -> Organism:
+        try:
+            return self._organism
+        except AttributeError:
+            object.__setattr__(self, "_organism", Organism(self._row["organism_id"], self._row["organism"]))
+            return self._organism
+
+    @property
+    def lineage(self) -> list[Lineage]:
+        try:
+            return self._lineage
+        except AttributeError:
+            if self._lineage_loader is None:
+                raise AttributeError(f"No lineage is available for {self}.")
+
+            object.__setattr__(self, "_lineage", self._lineage_loader(self.organism.id))
+            return self._lineage
 
     @property
     def multimers(self) -> list[Multimer]:
@@ -0,0 +1,172 @@
+""" Defines the k-mer profiles of the sequences that are used for similarity searches. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+from typing import Iterable, Optional
+from pathlib import Path
+
+import math
+import os
+
+#*----- Flask & Flask Extenstions -----*#
+import flask
+
+#*----- External packages -----*#
+import numpy as np
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+
+#***===== Constants =====***#
+# Only the standard amino acids are part of the profiles. K-mers with any other symbol are skipped.
+PROFILE_ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+
+_ALPHABET_LOOKUP = np.full(256, -1, dtype=np.int64)
+_ALPHABET_LOOKUP[np.frombuffer(PROFILE_ALPHABET.encode(), dtype=np.uint8)] = np.arange(len(PROFILE_ALPHABET))
+
+#***===== Profile Functions =====***#
+def _kmer_columns(sequence: str, kmer_size: int) -> np.ndarray:
+    """ Returns the column in a profile for every k-mer in the sequence that only consists of standard amino acids. """
+    codes = _ALPHABET_LOOKUP[np.frombuffer(sequence.upper().encode("ascii", "replace"), dtype=np.uint8)]
+
+    if len(codes) < kmer_size:
+        return np.empty(0, dtype=np.int64)
+
+    windows = np.lib.stride_tricks.sliding_window_view(codes, kmer_size)
+    windows = windows[(windows >= 0).all(axis=1)]
+
+    # Read every k-mer as a number in base 20 to get its column.
+    return windows @ (len(PROFILE_ALPHABET) ** np.arange(kmer_size - 1, -1, -1))
+
+def sequence_profile(sequence: str, kmer_size: int) -> np.ndarray:
+    """ Returns the k-mer profile of a sequence, which is the vector of its k-mer counts normalized to unit length. """
+    profile = np.bincount(_kmer_columns(sequence, kmer_size), minlength=len(PROFILE_ALPHABET) ** kmer_size).astype(np.float32)
+    norm = np.linalg.norm(profile)
+
+    if norm > 0:
+        profile /= norm
+
+    return profile
+
+#***===== Profiles Class =====***#
+class Profiles:
+    """ The k-mer profiles of all the sequences in the database, with a row in the profile matrix per entry. """
+    def __init__(self, matrix: np.ndarray, uniprot_ids: np.ndarray):
+        """ Takes the profile matrix and the UniProt IDs corresponding to its rows. """
+        if matrix.shape[0] != len(uniprot_ids):
+            raise ValueError(f"The profile matrix has {matrix.shape[0]} rows, but {len(uniprot_ids)} UniProt IDs were supplied.")
+
+        self.matrix = matrix
+        self.uniprot_ids = uniprot_ids
+
+    @property
+    def kmer_size(self) -> int:
+        """ Returns the length of the k-mers, which follows from the number of columns in the profile matrix. """
+        return round(math.log(self.matrix.shape[1], len(PROFILE_ALPHABET)))
+
+    def scores(self, sequence: str) -> np.ndarray:
+        """ Returns the cosine similarity between the profile of the sequence and that of every entry in a single pass over the matrix. """
+        return self.matrix @ sequence_profile(sequence, self.kmer_size)
+
+    def top(self, sequence: str, limit: int) -> list[tuple[str, float]]:
+        """ Returns the UniProt IDs and scores of the entries most similar to the sequence, starting with the most similar one. """
+        scores = self.scores(sequence)
+        limit = min(limit, len(scores))
+
+        if limit <= 0:
+            return []
+
+        # Only sort the best entries. Ties are broken by the UniProt ID to keep the order deterministic.
+        rows = np.argpartition(-scores, limit - 1)[:limit]
+        rows = rows[np.lexsort((self.uniprot_ids[rows], -scores[rows]))]
+
+        return [(str(self.uniprot_ids[row]), float(scores[row])) for row in rows]
+
+#***===== Storage Functions =====***#
+def get_profile_paths() -> tuple[Path, Path]:
+    """ Returns the paths of the files with the profile matrix and the corresponding UniProt IDs. """
+    matrix_path = Path(flask.current_app.config["SIMILARITY_PROFILES"])
+    return matrix_path, matrix_path.with_name(matrix_path.stem + "_ids.npy")
+
+def _tmp_path(path: Path) -> Path:
+    """ Returns the path of the file that is written before it replaces the file at the path. """
+    return path.with_name(path.name + ".tmp")
+
+def _save_array(path: Path, array: np.ndarray):
+    """ Saves an array by replacing the file, so that processes with a memory map of the old file can keep using it. """
+    tmp_path = _tmp_path(path)
+
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+
+    os.replace(tmp_path, path)
+
+def write_profiles(sequences: Iterable[tuple[str, str]], count: int, kmer_size: int):
+    """
+    Computes the profiles for a number of pairs of UniProt IDs and sequences and writes them to the profile
+    files. The rows of the matrix are written to a memory-mapped file one at a time, so the matrix is never
+    held in memory as a whole.
+    """
+    matrix_path, ids_path = get_profile_paths()
+    shape = (count, len(PROFILE_ALPHABET) ** kmer_size)
+    uniprot_ids = []
+
+    if count == 0:
+        # An empty file can't be memory-mapped.
+        _save_array(matrix_path, np.zeros(shape, dtype=np.float32))
+    else:
+        matrix = np.lib.format.open_memmap(_tmp_path(matrix_path), mode="w+", dtype=np.float32, shape=shape)
+
+        for row, (uid, sequence) in enumerate(sequences):
+            matrix[row] = sequence_profile(sequence, kmer_size)
+            uniprot_ids.append(uid)
+
+        matrix.flush()
+        del matrix
+
+        if len(uniprot_ids) != count:
+            raise ValueError(f"Expected {count} sequences for the profiles, but got {len(uniprot_ids)}.")
+
+    # The UniProt IDs are written first, so that the files are only briefly out of sync.
+    _save_array(ids_path, np.array(uniprot_ids, dtype=str))
+
+    if count > 0:
+        os.replace(_tmp_path(matrix_path), matrix_path)
+
+def get_profiles_key() -> Optional[tuple]:
+    """ Returns a key that changes whenever one of the profile files is replaced, or None if there are no profile files. """
+    matrix_path, ids_path = get_profile_paths()
+
+    try:
+        return (matrix_path.stat().st_mtime_ns, ids_path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+def get_profiles() -> Optional[Profiles]:
+    """
+    Returns the profiles of the app. The profile matrix is memory-mapped, so that all the workers on
+    a server share the same memory. The files are mapped again whenever they have been replaced.
+    Returns None if there are no (consistent) profile files.
+    """
+    app = flask.current_app
+    matrix_path, ids_path = get_profile_paths()
+    key = get_profiles_key()
+
+    if key is None:
+        app.logger.warning(f"No profile files found at '{matrix_path}'. Similarity searches are unavailable.")
+        return None
+
+    cached = app.extensions.get("profiles")
+
+    if cached is None or cached[0] != key:
+        try:
+            profiles = Profiles(np.load(matrix_path, mmap_mode="r"), np.load(ids_path))
+        except ValueError as e:
+            # The files are replaced one at a time, so they can briefly be out of sync.
+            app.logger.warning(f"Couldn't load the profiles: {e}")
+            return None
+
+        app.extensions["profiles"] = (key, profiles)
+        cached = app.extensions["profiles"]
+
+    return cached[1]
@@ -16,14 +16,16 @@ from werkzeug.exceptions import HTTPException
 
 #***===== Flask App Initialization =====***#
 def register_handlers(app: Flask):
+    app.register_error_handler(400, error_page)
     app.register_error_handler(403, error_page)
     app.register_error_handler(404, error_page)
     app.register_error_handler(500, error_page)
+    app.register_error_handler(503, error_page)
 
 #***===== HTTP Error Handlers =====***#
 def error_page(e: Union[Exception, int]):
     if isinstance(e, HTTPException):
-        return flask.render_template("pages/error.html.j2", status=e.code), e.code
+        return flask.render_template("pages/error.html.j2", status=e.code, description=e.description), e.code
     else:
         flask.current_app.logger.critical(f"Unknown error!: {e}")
         return flask.render_template("pages/error.html.j2"), 500
\ No newline at end of file
@@ -0,0 +1,178 @@
+""" A cache for the results of search queries. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+from typing import Any, Callable, Hashable, Optional
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+
+#*----- Flask & Flask Extensions -----*#
+import flask
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+from .. import database
+
+#***===== QueryCache Class =====***#
+class QueryCache:
+    """
+    A thread-safe LRU cache for query results with an optional on-disk tier that can be shared between
+    processes. All cached entries belong to a single version of the data in the database and are
+    discarded as soon as a different data version is requested.
+    """
+    #*----- Constructors -----*#
+    def __init__(self, max_size: int, ttl: Optional[float] = None, disk_path: Optional[Path] = None):
+        """
+        Takes the maximum number of entries kept in memory, the number of seconds after which entries
+        expire (never if not set) and the path of an optional SQLite file for the on-disk tier.
+        """
+        self._max_size = max_size
+        self._ttl = ttl if ttl else None
+        self._disk_path = disk_path
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+        self._stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+        if not self._disk_path is None:
+            with closing(sqlite3.connect(self._disk_path)) as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, version TEXT NOT NULL, created REAL NOT NULL, value BLOB NOT NULL)")
+                conn.commit()
+
+    #*----- Properties -----*#
+    @property
+    def stats(self) -> dict[str, int]:
+        """ Returns the hit and miss counters of the cache together with its current and maximum size. """
+        with self._lock:
+            return self._stats | {"size": len(self._entries), "max_size": self._max_size}
+
+    #*----- Private functions -----*#
+    def _set_version(self, version: str):
+        """ Discards all the entries if they belong to another data version. Should be called with the lock held. """
+        if version == self._version:
+            return
+
+        if not self._version is None:
+            self._stats["invalidations"] += 1
+
+        self._entries.clear()
+        self._version = version
+
+        if not self._disk_path is None:
+            with closing(sqlite3.connect(self._disk_path)) as conn:
+                conn.execute("DELETE FROM cache WHERE version != ?", [version])
+                conn.commit()
+
+    def _is_expired(self, created: float) -> bool:
+        return not self._ttl is None and time.time() - created > self._ttl
+
+    def _get_from_disk(self, version: str, key: str) -> tuple[float, Any]:
+        """ Returns the creation time and value for the key from the on-disk tier. Raises a KeyError if it's not there. """
+        with closing(sqlite3.connect(self._disk_path)) as conn:
+            row = conn.execute("SELECT created, value FROM cache WHERE key = ? AND version = ?", [key, version]).fetchone()
+
+        if row is None or self._is_expired(row[0]):
+            raise KeyError(key)
+
+        return row[0], pickle.loads(row[1])
+
+    def _put_on_disk(self, version: str, key: str, created: float, value: Any):
+        """ Stores the value for the key in the on-disk tier. """
+        with closing(sqlite3.connect(self._disk_path)) as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, version, created, value) VALUES (?, ?, ?, ?)", [key, version, created, pickle.dumps(value)])
+            conn.commit()
+
+    #*----- Public functions -----*#
+    def get_or_compute(self, version: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """ Returns the cached value for the key and data version. Computes and caches the value if it isn't cached. """
+        # Use a digest of the key's representation since it should be the same in every process.
+        key = hashlib.sha256(repr(key).encode()).hexdigest()
+
+        with self._lock:
+            self._set_version(version)
+
+            if key in self._entries:
+                created, value = self._entries[key]
+
+                if not self._is_expired(created):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        # Try the on-disk tier and otherwise compute the value outside of the lock.
+        try:
+            if self._disk_path is None:
+                raise KeyError(key)
+
+            created, value = self._get_from_disk(version, key)
+            stat = "disk_hits"
+        except KeyError:
+            created = time.time()
+            value = compute()
+            stat = "misses"
+
+            if not self._disk_path is None:
+                self._put_on_disk(version, key, created, value)
+
+        with self._lock:
+            self._stats[stat] += 1
+
+            # Don't store values that were computed for a data version that has been replaced in the mean time.
+            if version == self._version:
+                self._entries[key] = (created, value)
+                self._entries.move_to_end(key)
+
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+
+        return value
+
+    def clear(self):
+        """ Discards all the entries in the cache. """
+        with self._lock:
+            self._entries.clear()
+
+            if not self._disk_path is None:
+                with closing(sqlite3.connect(self._disk_path)) as conn:
+                    conn.execute("DELETE FROM cache")
+                    conn.commit()
+
+#***===== Functions =====***#
+def get_query_cache() -> Optional[QueryCache]:
+    """ Returns the query cache of the app, setting it up from the app config on first use. Returns None if the cache is disabled. """
+    app = flask.current_app
+
+    if not "query_cache" in app.extensions:
+        max_size = app.config.get("QUERY_CACHE_SIZE", 0)
+        disk_path = app.config.get("QUERY_CACHE_FILE")
+
+        if max_size > 0:
+            app.extensions["query_cache"] = QueryCache(max_size, app.config.get("QUERY_CACHE_TTL"), None if not disk_path else Path(disk_path))
+        else:
+            app.extensions["query_cache"] = None
+
+    return app.extensions["query_cache"]
+
+def cached(key: Hashable, compute: Callable[[], Any]) -> Any:
+    """ Returns the cached value for the key for the current data in the database. Computes and caches the value if it isn't cached. """
+    cache = get_query_cache()
+
+    if cache is None:
+        return compute()
+
+    return cache.get_or_compute(database.get_data_version(), key, compute)
@@ -0,0 +1,122 @@
+""" Query plan inspection that shows how the SQL generated for a search is executed by the database. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+from typing import Union, Any
+from urllib.parse import parse_qsl
+
+import time
+
+#*----- Flask & Flask Extensions -----*#
+
+#*----- External packages -----*#
+from werkzeug.datastructures import MultiDict
+import click
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+from . import sql
+from .. import database
+from ..database.connections import DatabaseConnection
+
+#***===== Functions =====***#
+def explain_statement(database_connection: DatabaseConnection, statement: sql._SQLCondition) -> dict[str, Any]:
+    """
+    Returns the SQL and parameters of a statement together with its query plan, the number of rows
+    it returns and the measured time it took to execute in milliseconds.
+
+    WARNING: Currently sqlite only due to `EXPLAIN QUERY PLAN`!
+    """
+    parameters = list(statement.parameters)
+    plan = database_connection.execute("EXPLAIN QUERY PLAN " + statement.str, parameters).fetchall()
+
+    # Indent the steps of the plan by their depth, which follows from the ID of their parent step.
+    depths = {0: -1}
+    steps = []
+
+    for (step_id, parent_id, _, detail) in plan:
+        depths[step_id] = depths.get(parent_id, -1) + 1
+        steps.append("  " * depths[step_id] + detail)
+
+    start = time.perf_counter()
+    rows = database_connection.execute(statement.str, parameters).fetchall()
+    latency = (time.perf_counter() - start) * 1000
+
+    return {
+        "sql": statement.str,
+        "parameters": parameters,
+        "plan": steps,
+        "rows": len(rows),
+        "latency_ms": round(latency, 3)
+    }
+
+def explain_query(filter: Union[sql.Filter, sql.CombinedFilterABC, None], limit: int, offset: int) -> dict[str, Any]:
+    """
+    Returns the explanation of both statements of a search query with the filter: the one that counts
+    the results per facet and the one that selects the results on a page. It also includes the time
+    it took to generate the SQL and the number of results estimated from the statistics of the fields.
+    """
+    db = database.get_db()
+
+    # Generating the SQL can take time by itself, since motif filters scan the sequences.
+    start = time.perf_counter()
+    query = sql.Query(filter=filter, limit=limit, offset=offset)
+    build_latency = (time.perf_counter() - start) * 1000
+
+    statistics = database.get_field_statistics()
+    entries = max([field_statistics.entries for field_statistics in statistics.values()], default=None)
+
+    if entries is None:
+        estimate = None
+    elif filter is None:
+        estimate = entries
+    else:
+        estimate = round(entries * filter._selectivity(statistics))
+
+    return {
+        "build_latency_ms": round(build_latency, 3),
+        "estimated_results": estimate,
+        "counts": explain_statement(db, query.counts_statement),
+        "results": explain_statement(db, query.statement),
+        "field_statistics": {field: {
+            "rows": field_statistics.rows,
+            "distinct_values": field_statistics.distinct_values,
+            "selectivity": field_statistics.selectivity,
+            "indexed": field_statistics.indexed
+        } for (field, field_statistics) in sorted(statistics.items())}
+    }
+
+#***===== Blueprint Import =====***#
+from . import bp
+
+#***===== Register CLI commands =====***#
+@bp.cli.command("explain")
+@click.argument("query-string", default="")
+@click.option("-p", "--page", type=int, default=1, show_default=True, help="The page of results to explain.")
+def explain(query_string: str, page: int = 1):
+    """ Print the SQL, query plan and latency of the search for 'QUERY_STRING', e.g. 'cid=1&org=Thermococcus'. """
+    # Imported here since the routes module depends on this module.
+    from .routes import prepare_args, filter_from_args, NUM_RESULTS
+
+    filter = filter_from_args(prepare_args(MultiDict(parse_qsl(query_string))))
+    explanation = explain_query(filter, NUM_RESULTS, (max(page, 1) - 1) * NUM_RESULTS)
+
+    click.echo(f"Generated SQL in {explanation['build_latency_ms']} ms, estimated results: {explanation['estimated_results']}")
+
+    for name in ["counts", "results"]:
+        statement = explanation[name]
+        click.echo(f"\n=== {name} ===")
+        click.echo(statement["sql"])
+        click.echo(f"Parameters: {statement['parameters']}")
+        click.echo("Plan:")
+
+        for step in statement["plan"]:
+            click.echo(f"  {step}")
+
+        click.echo(f"Rows: {statement['rows']} in {statement['latency_ms']} ms")
+
+    click.echo("\n=== field statistics ===")
+
+    for field, field_statistics in explanation["field_statistics"].items():
+        indexed = "indexed" if field_statistics["indexed"] else "NOT INDEXED"
+        click.echo(f"{field}\t{field_statistics['distinct_values']} distinct values\tselectivity {field_statistics['selectivity']:.4g}\t{indexed}")
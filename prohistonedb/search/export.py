@@ -0,0 +1,107 @@
+""" Bulk exports that stream all the results of a search in a file format instead of rendering them. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+from typing import Iterator, Mapping, Sequence
+
+import csv
+import io
+import json
+
+#*----- Flask & Flask Extensions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+from ..types import Field
+from ..database.connections import DatabaseResult
+
+#***===== Constants =====***#
+# The number of rows that are fetched from the database and written to the response at once.
+_EXPORT_BATCH_SIZE = 500
+
+# The number of amino acids on every sequence line of a FASTA file.
+_FASTA_LINE_LENGTH = 60
+
+# The fields that are exported in the tabular formats, in the order of their columns.
+EXPORT_FIELDS = [
+    Field.UNIPROT_ID,
+    Field.ORGANISM,
+    Field.ORGANISM_ID,
+    Field.CATEGORY,
+    Field.LINEAGE_SUPERKINGDOM,
+    Field.SEQUENCE_LEN,
+    Field.PROTEIN_IDS,
+    Field.PROTEOME_IDS,
+    Field.GENOME_IDS,
+    Field.GENE_NAMES,
+    Field.PROTEIN_NAMES,
+    Field.SEQUENCE
+]
+
+# The fields that are needed for every format and the mimetype and file extension of the format.
+EXPORT_FORMATS = {
+    "csv": (EXPORT_FIELDS, "text/csv", "csv"),
+    "tsv": (EXPORT_FIELDS, "text/tab-separated-values", "tsv"),
+    "fasta": ([Field.UNIPROT_ID, Field.SEQUENCE], "text/x-fasta", "fasta"),
+    "ndjson": (EXPORT_FIELDS, "application/x-ndjson", "ndjson")
+}
+
+#***===== Functions =====***#
+def _batches(results: DatabaseResult) -> Iterator[Sequence[Mapping]]:
+    """ Yields the rows of the results in batches, so that only a single batch is kept in memory. """
+    while True:
+        rows = results.fetchmany(_EXPORT_BATCH_SIZE)
+
+        if not rows:
+            return
+
+        yield rows
+
+def _delimited(results: DatabaseResult, delimiter: str) -> Iterator[str]:
+    """ Yields the results as delimited text with a header row. Lists of values are separated by semicolons. """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+    writer.writerow([field.search_name for field in EXPORT_FIELDS])
+
+    for rows in _batches(results):
+        for row in rows:
+            values = [field.value_from_db(row[field.db_name]) for field in EXPORT_FIELDS]
+            writer.writerow([";".join(value) if isinstance(value, list) else value for value in values])
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue()
+
+def _fasta(results: DatabaseResult) -> Iterator[str]:
+    """ Yields the results as FASTA records with the UniProt ID as the header. """
+    for rows in _batches(results):
+        records = []
+
+        for row in rows:
+            sequence = row[Field.SEQUENCE.db_name]
+            lines = [sequence[i:i+_FASTA_LINE_LENGTH] for i in range(0, len(sequence), _FASTA_LINE_LENGTH)]
+            records.append(f">{row[Field.UNIPROT_ID.db_name]}\n" + "\n".join(lines) + "\n")
+
+        yield "".join(records)
+
+def _ndjson(results: DatabaseResult) -> Iterator[str]:
+    """ Yields the results as a JSON object per line, keyed by the search names of the fields. """
+    for rows in _batches(results):
+        yield "".join([json.dumps({field.search_name: field.value_from_db(row[field.db_name]) for field in EXPORT_FIELDS}) + "\n" for row in rows])
+
+def export_results(results: DatabaseResult, format: str) -> Iterator[str]:
+    """ Yields the results of a query with the fields of the format in chunks of text. Raises a ValueError for unknown formats. """
+    if format == "csv":
+        return _delimited(results, ",")
+    elif format == "tsv":
+        return _delimited(results, "\t")
+    elif format == "fasta":
+        return _fasta(results)
+    elif format == "ndjson":
+        return _ndjson(results)
+    else:
+        raise ValueError(f"'{format}' is not a valid export format.")
@@ -0,0 +1,255 @@
+""" Motif searches that match the sequences against PROSITE patterns or restricted regular expressions. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+from typing import Optional, Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+import multiprocessing
+import re
+
+#*----- Flask & Flask Extensions -----*#
+import flask
+
+#*----- External packages -----*#
+import click
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+
+#***===== Constants =====***#
+# A single PROSITE pattern element with an optional repetition, e.g. 'C', 'x(2,4)', '[ST]' or '{P}'.
+_PROSITE_ELEMENT = re.compile(r"(?:(?P<any>x)|(?P<amino_acid>[A-Z])|\[(?P<include>[A-Z]+)(?P<end>>?)\]|\{(?P<exclude>[A-Z]+)\})(?:\((?P<min>\d+)(?:,(?P<max>\d+))?\))?")
+
+# The restricted regular expressions only allow single amino acids, wildcards and character classes
+# with optional quantifiers. Groups and alternatives aren't allowed to keep the matching fast.
+_REGEX_TOKEN = re.compile(r"(?P<atom>[A-Z.]|\[\^?[A-Z]+\])(?P<quantifier>[?*+]|\{(?P<min>\d+)(?P<range>,(?P<max>\d*))?\})?")
+
+# The limits on the motifs, which keep the backtracking of the regular expressions bounded. Every
+# repetition has a maximum, and the number of ways in which the elements with a variable number of
+# repetitions can be combined at a single position of a sequence is limited.
+_MAX_MOTIF_LENGTH = 100
+_MAX_REPEAT = 50
+_MAX_COMBINATIONS = 256
+
+#***===== Motif Class =====***#
+class Motif:
+    """
+    A motif in either PROSITE syntax (e.g. 'C-x(2,4)-C-[ST]') or as a restricted regular expression
+    (e.g. 'C.{2,4}C[ST]'). The motif is compiled once into a regular expression, together with the
+    literal parts that any match must contain.
+    """
+    def __init__(self, value: str):
+        """ Takes the motif. Raises a ValueError if it isn't a valid PROSITE pattern or restricted regular expression. """
+        value = value.strip()
+
+        if not value:
+            raise ValueError("An empty motif is not valid.")
+
+        if len(value) > _MAX_MOTIF_LENGTH:
+            raise ValueError(f"A motif can't be longer than {_MAX_MOTIF_LENGTH} characters.")
+
+        if self.is_prosite(value):
+            pattern, literals, combinations = self._parse_prosite(value)
+        else:
+            pattern, literals, combinations = self._parse_regex(value.upper())
+
+        if combinations > _MAX_COMBINATIONS:
+            raise ValueError(f"'{value}' has too many variable repetitions. Use fewer or narrower ranges.")
+
+        self.regex = re.compile(pattern)
+        self.literals = [literal for literal in literals if literal]
+
+    @staticmethod
+    def is_prosite(value: str) -> bool:
+        """ Returns whether the value uses PROSITE syntax instead of regular expression syntax. """
+        return re.search(r"[-()<>x]|\{[A-Z]", value) is not None
+
+    @staticmethod
+    def _repeat_range(minimum: int, maximum: int) -> int:
+        """ Returns the number of different repetitions in the range. Raises a ValueError if the range isn't valid. """
+        if maximum > _MAX_REPEAT:
+            raise ValueError(f"A motif element can't be repeated more than {_MAX_REPEAT} times.")
+
+        if minimum > maximum:
+            raise ValueError(f"'{minimum},{maximum}' is not a valid range of repetitions.")
+
+        return maximum - minimum + 1
+
+    @staticmethod
+    def _parse_prosite(value: str) -> tuple[str, list[str], int]:
+        """
+        Returns the regular expression for a PROSITE pattern, the literal parts of the pattern and the
+        number of ways in which its variable repetitions can be combined.
+        """
+        value = value.removesuffix(".")
+        pattern = ""
+        literals = [""]
+        combinations = 1
+
+        if value.startswith("<"):
+            pattern += "^"
+            value = value[1:]
+
+        end = value.endswith(">")
+
+        if end:
+            value = value[:-1]
+
+        for element in value.split("-"):
+            match = _PROSITE_ELEMENT.fullmatch(element)
+
+            if match is None:
+                raise ValueError(f"'{element}' is not a valid PROSITE pattern element.")
+
+            if not match["any"] is None:
+                atom = "."
+            elif not match["amino_acid"] is None:
+                atom = match["amino_acid"]
+            elif not match["include"] is None:
+                # A '>' within square brackets means the element can also be the C-terminal end of the sequence.
+                atom = f"(?:[{match['include']}]|$)" if match["end"] else f"[{match['include']}]"
+
+                if match["end"]:
+                    combinations *= 2
+            else:
+                atom = f"[^{match['exclude']}]"
+
+            if match["min"] is None:
+                repeat = ""
+                count = 1
+            elif match["max"] is None:
+                repeat = f"{{{match['min']}}}"
+                count = int(match["min"])
+                Motif._repeat_range(count, count)
+            else:
+                repeat = f"{{{match['min']},{match['max']}}}"
+                count = None
+                combinations *= Motif._repeat_range(int(match["min"]), int(match["max"]))
+
+            pattern += atom + repeat
+
+            # Only amino acids with a fixed number of repeats are literal parts of the pattern.
+            if not match["amino_acid"] is None and not count is None:
+                literals[-1] += atom * count
+            else:
+                literals.append("")
+
+        if end:
+            pattern += "$"
+
+        return pattern, literals, combinations
+
+    @staticmethod
+    def _parse_regex(value: str) -> tuple[str, list[str], int]:
+        """
+        Returns the validated restricted regular expression, its literal parts and the number of ways in
+        which its variable repetitions can be combined. Unbounded quantifiers ('*', '+' and '{n,}') aren't
+        allowed, since they can make a match take exponential time.
+        """
+        start = "^" if value.startswith("^") else ""
+        end = "$" if value.endswith("$") and len(value) > len(start) else ""
+        body = value[len(start):len(value) - len(end)]
+
+        literals = [""]
+        combinations = 1
+        position = 0
+
+        for match in _REGEX_TOKEN.finditer(body):
+            if match.start() != position:
+                break
+
+            position = match.end()
+            atom = match["atom"]
+            quantifier = match["quantifier"]
+
+            if quantifier is None:
+                (minimum, maximum) = (1, 1)
+            elif quantifier == "?":
+                (minimum, maximum) = (0, 1)
+            elif quantifier in ["*", "+"] or (match["range"] and not match["max"]):
+                raise ValueError(f"'{value}' has an unbounded repetition. Use a range like '{{0,{_MAX_REPEAT}}}' instead.")
+            else:
+                minimum = int(match["min"])
+                maximum = int(match["max"]) if match["range"] else minimum
+
+            combinations *= Motif._repeat_range(minimum, maximum)
+
+            # Amino acids are literal parts for as many times as they are at least repeated.
+            if atom.isalpha():
+                literals[-1] += atom * minimum
+
+                if minimum != maximum:
+                    literals.append("")
+            else:
+                literals.append("")
+
+        if position != len(body) or not body:
+            raise ValueError(f"'{value}' is not a valid PROSITE pattern or restricted regular expression.")
+
+        return start + body + end, literals, combinations
+
+    def __repr__(self) -> str:
+        return f"Motif({self.regex.pattern})"
+
+#***===== Scanning Functions =====***#
+def _scan_chunk(pattern: str, rows: Sequence[tuple[str, str]]) -> list[tuple[str, list[tuple[int, int]]]]:
+    """ Returns the UniProt IDs with the positions of the matches for the rows with a sequence matching the pattern. """
+    # The regular expression module caches compiled patterns, so every process only compiles it once.
+    regex = re.compile(pattern)
+    results = []
+
+    for uid, sequence in rows:
+        positions = [(match.start() + 1, match.end()) for match in regex.finditer(sequence.upper())]
+
+        if len(positions) > 0:
+            results.append((uid, positions))
+
+    return results
+
+def get_scan_pool() -> Optional[ProcessPoolExecutor]:
+    """ Returns the process pool of the app for scanning sequences, setting it up on first use. Returns None if scanning isn't parallel. """
+    app = flask.current_app
+
+    if not "motif_scan_pool" in app.extensions:
+        processes = app.config.get("MOTIF_SCAN_PROCESSES", 0)
+
+        # Spawn the processes, since forking a server process with running threads isn't safe.
+        if processes > 1:
+            app.extensions["motif_scan_pool"] = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            app.extensions["motif_scan_pool"] = None
+
+    return app.extensions["motif_scan_pool"]
+
+def scan_sequences(motif: Motif, rows: Sequence[tuple[str, str]]) -> dict[str, list[tuple[int, int]]]:
+    """
+    Returns the positions (starting at 1 and inclusive) of the matches of the motif for the rows of
+    UniProt IDs and sequences that match it. Large numbers of rows are scanned in parallel chunks.
+    """
+    chunk_size = max(flask.current_app.config.get("MOTIF_SCAN_CHUNK_SIZE", 1000), 1)
+    pool = get_scan_pool()
+
+    if pool is None or len(rows) <= chunk_size:
+        return dict(_scan_chunk(motif.regex.pattern, rows))
+
+    chunks = [rows[i:i+chunk_size] for i in range(0, len(rows), chunk_size)]
+    futures = [pool.submit(_scan_chunk, motif.regex.pattern, chunk) for chunk in chunks]
+
+    return {uid: positions for future in futures for (uid, positions) in future.result()}
+
+#***===== Blueprint Import =====***#
+from . import bp
+
+#***===== Register CLI commands =====***#
+@bp.cli.command("motif")
+@click.argument("motif")
+def scan(motif: str):
+    """ Print the UniProt IDs and the positions of the matches of the entries with a sequence matching 'MOTIF'. """
+    # Imported here since the SQL module depends on this module.
+    from .sql import MotifFilter
+
+    positions = MotifFilter(motif).positions()
+
+    for uid in sorted(positions.keys()):
+        click.echo(f"{uid}\t" + ",".join([f"{start}-{end}" for (start, end) in positions[uid]]))
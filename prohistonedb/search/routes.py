@@ -15,10 +15,18 @@ from werkzeug.datastructures import MultiDict
 #*----- Local imports -----*#
 from . import sql
 from . import results_to_histones
+from .cache import cached, get_query_cache
+from .similarity import similar_entries
+from .explain import explain_query
+from .export import EXPORT_FORMATS, export_results
 
-from ..types import Field, ResultCounts
+from ..types import Field
 from .. import database
 
+#***===== Constants =====***#
+# The number of results on a page of search results.
+NUM_RESULTS = 20
+
 #***===== Functions =====***#
 def convert_args(args: MultiDict) -> MultiDict:
     """Takes request arguments and returns a MultiDict with filter=[field]&q=[value] syntax converted to [filter]=[value] pairs. """
@@ -52,6 +60,20 @@ def convert_args(args: MultiDict) -> MultiDict:
     
     return args
 
+def prepare_args(args: MultiDict) -> MultiDict:
+    """ Takes request arguments and returns them in [field]=[value] syntax without duplicate values. """
+    # Convert filter=[field]&q=[value] syntax to [field]=[value] syntax
+    try:
+        args = convert_args(args)
+    except Exception as e:
+        flask.current_app.logger.exception(**e)
+
+    # Remove duplicates
+    for key in args.keys():
+        args.setlist(key, list(set(args.getlist(key))))
+
+    return args
+
 #? Do we want to change behaviour away from discarding non-valid fields?
 def filter_from_args(args: MultiDict) -> Union[sql.Filter, sql.CombinedFilterABC, None]:
     """ Takes request arguments and returns a Filter to be used for an SQL query. """
@@ -76,6 +98,11 @@ def filter_from_args(args: MultiDict) -> Union[sql.Filter, sql.CombinedFilterABC
                     filters.append(sql.AnyFilter(values[0]))
             else:
                 filters.append(sql.OrFilter([sql.AnyFilter(value) for value in values]))
+        elif field == Field.MOTIF.search_name:
+            if len(values) == 1:
+                filters.append(sql.MotifFilter(values[0]))
+            else:
+                filters.append(sql.OrFilter([sql.MotifFilter(value) for value in values]))
         else:
             if len(values) == 1:
                 filters.append(sql.Filter(field, values[0]))
@@ -101,9 +128,6 @@ from . import bp
 @bp.route("/<page>")
 def index(page: Optional[int] = None):
     """ Process the search request and render the search results. """
-    # Prepare some variables
-    NUM_RESULTS = 20
-
     if page is None:
         page = 1
     
@@ -115,34 +139,20 @@ def index(page: Optional[int] = None):
     # Pre-process query parameters into a search filter
     args = flask.request.args.copy()
 
-    if args == None:
-        filter = None
-    else:
-        # Convert filter=[field]&q=[value] syntax to [field]=[value] syntax
-        try:
-            args = convert_args(args)
-        except Exception as e:
-            flask.current_app.logger.exception(**e)
+    # The cursor of the last result on the previous page is used to seek to the requested page.
+    cursor = args.pop("after", None)
 
-        # Remove duplicates
-        for key in args.keys():
-            args.setlist(key, list(set(args.getlist(key))))
+    args = prepare_args(args)
 
-        # Create a filter from the query parameters
+    try:
         filter = filter_from_args(args)
+    except ValueError as e:
+        flask.abort(400, description=str(e))
 
-    # Select the necessary fields and generate the SQL query
-    query = sql.Query(filter=filter)
-
-    # Get the database connection and query the generated SQL code.
+    # Get the database connection and count the results per facet.
     db = database.get_db()
-    results = query.execute(db)
-    columns = [column[0] for column in results.description]
-    results = results.fetchall()
-
-    # Turn the results into histone objects and get some metadata from them.
-    counts = ResultCounts(results, columns)
-    results = results_to_histones(results)
+    counts_query = sql.Query(filter=filter)
+    counts = cached(("counts",) + counts_query.cache_key, lambda: counts_query.result_counts(db))
 
     # Manage paging to fetch the correct results
     max_page = max(math.ceil(counts.total / NUM_RESULTS), 1)
@@ -152,9 +162,183 @@ def index(page: Optional[int] = None):
     if page > max_page:
         raise ValueError(f"Can't return page {page}. This request only has {max_page} pages.")
     
+    # Only fetch the results on the requested page, seeking past the previous page if its cursor is known.
+    if cursor is None:
+        query = sql.Query(filter=filter, limit=NUM_RESULTS, offset=(page - 1) * NUM_RESULTS)
+    else:
+        try:
+            query = sql.Query(filter=filter, limit=NUM_RESULTS, after=cursor)
+        except ValueError as e:
+            flask.abort(400, description=str(e))
+
+    results = cached(("rows",) + query.cache_key, lambda: [dict(row) for row in query.execute(db).fetchall()])
+
+    if page < max_page and len(results) > 0:
+        next_cursor = query.cursor(results[-1])
+    else:
+        next_cursor = None
+
+    # Turn the results into histone objects.
+    results = results_to_histones(results)
+    
     idx_min = (page - 1) * NUM_RESULTS
-    idx_max = page * NUM_RESULTS - 1
-    results = results[idx_min:(idx_max+1)]
+    idx_max = idx_min + len(results) - 1
     
     flask.current_app.logger.debug(f"Displaying results {idx_min} till {idx_max} for a total of {len(results)} results.")
-    return flask.render_template('pages/search.html.j2', results=results, page=page, max_page=max_page, counts=counts, req_filters=args)
\ No newline at end of file
+    return flask.render_template('pages/search.html.j2', results=results, page=page, max_page=max_page, next_cursor=next_cursor, counts=counts, req_filters=args)
+
+@bp.route("/similar", methods=["GET"])
+def similar():
+    """ Rank the entries by the similarity of their sequence to the supplied sequence and render them as search results. """
+    # Prepare some variables
+    MAX_RESULTS = 100
+
+    sequence = flask.request.args.get(Field.SEQUENCE.search_name, "").strip()
+    limit = min(max(flask.request.args.get("limit", NUM_RESULTS, type=int), 1), MAX_RESULTS)
+    align = flask.request.args.get("align", "") in ["1", "true"]
+
+    if not sequence:
+        flask.abort(400)
+
+    # The profiles are replaced after the database itself, so the hits also depend on the profile files.
+    try:
+        hits = cached(("similar", database.profiles.get_profiles_key(), sequence.upper(), limit, align), lambda: similar_entries(sequence, limit, align))
+    except LookupError:
+        flask.current_app.logger.exception("Similarity search failed.")
+        flask.abort(503)
+
+    # Fetch the entries through the usual search query and put them in the order of their scores.
+    uids = [uid for (uid, _) in hits]
+
+    if len(uids) == 0:
+        filter = sql.Filter(Field.UNIPROT_ID, "")
+    elif len(uids) == 1:
+        filter = sql.Filter(Field.UNIPROT_ID, uids[0])
+    else:
+        filter = sql.OrFilter([sql.Filter(Field.UNIPROT_ID, uid) for uid in uids])
+
+    db = database.get_db()
+    query = sql.Query(filter=filter)
+    counts = query.result_counts(db)
+
+    rows = {row[Field.UNIPROT_ID.db_name]: row for row in query.execute(db).fetchall()}
+    results = results_to_histones([rows[uid] for uid in uids if uid in rows])
+
+    return flask.render_template('pages/search.html.j2', results=results, page=1, max_page=1, next_cursor=None, counts=counts, req_filters=MultiDict())
+
+@bp.route("/export", methods=["GET"])
+def export():
+    """
+    Stream all the results of a search request in the file format in the 'format' argument (csv, tsv,
+    fasta or ndjson). The rows are written to the response while they are read from the database.
+    """
+    args = flask.request.args.copy()
+    format = args.pop("format", "csv")
+
+    if not format in EXPORT_FORMATS:
+        flask.abort(400)
+
+    (fields, mimetype, extension) = EXPORT_FORMATS[format]
+
+    # Pre-process query parameters into a search filter
+    args = prepare_args(args)
+
+    try:
+        filter = filter_from_args(args)
+    except ValueError as e:
+        flask.abort(400, description=str(e))
+
+    # Only select the exported fields and don't cache the results, since there can be any number of them.
+    query = sql.Query(selection=fields, filter=filter)
+    results = query.execute(database.get_db())
+
+    response = flask.Response(flask.stream_with_context(export_results(results, format)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=prohistonedb_search.{extension}"
+    return response
+
+@bp.route("/suggest", methods=["GET"])
+def suggest():
+    """ Return the most common terms of the 'field' argument that start with the 'prefix' argument as JSON, for suggestions in the search bar. """
+    # Prepare some variables
+    NUM_SUGGESTIONS = 10
+    MAX_SUGGESTIONS = 50
+
+    field = flask.request.args.get("field", "")
+    prefix = flask.request.args.get("prefix", "").strip()
+    limit = min(max(flask.request.args.get("limit", NUM_SUGGESTIONS, type=int), 1), MAX_SUGGESTIONS)
+
+    if not field in [suggest_field.search_name for suggest_field in Field.suggest_fields()]:
+        flask.abort(400)
+
+    if not prefix:
+        suggestions = []
+    else:
+        suggestions = cached(("suggest", field, prefix.lower(), limit), lambda: database.get_suggestions(Field(field), prefix, limit))
+
+    return {
+        "field": field,
+        "prefix": prefix,
+        "suggestions": [{"term": term, "entries": entries} for (term, entries) in suggestions]
+    }, 200
+
+@bp.route("/explain", methods=["GET"])
+@bp.route("/explain/<page>")
+def explain(page: Optional[int] = None):
+    """
+    Return the SQL generated for a search request as JSON, together with its query plan, measured
+    latency and estimated number of results. Only available when the app runs in debug mode.
+    """
+    if not flask.current_app.debug:
+        flask.abort(404)
+
+    page = 1 if page is None else int(page)
+
+    if page <= 0:
+        raise ValueError(f"{page} is not a valid page number.")
+
+    # Pre-process query parameters into a search filter
+    args = prepare_args(flask.request.args.copy())
+
+    try:
+        filter = filter_from_args(args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    return explain_query(filter, NUM_RESULTS, (page - 1) * NUM_RESULTS), 200
+
+@bp.route("/facets", methods=["GET"])
+def facets():
+    """ Return only the facet counts for a search request as JSON, without fetching or rendering the results. """
+    # Pre-process query parameters into a search filter
+    args = prepare_args(flask.request.args.copy())
+
+    try:
+        filter = filter_from_args(args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    # Count the results per facet.
+    db = database.get_db()
+    query = sql.Query(filter=filter)
+    counts = cached(("counts",) + query.cache_key, lambda: query.result_counts(db))
+
+    # Key the counts by the values that the facet checkboxes submit. Undefined superkingdoms are submitted as an empty string.
+    return {
+        "total": counts.total,
+        "categories": {str(category.id): counts.categories[category.name] for category in database.get_categories().values()},
+        "superkingdoms": {(superkingdom or ""): count for (superkingdom, count) in counts.superkingdoms.items()},
+        "max_seq_len": counts.max_seq_len
+    }, 200
+
+@bp.route("/cache", methods=["GET"])
+def cache_stats():
+    """ Return the hit and miss counters of the query cache as JSON for sizing the cache. Only available when the app runs in debug mode. """
+    if not flask.current_app.debug:
+        flask.abort(404)
+
+    cache = get_query_cache()
+
+    if cache is None:
+        flask.abort(404)
+
+    return cache.stats, 200
\ No newline at end of file
@@ -0,0 +1,87 @@
+""" Similarity searches that rank the entries by how much their sequence resembles a query sequence. """
+#***===== Imports =====***#
+#*----- Standard library -----*#
+
+#*----- Flask & Flask Extensions -----*#
+
+#*----- External packages -----*#
+import click
+
+#*----- Custom packages -----*#
+
+#*----- Local imports -----*#
+from ..types import Field
+from .. import database
+from ..database import profiles
+
+#***===== Constants =====***#
+# The scores used for the local alignments when re-scoring the most similar entries.
+_ALIGN_MATCH = 2
+_ALIGN_MISMATCH = -1
+_ALIGN_GAP = -2
+
+#***===== Functions =====***#
+def align_score(a: str, b: str) -> int:
+    """ Returns the score of the best local alignment (Smith-Waterman) of two sequences with a linear gap penalty. """
+    a = a.upper()
+    b = b.upper()
+
+    best = 0
+    previous = [0] * (len(b) + 1)
+
+    for char_a in a:
+        current = [0]
+
+        for j, char_b in enumerate(b, start=1):
+            diagonal = previous[j-1] + (_ALIGN_MATCH if char_a == char_b else _ALIGN_MISMATCH)
+            score = max(0, diagonal, previous[j] + _ALIGN_GAP, current[j-1] + _ALIGN_GAP)
+            current.append(score)
+
+            if score > best:
+                best = score
+
+        previous = current
+
+    return best
+
+def similar_entries(sequence: str, limit: int, align: bool = False) -> list[tuple[str, float]]:
+    """
+    Returns the UniProt IDs and scores of the entries with the sequences most similar to the supplied
+    sequence, starting with the most similar one. The entries are scored by the cosine similarity of
+    their k-mer profiles. With 'align', these entries are re-scored by a local alignment relative to
+    the alignment of the sequence with itself. Raises a LookupError if no profiles are available.
+    """
+    all_profiles = profiles.get_profiles()
+
+    if all_profiles is None:
+        raise LookupError("No profiles are available for similarity searches.")
+
+    hits = all_profiles.top(sequence, limit)
+
+    if not align or len(hits) == 0:
+        return hits
+
+    # Only the sequences of the best entries are needed for the exact re-score.
+    db = database.get_db()
+    uids = [uid for (uid, _) in hits]
+    sql = f"SELECT {Field.UNIPROT_ID.db_name}, {Field.SEQUENCE.db_name} FROM metadata WHERE {Field.UNIPROT_ID.db_name} IN ({', '.join(['?'] * len(uids))})"
+    sequences = {row[0]: row[1] for row in db.execute(sql, uids).fetchall()}
+
+    self_score = align_score(sequence, sequence) or 1
+    hits = [(uid, align_score(sequence, sequences[uid]) / self_score) for uid in uids if uid in sequences]
+    hits.sort(key=lambda hit: (-hit[1], hit[0]))
+
+    return hits
+
+#***===== Blueprint Import =====***#
+from . import bp
+
+#***===== Register CLI commands =====***#
+@bp.cli.command("similar")
+@click.argument("sequence")
+@click.option("-n", "--limit", type=int, default=20, show_default=True, help="The number of entries to return.")
+@click.option("-a", "--align", is_flag=True, help="Re-score the most similar entries with a local alignment.")
+def similar(sequence: str, limit: int, align: bool = False):
+    """ Print the UniProt IDs and scores of the entries with a sequence most similar to 'SEQUENCE'. """
+    for uid, score in similar_entries(sequence, limit, align):
+        click.echo(f"{uid}\t{score:.4f}")
@@ -6,7 +6,11 @@ from __future__ import annotations
 #*----- Standard library -----*#
 import abc
 from abc import ABC
-from typing import Iterable, Sequence, Optional, Union
+from typing import Iterable, Sequence, Optional, Union, Mapping
+
+import base64
+import functools
+import json
 
 #*----- Flask & Flask Extensions -----*#
 import flask
@@ -16,19 +20,149 @@ import flask
 #*----- Custom packages -----*#
 
 #*----- Local imports -----*#
-from ..types import Field, ComparisonType
+from ..types import Field, ComparisonType, ResultCounts
+from . import motif
+from ..database import FULLTEXT_TABLE, VALUES_TABLE, TAXA_TABLE, CLOSURE_TABLE, KMER_TABLE, get_db, get_kmer_size
 from ..database.connections import DatabaseConnection, DatabaseResult
+from ..database.models import FieldStatistics
+
+#***===== Constants =====***#
+# The trigram tokenizer of the full-text index can't match values shorter than a single trigram.
+_FULLTEXT_MIN_LENGTH = 3
+
+# The maximum number of k-mer posting lists that are intersected for a single sequence search.
+_KMER_MAX_TERMS = 32
+
+#***===== SQL Shape Functions =====***#
+#* A shape is either an SQL string with a '?' for every parameter or a tuple that describes how the SQL of other shapes is combined:
+#*   (operator, shapes)                                      The shapes combined with a logical 'AND' or 'OR'.
+#*   ("NOT", shape)                                          The logical negation of the shape.
+#*   ("FROM", view, join, shapes)                            The FROM clause with an optional join and the shapes as the WHERE clause.
+#*   ("SELECT", selection, shape, order, limit, offset)      A select statement for the FROM shape with whether it has a limit and an offset.
+#*   ("COUNTS", shape)                                       A statement that counts the results per facet for the FROM shape.
+def _render_shape(shape: Union[str, tuple]) -> str:
+    """ Returns the SQL for a shape. The same shape always gives the same SQL, so its prepared statement is reused by the connection. """
+    if isinstance(shape, str):
+        return shape
+
+    kind = shape[0]
+
+    if kind in ["AND", "OR"]:
+        return "(" + f") {kind} (".join([_render_shape(child) for child in shape[1]]) + ")"
+    elif kind == "NOT":
+        return "NOT (" + _render_shape(shape[1]) + ")"
+    elif kind == "FROM":
+        (_, view, join, shapes) = shape
+        sql_str = f"FROM {view}"
+
+        if not join is None:
+            sql_str += " " + _render_shape(join)
+
+        if len(shapes) > 0:
+            sql_str += " WHERE " + _render_shape(("AND", shapes))
+
+        return sql_str
+    elif kind == "SELECT":
+        (_, selection, from_where, order, limit, offset) = shape
+        sql_str = f"SELECT {selection} " + _render_shape(from_where) + f" ORDER BY {order}"
+
+        if limit:
+            sql_str += " LIMIT ?"
+        elif offset:
+            sql_str += " LIMIT -1"
+
+        if offset:
+            sql_str += " OFFSET ?"
+
+        return sql_str
+    elif kind == "COUNTS":
+        # Group by both facets at once so that the filter only needs to be evaluated once.
+        category = Field.CATEGORY.db_name
+        superkingdom = Field.LINEAGE_SUPERKINGDOM.db_name
+
+        sql_str = f"SELECT {category}, {superkingdom}, COUNT(*) AS total, MAX({Field.SEQUENCE_LEN.db_name}) AS max_seq_len "
+        sql_str += _render_shape(shape[1])
+        sql_str += f" GROUP BY {category}, {superkingdom}"
+        return sql_str
+    else:
+        raise ValueError(f"Unknown SQL shape '{kind}'.")
 
 #***===== SQL Condition Class =====***#
 class _SQLCondition:
-    """ A class representing the condition in an SQL statement. """
-    def __init__(self, sql_str: str, parameters: Optional[Sequence] = None):
-        self.str = sql_str
+    """
+    A class representing the condition in an SQL statement. The SQL is stored as its shape together
+    with the parameters that fill its slots, so that conditions with the same structure share their SQL.
+    """
+    def __init__(self, shape: Union[str, tuple], parameters: Optional[Sequence] = None, match_terms: Optional[Sequence[str]] = None):
+        """ Takes the SQL string or shape of the condition, the parameters in the order of their slots and any full-text match terms. """
+        self.shape = shape
         
         if not parameters or len(parameters) == 0:
             self.parameters = []
         else:
             self.parameters = parameters 
+        
+        # The full-text match expressions used by the condition, which are needed for ranking the results.
+        if not match_terms:
+            self.match_terms = []
+        else:
+            self.match_terms = list(match_terms)
+
+    @property
+    def str(self) -> str:
+        """ Returns the SQL of the condition. """
+        return _render_shape(self.shape)
+
+def _combine_conditions(conditions: Sequence[_SQLCondition], operator: str) -> _SQLCondition:
+    """ Combines _SQLConditions with a logical operator ('AND' or 'OR'). """
+    shape = (operator, tuple([condition.shape for condition in conditions]))
+    parameters = [parameter for condition in conditions for parameter in condition.parameters]
+    match_terms = [term for condition in conditions for term in condition.match_terms]
+    return _SQLCondition(shape, parameters, match_terms)
+
+#***===== LIKE Functions =====***#
+def _escape_like(value: str) -> str:
+    """ Returns the value with the LIKE wildcards escaped by a backslash, for a LIKE comparison with `ESCAPE '\\'`. """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+#***===== Full-Text Functions =====***#
+def _fulltext_phrase(value: str) -> str:
+    """ Returns the value as a quoted FTS5 phrase, so that any FTS5 syntax in the value is matched literally. """
+    return '"' + value.replace('"', '""') + '"'
+
+def _fulltext_match_expression(match_terms: Sequence[str]) -> str:
+    """ Combines FTS5 match terms into a single match expression matching any of them. """
+    unique_terms = list(dict.fromkeys(match_terms))
+
+    if len(unique_terms) == 1:
+        return unique_terms[0]
+    else:
+        return "(" + ") OR (".join(unique_terms) + ")"
+
+def _fulltext_condition(match_term: str) -> _SQLCondition:
+    """ Returns the _SQLCondition for the entries matching an FTS5 match term in the full-text index. """
+    sql_str = f"{Field.UNIPROT_ID.db_name} IN ("
+    sql_str += f"SELECT metadata.{Field.UNIPROT_ID.db_name} FROM {FULLTEXT_TABLE} "
+    sql_str += f"JOIN metadata ON metadata.rowid = {FULLTEXT_TABLE}.rowid "
+    sql_str += f"WHERE {FULLTEXT_TABLE} MATCH ?)"
+    return _SQLCondition(sql_str, [match_term], [match_term])
+
+#***===== K-mer Functions =====***#
+def _kmer_condition(value: str, kmer_size: int) -> _SQLCondition:
+    """
+    Returns the _SQLCondition for the entries with a sequence that contains the value. The candidates
+    are found by intersecting the posting lists of the k-mers of the value in the k-mer index, after
+    which only the candidates are verified with a LIKE comparison.
+    """
+    # Non-overlapping k-mers that cover the whole value are enough, since the candidates are verified anyway.
+    positions = list(range(0, len(value) - kmer_size + 1, kmer_size)) + [len(value) - kmer_size]
+    kmers = sorted({value[i:i+kmer_size].upper() for i in positions})[:_KMER_MAX_TERMS]
+
+    posting_list = f"SELECT {Field.UNIPROT_ID.db_name} FROM {KMER_TABLE} WHERE kmer = ?"
+
+    sql_str = f"{Field.UNIPROT_ID.db_name} IN (" + " INTERSECT ".join([posting_list] * len(kmers)) + ") "
+    sql_str += f"AND {Field.SEQUENCE.db_name} LIKE ?"
+    return _SQLCondition(sql_str, kmers + [f"%{value}%"])
 
 #***===== Filter Class =====***#
 #* The value parameter is currently not sanitized here. Instead, the execute function of the DatabaseConnection takes care of sanitizing it's parameters.
@@ -39,9 +173,9 @@ class Filter:
         self._field = Field(field) # Ensure that the supplied field is a valid field type.
         self._value = value 
 
-    @property
+    @functools.cached_property
     def _sql_condition(self) -> _SQLCondition:
-        """ Returns the _SQLCondition that can be used to create an SQL query. """
+        """ Returns the _SQLCondition that can be used to create an SQL query. It is only generated once per filter. """
         comparison_type = self._field.comparison_type
 
         if not self._value and self._field in Field.optional_fields():
@@ -49,13 +183,73 @@ class Filter:
         if comparison_type is ComparisonType.EQUAL:
             return _SQLCondition(f"{self._field.db_name}=?", [self._value])
         elif comparison_type is ComparisonType.LIKE:
-            return _SQLCondition(f"{self._field.db_name} LIKE ?", [f"%{self._value}%"])
+            # Use the k-mer index for sequences where possible. Values with LIKE wildcards or other symbols can't use it.
+            if self._field is Field.SEQUENCE and self._value.isalpha():
+                kmer_size = get_kmer_size()
+
+                if not kmer_size is None and len(self._value) >= kmer_size:
+                    return _kmer_condition(self._value, kmer_size)
+
+            # Use the full-text index where possible, since a LIKE with a leading wildcard can't use an index.
+            if self._field in Field.fulltext_fields() and len(self._value) >= _FULLTEXT_MIN_LENGTH:
+                return _fulltext_condition(f"{self._field.db_name} : {_fulltext_phrase(self._value)}")
+            elif self._field is Field.CATEGORY:
+                return _SQLCondition(f"{Field.CATEGORY_ID.db_name} IN (SELECT id FROM categories WHERE name LIKE ?)", [f"%{self._value}%"])
+            else:
+                return _SQLCondition(f"{self._field.db_name} LIKE ?", [f"%{self._value}%"])
+        elif comparison_type is ComparisonType.MEMBER:
+            # Look up the separate values in the values table. A trailing '*' turns it into a prefix match.
+            sql_str = f"{Field.UNIPROT_ID.db_name} IN (SELECT {Field.UNIPROT_ID.db_name} FROM {VALUES_TABLE} WHERE field = ? AND value "
+
+            if self._value.endswith("*"):
+                return _SQLCondition(sql_str + "LIKE ? ESCAPE '\\')", [self._field.db_name, _escape_like(self._value[:-1]) + "%"])
+            else:
+                return _SQLCondition(sql_str + "= ?)", [self._field.db_name, self._value])
+        elif comparison_type is ComparisonType.ANCESTOR:
+            # Find the organisms below any taxon with the name or ID through the taxonomy closure table. A trailing '*' turns it into a prefix match.
+            sql_str = f"{Field.ORGANISM_ID.db_name} IN (SELECT descendant_id FROM {CLOSURE_TABLE} WHERE ancestor_id IN ("
+            sql_str += f"SELECT taxon_id FROM {TAXA_TABLE} WHERE taxon_id = ? OR name "
+
+            if self._value.endswith("*"):
+                return _SQLCondition(sql_str + "LIKE ? ESCAPE '\\'))", [self._value, _escape_like(self._value[:-1]) + "%"])
+            else:
+                return _SQLCondition(sql_str + "= ? COLLATE NOCASE))", [self._value, self._value])
         elif comparison_type is ComparisonType.BETWEEN:
             values = [int(val.strip()) for val in self._value.split("-")]
             return _SQLCondition(f"{self._field.db_name} BETWEEN ? AND ?", values)
         else:
             raise NotImplementedError(f"Couldn't generate sql condition for field {self}")
     
+    @property
+    def _canonical_key(self) -> tuple:
+        """ Returns a hashable key that is the same for any filters that are logically the same. """
+        return ("filter", self._field.search_name, self._value)
+
+    @property
+    def _is_scan(self) -> bool:
+        """ Returns whether the filter scans the sequences outside of SQL instead of being a plain SQL condition. """
+        return False
+
+    @property
+    def _match_terms(self) -> list[str]:
+        """ Returns the full-text match terms of the _SQLCondition of the filter, without scanning any sequences. """
+        return self._sql_condition.match_terms
+
+    def _scan_condition(self, restriction: Optional[_SQLCondition]) -> _SQLCondition:
+        """ Returns the _SQLCondition of the filter, where filters that scan sequences only scan the entries matching the restriction. """
+        return self._sql_condition
+
+    def _selectivity(self, statistics: Mapping[str, FieldStatistics]) -> float:
+        """
+        Returns the estimated fraction of the entries that match the filter, based on the statistics per
+        search name of the fields. Only (member) equality and lineage filters can be estimated, so other filters are
+        assumed to match every entry.
+        """
+        if self._field.search_name in statistics and self._field.comparison_type in [ComparisonType.EQUAL, ComparisonType.MEMBER, ComparisonType.ANCESTOR]:
+            return statistics[self._field.search_name].selectivity
+        else:
+            return 1.0
+
     @property
     def isempty(self) -> bool:
         """ Returns whether the filter has a value. """
@@ -64,9 +258,108 @@ class Filter:
     def __repr__(self) -> str:
         return f"Filter({self._field}, {self._value})"
 
+class FullTextFilter(Filter):
+    """ A class for a search filter that matches a value against all the full-text fields at once. """
+    def __init__(self, value: str):
+        """ Takes a value to set the search condition. The value should be at least as long as a trigram. """
+        if len(value) < _FULLTEXT_MIN_LENGTH:
+            raise ValueError(f"'{value}' is too short for a full-text search.")
+
+        self._field = Field.ANY
+        self._value = value
+
+    @functools.cached_property
+    def _sql_condition(self) -> _SQLCondition:
+        """ Returns the _SQLCondition that can be used to create an SQL query. It is only generated once per filter. """
+        return _fulltext_condition(_fulltext_phrase(self._value))
+
+    @property
+    def _canonical_key(self) -> tuple:
+        """ Returns a hashable key that is the same for any filters that are logically the same. """
+        return ("fulltext", self._value)
+
+    def __repr__(self) -> str:
+        return f"FullTextFilter({self._value})"
+
+class MotifFilter(Filter):
+    """
+    A class for a search filter that matches the sequences against a PROSITE pattern or a restricted
+    regular expression. The motif can't be matched in SQL, so the sequences are scanned instead.
+    """
+    def __init__(self, value: str):
+        """ Takes the motif, which is compiled immediately. Raises a ValueError for invalid motifs. """
+        self._field = Field.MOTIF
+        self._value = value
+        self._motif = motif.Motif(value)
+
+        # The results of the scans per restriction, since the condition may be requested multiple times.
+        self._scans = {}
+
+    @property
+    def _sql_condition(self) -> _SQLCondition:
+        """ Returns the _SQLCondition that can be used to create an SQL query. """
+        return self._scan_condition(None)
+
+    @property
+    def _canonical_key(self) -> tuple:
+        """ Returns a hashable key that is the same for any filters that are logically the same. """
+        return ("motif", self._motif.regex.pattern)
+
+    @property
+    def _is_scan(self) -> bool:
+        return True
+
+    @property
+    def _match_terms(self) -> list[str]:
+        return []
+
+    @property
+    def _prefilter_condition(self) -> Optional[_SQLCondition]:
+        """ Returns the _SQLCondition for the entries containing all the literal parts of the motif, if any of them can use the k-mer index. """
+        kmer_size = get_kmer_size()
+
+        if kmer_size is None:
+            return None
+
+        conditions = [_kmer_condition(literal, kmer_size) for literal in self._motif.literals if len(literal) >= kmer_size]
+
+        if len(conditions) == 0:
+            return None
+
+        return _combine_conditions(conditions, "AND")
+
+    def positions(self, restriction: Optional[_SQLCondition] = None) -> dict[str, list[tuple[int, int]]]:
+        """ Returns the positions of the matches of the motif for every matching entry that also matches the restriction. """
+        key = None if restriction is None else (restriction.str, tuple(restriction.parameters))
+
+        if not key in self._scans:
+            # Only scan the candidates that match the restriction and contain the literal parts of the motif.
+            conditions = [condition for condition in [restriction, self._prefilter_condition] if not condition is None]
+
+            sql_str = f"SELECT {Field.UNIPROT_ID.db_name}, {Field.SEQUENCE.db_name} FROM search"
+
+            if len(conditions) > 0:
+                condition = _combine_conditions(conditions, "AND")
+                rows = get_db().execute(sql_str + f" WHERE {condition.str}", condition.parameters).fetchall()
+            else:
+                rows = get_db().execute(sql_str).fetchall()
+
+            self._scans[key] = motif.scan_sequences(self._motif, [(row[0], row[1]) for row in rows])
+
+        return self._scans[key]
+
+    def _scan_condition(self, restriction: Optional[_SQLCondition]) -> _SQLCondition:
+        uids = sorted(self.positions(restriction).keys())
+        return _SQLCondition(f"{Field.UNIPROT_ID.db_name} IN (SELECT value FROM json_each(?))", [json.dumps(uids)])
+
+    def __repr__(self) -> str:
+        return f"MotifFilter({self._value})"
+
 #***===== Combined Filter ABC Class ***=====#
 class CombinedFilterABC(ABC):
     """ An Abstract Base Class for representing combined search filters. """
+    # The name of the logical operation in the canonical key of the filter. Should be set by implementers.
+    _KEY_NAME: str
 
     @abc.abstractmethod
     def __init__(self, filters: Iterable[Filter]) -> None:
@@ -87,6 +380,47 @@ class CombinedFilterABC(ABC):
     def _sql_condition(self) -> _SQLCondition:
         """ Returns a _SQL_Condition object that represents the combined search filter. """
 
+    @property
+    def _canonical_key(self) -> tuple:
+        """
+        Returns a hashable key that is the same for any filters that are logically the same. The order
+        and duplicates of the combined filters don't matter and nested filters of the same type are flattened.
+        """
+        keys = set()
+
+        for filter in self._filters:
+            key = filter._canonical_key
+
+            if key[0] == self._KEY_NAME:
+                keys.update(key[1])
+            else:
+                keys.add(key)
+
+        # A combination of a single unique filter is the same as just that filter.
+        if len(keys) == 1:
+            return keys.pop()
+
+        # Sort by the representation to get a key that is stable between processes.
+        return (self._KEY_NAME, tuple(sorted(keys, key=repr)))
+
+    @property
+    def _is_scan(self) -> bool:
+        """ Returns whether any of the combined filters scans the sequences outside of SQL. """
+        return any([filter._is_scan for filter in self._filters])
+
+    @property
+    def _match_terms(self) -> list[str]:
+        """ Returns the full-text match terms of the _SQLCondition of the combined filter, without scanning any sequences. """
+        return [term for filter in self._filters for term in filter._match_terms]
+
+    @abc.abstractmethod
+    def _scan_condition(self, restriction: Optional[_SQLCondition]) -> _SQLCondition:
+        """ Returns the _SQLCondition of the combined filter, where filters that scan sequences only scan the entries matching the restriction. """
+
+    @abc.abstractmethod
+    def _selectivity(self, statistics: Mapping[str, FieldStatistics]) -> float:
+        """ Returns the estimated fraction of the entries that match the combined filter, based on the statistics per search name of the fields. """
+
     @property
     def isempty(self) -> bool:
         """ Returns whether the filter is empty. """
@@ -98,91 +432,490 @@ class CombinedFilterABC(ABC):
 #***===== Combined Filter Classes =====***#
 class AndFilter(CombinedFilterABC):
     """ A class for representing the logical AND combination of two or more search filters. """
+    _KEY_NAME = "and"
+
     def __init__(self, filters: Iterable[Filter]):
         """ Takes in a Iterable of the filters that need to combined with a logical AND. """
         super().__init__(filters)
     
-    @property
+    @functools.cached_property
     def _sql_condition(self) -> _SQLCondition:
-        sql_strings = []
-        parameters = []
+        return self._scan_condition(None)
+
+    def _scan_condition(self, restriction: Optional[_SQLCondition]) -> _SQLCondition:
+        conditions = [filter._sql_condition for filter in self._filters if not filter._is_scan]
+
+        # Filters that scan sequences come last, so that they only scan the entries matching all other filters.
+        scan_filters = [filter for filter in self._filters if filter._is_scan]
+
+        if len(scan_filters) > 0:
+            scan_restriction = conditions + ([] if restriction is None else [restriction])
+
+            for filter in scan_filters:
+                condition = filter._scan_condition(_combine_conditions(scan_restriction, "AND") if len(scan_restriction) > 0 else None)
+                conditions.append(condition)
+                scan_restriction.append(condition)
+
+        return _combine_conditions(conditions, "AND")
+
+    @property
+    def _match_terms(self) -> list[str]:
+        # In the same order as the conditions, where the filters that scan sequences come last.
+        filters = [filter for filter in self._filters if not filter._is_scan] + [filter for filter in self._filters if filter._is_scan]
+        return [term for filter in filters for term in filter._match_terms]
+
+    def _selectivity(self, statistics: Mapping[str, FieldStatistics]) -> float:
+        # Assume that the filters are independent.
+        selectivity = 1.0
 
         for filter in self._filters:
-            sql_strings.append(filter._sql_condition.str)
-            parameters.extend(filter._sql_condition.parameters)
-        
-        sql_str = "(" + ") AND (".join(sql_strings) + ")"
-        return _SQLCondition(sql_str, parameters)
+            selectivity *= filter._selectivity(statistics)
+
+        return selectivity
 
 class OrFilter(CombinedFilterABC):
     """ A class for representing the logical OR combination of two or more search filters. """
+    _KEY_NAME = "or"
+
     def __init__(self, filters: Iterable[Filter]):
         """ Takes in a Iterable of the filters that need to combined with a logical OR. """
         super().__init__(filters)
     
-    @property
+    @functools.cached_property
     def _sql_condition(self) -> _SQLCondition:
-        sql_strings = []
-        parameters = []
+        return self._scan_condition(None)
 
-        for filter in self._filters:
-            sql_strings.append(filter._sql_condition.str)
-            parameters.extend(filter._sql_condition.parameters)
-        
-        sql_str = "(" + ") OR (".join(sql_strings) + ")"
-        return _SQLCondition(sql_str, parameters)
+    def _scan_condition(self, restriction: Optional[_SQLCondition]) -> _SQLCondition:
+        return _combine_conditions([filter._scan_condition(restriction) for filter in self._filters], "OR")
+
+    def _selectivity(self, statistics: Mapping[str, FieldStatistics]) -> float:
+        # Assume that the filters don't overlap.
+        return min(sum([filter._selectivity(statistics) for filter in self._filters]), 1.0)
     
 class AnyFilter(OrFilter):
     """ A class for a search filter where any field can match the condition. """
     def __init__(self, value: str):
         """ Take a value to set the condition for the search filter. """
-        filters = [Filter(field, value) for field in Field.accepted_fields() - {Field.ANY.search_name} if not field is Field.SEQUENCE_LEN]
+        fields = {Field(field) for field in Field.accepted_fields() - {Field.ANY.search_name} if not field in [Field.SEQUENCE_LEN, Field.MOTIF]}
+
+        # Match all the full-text fields with a single lookup in the full-text index when possible.
+        if len(value) >= _FULLTEXT_MIN_LENGTH:
+            fields = fields - Field.fulltext_fields()
+
+        filters = []
+
+        for field in sorted(fields, key=lambda field: field.db_name):
+            # Lists of IDs are matched by any part of their IDs, like the text fields, and taxa by the start of their names.
+            if field.comparison_type is ComparisonType.MEMBER:
+                filters.append(ContainsFilter(field, value))
+            elif field.comparison_type is ComparisonType.ANCESTOR:
+                filters.append(Filter(field, value + "*"))
+            else:
+                filters.append(Filter(field, value))
+
+        if len(value) >= _FULLTEXT_MIN_LENGTH:
+            filters.append(FullTextFilter(value))
+
         super().__init__(filters)
 
+class ContainsFilter(Filter):
+    """
+    A class for a search filter that matches any of the separate values of a field with a list of values
+    (e.g. IDs) that contains the value, instead of only the values that are equal to it.
+    """
+    def __init__(self, field: Union[str, Field], value: str):
+        """ Takes a field with a member comparison and the value that should be part of one of its values. """
+        super().__init__(field, value)
+
+        if not self._field.comparison_type is ComparisonType.MEMBER:
+            raise ValueError(f"Can't match the separate values of {self._field.db_name}.")
+
+    @functools.cached_property
+    def _sql_condition(self) -> _SQLCondition:
+        sql_str = f"{Field.UNIPROT_ID.db_name} IN (SELECT {Field.UNIPROT_ID.db_name} FROM {VALUES_TABLE} WHERE field = ? AND value LIKE ? ESCAPE '\\')"
+        return _SQLCondition(sql_str, [self._field.db_name, "%" + _escape_like(self._value) + "%"])
+
+    @property
+    def _canonical_key(self) -> tuple:
+        return ("contains", self._field.search_name, self._value)
+
+    def _selectivity(self, statistics: Mapping[str, FieldStatistics]) -> float:
+        return 1.0
+
+    def __repr__(self) -> str:
+        return f"ContainsFilter({self._field}, {self._value})"
+
+class InFilter(OrFilter):
+    """
+    A class for the logical OR combination of (member) equality filters on the same field. All the values
+    are passed as a single JSON parameter, so any number of values stays within the limit on the number
+    of SQL variables and searches with a different number of values share the same SQL.
+
+    WARNING: Currently sqlite only due to the `json_each` function!
+    """
+    def __init__(self, field: Union[str, Field], values: Sequence[str]):
+        """ Takes a field with an equality or member comparison and at least two values that it should match. """
+        field = Field(field)
+
+        if not field.comparison_type in [ComparisonType.EQUAL, ComparisonType.MEMBER]:
+            raise ValueError(f"Can't match {field.db_name} against a list of values.")
+
+        super().__init__([Filter(field, value) for value in values])
+        self._field = field
+        self._values = list(dict.fromkeys(values))
+
+    def _scan_condition(self, restriction: Optional[_SQLCondition]) -> _SQLCondition:
+        values = json.dumps(self._values)
+
+        if self._field.comparison_type is ComparisonType.MEMBER:
+            sql_str = f"{Field.UNIPROT_ID.db_name} IN (SELECT {Field.UNIPROT_ID.db_name} FROM {VALUES_TABLE} WHERE field = ? AND value IN (SELECT value FROM json_each(?)))"
+            return _SQLCondition(sql_str, [self._field.db_name, values])
+        else:
+            return _SQLCondition(f"{self._field.db_name} IN (SELECT value FROM json_each(?))", [values])
+
+    @property
+    def _match_terms(self) -> list[str]:
+        return []
+
+    def __repr__(self) -> str:
+        return f"InFilter({self._field}, {self._values})"
+
+class NotFilter(CombinedFilterABC):
+    """ A class for representing the logical negation of a search filter. """
+    _KEY_NAME = "not"
+
+    def __init__(self, filter: Union[Filter, CombinedFilterABC]):
+        """ Takes the filter that needs to be negated. """
+        if not isinstance(filter, Filter) and not isinstance(filter, CombinedFilterABC):
+            raise TypeError(f"'{filter}' is not a valid filter.")
+
+        self._filters = [filter]
+
+    @functools.cached_property
+    def _sql_condition(self) -> _SQLCondition:
+        return self._scan_condition(None)
+
+    @property
+    def _canonical_key(self) -> tuple:
+        return (self._KEY_NAME, self._filters[0]._canonical_key)
+
+    @property
+    def _match_terms(self) -> list[str]:
+        return []
+
+    def _scan_condition(self, restriction: Optional[_SQLCondition]) -> _SQLCondition:
+        # Negated full-text matches can't be ranked, so their match terms are dropped.
+        condition = self._filters[0]._scan_condition(restriction)
+        return _SQLCondition(("NOT", condition.shape), condition.parameters)
+
+    def _selectivity(self, statistics: Mapping[str, FieldStatistics]) -> float:
+        return 1.0 - self._filters[0]._selectivity(statistics)
+
+#***===== Optimizer Functions =====***#
+def _collapsible_field(filter: Union[Filter, CombinedFilterABC]) -> Optional[Field]:
+    """ Returns the field of a filter if it can be collapsed with other filters on the field into an InFilter. """
+    if not type(filter) is Filter or filter.isempty:
+        return None
+
+    if filter._field.comparison_type is ComparisonType.EQUAL:
+        return filter._field
+    elif filter._field.comparison_type is ComparisonType.MEMBER and not filter._value.endswith("*"):
+        return filter._field
+    else:
+        return None
+
+def optimize(filter: Union[Filter, CombinedFilterABC, None]) -> Union[Filter, CombinedFilterABC, None]:
+    """
+    Returns a filter that is logically the same, but cheaper to evaluate. Nested combinations of the same
+    type are flattened, duplicate filters are dropped, filters that are absorbed by another filter in the
+    same combination are dropped (e.g. 'a OR (a AND b)' becomes 'a'), combinations of a single filter are
+    replaced by that filter, double negations are removed and a logical OR of (member) equality filters
+    on the same field is collapsed into an InFilter.
+    """
+    if isinstance(filter, NotFilter):
+        negated = optimize(filter._filters[0])
+
+        if isinstance(negated, NotFilter):
+            return negated._filters[0]
+        else:
+            return NotFilter(negated)
+
+    if not isinstance(filter, AndFilter) and not isinstance(filter, OrFilter):
+        return filter
+
+    combination = AndFilter if isinstance(filter, AndFilter) else OrFilter
+    other_combination = OrFilter if combination is AndFilter else AndFilter
+
+    # Flatten nested combinations of the same type and drop duplicates, keeping the first occurrence.
+    filters = {}
+
+    for child in filter._filters:
+        child = optimize(child)
+
+        for grandchild in (child._filters if isinstance(child, combination) else [child]):
+            filters.setdefault(grandchild._canonical_key, grandchild)
+
+    # Drop combinations of the other type that contain a filter that is also in this combination.
+    filters = [child for child in filters.values() if not isinstance(child, other_combination) or not any([grandchild._canonical_key in filters for grandchild in child._filters])]
+
+    # Collapse (member) equality filters on the same field into a single InFilter in the place of the first one.
+    if combination is OrFilter:
+        values = {}
+
+        for child in filters:
+            field = _collapsible_field(child)
+
+            if not field is None:
+                values.setdefault(field, []).append(child._value)
+
+        collapsed = []
+
+        for child in filters:
+            field = _collapsible_field(child)
+
+            if field is None or len(values.get(field, [])) == 1:
+                collapsed.append(child)
+            elif field in values:
+                collapsed.append(InFilter(field, values.pop(field)))
+
+        filters = collapsed
+
+    if len(filters) == 1:
+        return filters[0]
+    else:
+        return combination(filters)
+
+#***===== Cursor Functions =====***#
+def encode_cursor(values: Sequence) -> str:
+    """ Encodes the sort key values of a row into an opaque cursor string that can be used in a URL. """
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    """ Decodes a cursor string back into the sort key values of a row. Raises a ValueError for invalid cursors. """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError(f"'{cursor}' is not a valid cursor.") from e
+
+    if not isinstance(values, list):
+        raise ValueError(f"'{cursor}' is not a valid cursor.")
+
+    return values
+
 #***===== SQL Class =====***#
 class Query:
     """ A class for storing an SQL query over the search view. """
-    def __init__(self, selection: Optional[Sequence[Union[str, Field]]] = None, filter: Optional[Union[Filter, CombinedFilterABC]] = None):
-        """ Takes in an optional list of fields to be selected and an optional search filter. """
+    def __init__(
+            self,
+            selection: Optional[Sequence[Union[str, Field]]] = None,
+            filter: Optional[Union[Filter, CombinedFilterABC]] = None,
+            order_by: Optional[Sequence[Union[str, Field]]] = None,
+            descending: bool = False,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None,
+            after: Optional[str] = None
+        ):
+        """
+        Takes in an optional list of fields to be selected and an optional search filter.
+
+        The results are ordered by the relevance of any full-text matches first, then by the fields in
+        'order_by' and finally by the Uniprot ID to guarantee a deterministic order. Paging can be done
+        either with 'limit' and 'offset' or by supplying the cursor of the last row of the previous page
+        in 'after', which avoids skipping over all the rows of the previous pages.
+        """
         # Set the view to the dedicated "search" view of the database
         self._VIEW = "search"
 
+        # Handle and sanitize the filter input.
+        if filter is None:
+            # In case no filter was provided, leave it at None.
+            self._filter = None
+            self._filter_key = None
+            self._match_terms = []
+        elif isinstance(filter, Filter) or isinstance(filter, CombinedFilterABC):
+            # Otherwise ensure that the provided object is an accepted filter for the sake of input sanitization.
+            # Its condition is only generated once the SQL is needed, since it can involve scanning the sequences.
+            self._filter = optimize(filter)
+            self._filter_key = self._filter._canonical_key
+            self._match_terms = self._filter._match_terms
+        else:
+            raise TypeError(f"{filter} does not implement Filter or CombinedFilterABC.")
+
+        # Handle and sanitize the ordering input as a list of (SQL expression, column name, descending) sort keys.
+        self._ranking_join = self._get_ranking_join()
+        self._sort_keys = []
+
+        if not self._ranking_join is None:
+            self._sort_keys.append(("COALESCE(ranking.relevance, 0)", "relevance", False))
+
+        for field in order_by or []:
+            field = Field(field)
+
+            # NULL values can't be compared, so they would break the cursors.
+            if field in Field.optional_fields():
+                raise ValueError(f"Can't order by the optional field {field.db_name}.")
+
+            self._sort_keys.append((f"{self._VIEW}.{field.db_name}", field.db_name, descending))
+
+        if not Field.UNIPROT_ID.db_name in [column for (_, column, _) in self._sort_keys]:
+            self._sort_keys.append((f"{self._VIEW}.{Field.UNIPROT_ID.db_name}", Field.UNIPROT_ID.db_name, descending))
+
         # Handle and sanitize selection input.
         if not selection: # Should handle both None and empty lists.
-            self._selection = "*"
+            selected_columns = [f"{self._VIEW}.*"]
+            sort_columns = ["relevance"] if not self._ranking_join is None else []
         else:
             # Retrieve the database names for the desired fields.
             # Also guarantees that the inputs are valid Fields.
-            fields = [Field(field).db_name for field in selection]
+            selected_columns = [f"{self._VIEW}.{Field(field).db_name}" for field in selection]
+            sort_columns = [column for (_, column, _) in self._sort_keys]
 
-            # Create the selection string from the database names.
-            self._selection = ",".join(fields)
+        # Make sure the sort keys are part of the result so that the cursor of a row can be determined.
+        for (expression, column, _) in self._sort_keys:
+            if column in sort_columns and not f"{self._VIEW}.{column}" in selected_columns:
+                selected_columns.append(f"{expression} AS {column}")
 
-        # Handle and sanitize the filter input.
-        if filter is None:
-            # In case no filter was provided, leave it at None.
-            self._condition = None
-        elif isinstance(filter, Filter) or isinstance(filter, CombinedFilterABC):
-            # Otherwise ensure that the provided object is an accepted filter for the sake of input sanitization.
-            self._condition = filter._sql_condition
+        # Create the selection string from the database names.
+        self._selection = ",".join(selected_columns)
+
+        # Handle and sanitize the paging input.
+        if not limit is None and int(limit) < 0:
+            raise ValueError(f"{limit} is not a valid limit.")
+        if not offset is None and int(offset) < 0:
+            raise ValueError(f"{offset} is not a valid offset.")
+
+        self._limit = None if limit is None else int(limit)
+        self._offset = None if offset is None else int(offset)
+
+        if after is None:
+            self._after = None
         else:
-            raise TypeError(f"{filter} does not implement Filter or CombinedFilterABC.")
+            self._after = decode_cursor(after)
+
+            if len(self._after) != len(self._sort_keys):
+                raise ValueError(f"'{after}' is not a valid cursor for this query.")
     
+    @functools.cached_property
+    def _condition(self) -> Optional[_SQLCondition]:
+        """ Returns the _SQLCondition of the filter, which is only generated once the SQL of the query is needed. """
+        return None if self._filter is None else self._filter._sql_condition
+
+    @property
+    def cache_key(self) -> tuple:
+        """ Returns a hashable key that is the same for queries that return the same results. """
+        sort_key = tuple([(column, descending) for (_, column, descending) in self._sort_keys])
+        after = None if self._after is None else tuple(self._after)
+        return (self._selection, self._filter_key, sort_key, self._limit, self._offset, after)
+
+    def _get_ranking_join(self) -> Optional[_SQLCondition]:
+        """ Returns a join on the bm25 relevance of the full-text matches if the filter uses the full-text index. """
+        if len(self._match_terms) == 0:
+            return None
+
+        sql_str = "LEFT JOIN ("
+        sql_str += f"SELECT metadata.{Field.UNIPROT_ID.db_name} AS ranked_uid, bm25({FULLTEXT_TABLE}) AS relevance FROM {FULLTEXT_TABLE} "
+        sql_str += f"JOIN metadata ON metadata.rowid = {FULLTEXT_TABLE}.rowid "
+        sql_str += f"WHERE {FULLTEXT_TABLE} MATCH ?"
+        sql_str += f") AS ranking ON ranking.ranked_uid = {self._VIEW}.{Field.UNIPROT_ID.db_name}"
+        return _SQLCondition(sql_str, [_fulltext_match_expression(self._match_terms)])
+
+    def _get_seek_condition(self) -> _SQLCondition:
+        """ Returns the _SQLCondition for all rows that come after the cursor in 'after' given the sort keys. """
+        sql_str = ""
+        parameters = []
+
+        # Build the condition from the last sort key up, e.g. 'a > ? OR (a = ? AND (b > ?))'
+        for (expression, _, descending), value in reversed(list(zip(self._sort_keys, self._after))):
+            operator = "<" if descending else ">"
+
+            if not sql_str:
+                sql_str = f"{expression} {operator} ?"
+                parameters = [value]
+            else:
+                sql_str = f"{expression} {operator} ? OR ({expression} = ? AND ({sql_str}))"
+                parameters = [value, value] + parameters
+
+        # Add a range condition on the first sort key so that an index can be used to seek to the cursor.
+        (expression, _, descending) = self._sort_keys[0]
+        operator = "<=" if descending else ">="
+        sql_str = f"{expression} {operator} ? AND ({sql_str})"
+        parameters = [self._after[0]] + parameters
+
+        return _SQLCondition(sql_str, parameters)
+
+    def cursor(self, row: Mapping) -> str:
+        """ Returns the cursor of a result row, which can be passed as 'after' to fetch the rows following it. """
+        return encode_cursor([row[column] for (_, column, _) in self._sort_keys])
+
+    def _get_from_where(self, ranked: bool = True) -> _SQLCondition:
+        """ Returns the FROM and WHERE clauses of the query. The relevance ranking is only joined if 'ranked' is set. """
+        join = None
+        parameters = []
+
+        # Join the relevance of full-text matches so that the best matches are returned first.
+        if ranked and not self._ranking_join is None:
+            join = self._ranking_join.shape
+            parameters.extend(self._ranking_join.parameters)
+
+        # Add the conditions to the sql query
+        conditions = []
+
+        if not self._condition is None:
+            conditions.append(self._condition)
+
+        if ranked and not self._after is None:
+            conditions.append(self._get_seek_condition())
+
+        for condition in conditions:
+            parameters.extend(condition.parameters)
+
+        return _SQLCondition(("FROM", self._VIEW, join, tuple([condition.shape for condition in conditions])), parameters)
+
+    @property
+    def counts_statement(self) -> _SQLCondition:
+        """ Returns the SQL statement and parameters that count the results per facet, disregarding the ordering and paging. """
+        from_where = self._get_from_where(ranked=False)
+        return _SQLCondition(("COUNTS", from_where.shape), from_where.parameters)
+
+    def result_counts(self, database_connection: DatabaseConnection) -> ResultCounts:
+        """ Count all the results of the query per facet in the database, disregarding the ordering and paging. """
+        statement = self.counts_statement
+        flask.current_app.logger.debug(f"Generated SQL query: {statement.str}")
+
+        if len(statement.parameters) == 0:
+            results = database_connection.execute(statement.str)
+        else:
+            results = database_connection.execute(statement.str, parameters=statement.parameters)
+
+        columns = [column[0] for column in results.description]
+        return ResultCounts(results.fetchall(), columns)
+
+    @property
+    def statement(self) -> _SQLCondition:
+        """ Returns the SQL statement and parameters that select the results of the query. """
+        from_where = self._get_from_where()
+        parameters = list(from_where.parameters)
+
+        # Order the results and select the requested page
+        order = ", ".join([f"{expression} {'DESC' if descending else 'ASC'}" for (expression, _, descending) in self._sort_keys])
+
+        if not self._limit is None:
+            parameters.append(self._limit)
+
+        if not self._offset is None:
+            parameters.append(self._offset)
+
+        shape = ("SELECT", self._selection, from_where.shape, order, not self._limit is None, not self._offset is None)
+        return _SQLCondition(shape, parameters)
+
     def execute(self, database_connection: DatabaseConnection) -> DatabaseResult:
         """Execute the SQL query on the given database connection. """
-        # Set the basic select statement for the query
-        query = f"SELECT {self._selection} FROM {self._VIEW}"
-
-        # Finish early if this query does not have any conditions
-        if self._condition is None:
-            flask.current_app.logger.debug(f"Generated SQL query: {query}")
-            return database_connection.execute(query)
-        
-        # Otherwise add the conditions to the sql query
-        query += " WHERE " + self._condition.str
+        statement = self.statement
 
         # Execute the SQL query on the database
-        if len(self._condition.parameters) == 0:
-            return database_connection.execute(query)
+        flask.current_app.logger.debug(f"Generated SQL query: {statement.str}")
+
+        if len(statement.parameters) == 0:
+            return database_connection.execute(statement.str)
         else:
-            return database_connection.execute(query, parameters=self._condition.parameters)
\ No newline at end of file
+            return database_connection.execute(statement.str, parameters=statement.parameters)
\ No newline at end of file
@@ -29,6 +29,9 @@ class ComparisonType(Enum):
     EQUAL = enum.auto()
     LIKE = enum.auto()
     BETWEEN = enum.auto()
+    MEMBER = enum.auto()
+    ANCESTOR = enum.auto()
+    MOTIF = enum.auto()
 
 #***===== FieldType Enum =====***#
 class FieldType(Enum):
@@ -82,6 +85,7 @@ class Field(str, Enum):
     GENE_NAMES = "gname"
     PROTEIN_NAMES = "pname"
     GENOME_IDS = "gmid"
+    MOTIF = "mot"
 
     # Facet
     CATEGORY_ID = "cid"
@@ -110,7 +114,8 @@ class Field(str, Enum):
             cls.PROTEOME_IDS,
             cls.GENE_NAMES,
             cls.PROTEIN_NAMES,
-            cls.GENOME_IDS
+            cls.GENOME_IDS,
+            cls.MOTIF
         }
 
     @classmethod
@@ -137,10 +142,36 @@ class Field(str, Enum):
             cls.GENE_NAMES,
             cls.PROTEIN_NAMES,
             cls.GENOME_IDS,
-            cls.LINEAGE,
             cls.LINEAGE_SUPERKINGDOM
         }
     
+    @classmethod
+    def multi_value_fields(cls) -> set[Field]:
+        """ Return a list of metadata table fields that hold a JSON list of values, which are also stored separately in the values table. """
+        return {
+            cls.PROTEIN_IDS,
+            cls.PROTEOME_IDS,
+            cls.GENE_NAMES,
+            cls.PROTEIN_NAMES,
+            cls.GENOME_IDS
+        }
+
+    @classmethod
+    def suggest_fields(cls) -> set[Field]:
+        """ Return a list of search fields with names for which the search bar suggests completions. """
+        return {
+            cls.ORGANISM,
+            cls.CATEGORY,
+            cls.LINEAGE,
+            cls.GENE_NAMES,
+            cls.PROTEIN_NAMES
+        }
+
+    @classmethod
+    def fulltext_fields(cls) -> set[Field]:
+        """ Return a list of metadata table fields that are searched through the full-text index. Sequences are searched through the k-mer index instead. """
+        return {field for field in cls.search_fields() & cls.metadata_fields() if field.comparison_type is ComparisonType.LIKE and not field is cls.SEQUENCE}
+
     @classmethod
     def optional_fields(cls) -> set[Field]:
         """ Returns all fields with an optional FieldType. """
@@ -175,7 +206,7 @@ class Field(str, Enum):
             return FieldType.PRIMARY_TEXT
         elif self is self.SEQUENCE_LEN:
             return FieldType.INTEGER
-        elif self in [self.ORGANISM, self.CATEGORY, self.SEQUENCE, self.LINEAGE, self.GENE_NAMES, self.PROTEIN_NAMES]:
+        elif self in [self.ORGANISM, self.CATEGORY, self.SEQUENCE, self.LINEAGE, self.GENE_NAMES, self.PROTEIN_NAMES, self.MOTIF]:
             return FieldType.TEXT
         elif self in [self.LINEAGE_SUPERKINGDOM]:
             return FieldType.TEXT_OPTIONAL
@@ -199,6 +230,15 @@ class Field(str, Enum):
         # Then all other facets and IDs are assumed to require equal comparison.
         elif self in self.facet_fields() or self.type in [FieldType.PRIMARY_INTEGER, FieldType.PRIMARY_TEXT, FieldType.INT_ID, FieldType.TEXT_ID]:
             return ComparisonType.EQUAL
+        # Lists of IDs are compared with each of the IDs separately.
+        elif self.type in [FieldType.IDS, FieldType.IDS_OPTIONAL]:
+            return ComparisonType.MEMBER
+        # Motifs are matched against the sequences outside of SQL.
+        elif self is self.MOTIF:
+            return ComparisonType.MOTIF
+        # The lineage is compared with the ancestors of the organism in the taxonomy tables.
+        elif self is self.LINEAGE:
+            return ComparisonType.ANCESTOR
         # All leftover search terms function through a LIKE comparison.
         elif self in self.search_fields():
             return ComparisonType.LIKE
@@ -206,55 +246,13 @@ class Field(str, Enum):
         else:
             raise NotImplementedError(f"Not implemented for FieldType {self}.")
     
-    def value_from_json(self, json_data: any) -> any:
-        if self is self.ORGANISM:
-            return json_data["uniprot"]["organism"]["scientificName"]
-        elif self is self.ORGANISM_ID:
-            return json_data["uniprot"]["organism"]["taxonId"]
-        elif self is self.SEQUENCE:
-            return json_data["uniprot"]["sequence"]["value"]
-        elif self is self.SEQUENCE_LEN:
-            return json_data["uniprot"]["sequence"]["length"]
-        elif self is self.CATEGORY:
-            return json_data["histoneDB"]["category"]
-        elif self is self.LINEAGE:
-            return json.dumps([lineage["scientificName"] for lineage in json_data["uniprot"]["lineages"]])
-        elif self is self.LINEAGE_SUPERKINGDOM:
-            superkingdoms = [lineage["scientificName"] for lineage in json_data["uniprot"]["lineages"] if lineage["rank"] == "superkingdom"]
-            if superkingdoms:
-                if len(superkingdoms) > 1:
-                    raise ValueError("Supplied json data has multiple superkingdoms within one lineage")
-                
-                return superkingdoms[0]
-            else:
-                return None
-        elif self is self.PROTEIN_IDS:
-            ref_properties = [ref["properties"] for ref in json_data["uniprot"]["uniProtKBCrossReferences"]]
-            pids = [property["value"] for ref in ref_properties for property in ref if property["key"] == "ProteinId"]
-            if pids:
-                return json.dumps(pids)
-            else:
-                return None
-        elif self is Field.PROTEOME_IDS:
-            pmids = [ref["id"] for ref in json_data["uniprot"]["uniProtKBCrossReferences"] if ref["database"] == "Proteomes"]
-            if pmids:
-                return json.dumps(pmids)
-            else:
-                return None
-        elif self is self.GENE_NAMES:
-            gene_names = [name for name in json_data["histoneDB"]["geneNames"]]
-            return json.dumps(gene_names)
-        elif self is self.PROTEIN_NAMES:
-            protein_names = [prot for prot in json_data["histoneDB"]["proteinNames"]]
-            return json.dumps(protein_names)
-        elif self is self.GENOME_IDS:
-            gmids = [ref["id"] for ref in json_data["uniprot"]["uniProtKBCrossReferences"] if ref["database"] == "EMBL"]
-            if gmids:
-                return json.dumps(gmids)
-            else:
-                return None
+    def value_from_db(self, value: any) -> any:
+        """ Decodes the value of the field in a database row, turning the JSON lists of values into lists. """
+        if self in self.multi_value_fields():
+            values = None if value is None else json.loads(value)
+            return [] if values is None else values
         else:
-            raise NotImplementedError(f"Not implemented for FieldType {self}.")
+            return value
     
 #***===== ResultCounts Class =====***#
 @dataclass(eq=False, frozen=True)
@@ -265,29 +263,25 @@ class ResultCounts:
     max_seq_len: int
 
     def __init__(self, results: Sequence[Union[Sequence, Mapping]], columns: Sequence[str]):
-        def find_superkingdom(lineage_json: str) -> Union[str, None]:
-            superkingdoms = [item["scientificName"] for item in json.loads(lineage_json) if item["rank"] == "superkingdom"]
-
-            if len(superkingdoms) == 0:
-                return None
-            elif len(superkingdoms) == 1:
-                return superkingdoms[0]
-            else:
-                raise ValueError("Multiple superkingdoms found.")              
+        """ Takes the rows of a facet query that groups the results by category and superkingdom, with the number of results ('total') and the maximum sequence length ('max_seq_len') per group. """
+        cat_idx = columns.index(Field.CATEGORY.db_name)
+        sup_idx = columns.index(Field.LINEAGE_SUPERKINGDOM.db_name)
+        total_idx = columns.index("total")
+        max_idx = columns.index("max_seq_len")
 
-        cat_idx = columns.index("category")
-        categories = Counter([res[cat_idx] for res in results])
+        categories = Counter()
+        superkingdoms = Counter()
 
-        lin_idx = columns.index("lineage_json")
-        superkingdoms = Counter([find_superkingdom(res[lin_idx]) for res in results])
+        for res in results:
+            categories[res[cat_idx]] += res[total_idx]
+            superkingdoms[res[sup_idx]] += res[total_idx]
 
         if len(results) == 0:
             max_seq_len = 0
         else:
-            seq_len_idx = columns.index("sequence_len")
-            max_seq_len = max([res[seq_len_idx] for res in results])
+            max_seq_len = max([res[max_idx] for res in results])
         
-        object.__setattr__(self, "total", len(results))
+        object.__setattr__(self, "total", sum([res[total_idx] for res in results]))
         object.__setattr__(self, "categories", categories)
         object.__setattr__(self, "superkingdoms", superkingdoms)
         object.__setattr__(self, "max_seq_len", max_seq_len)
@@ -0,0 +1,71 @@
+""" A module for testing the query cache. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb import database
+from prohistonedb.search.cache import QueryCache
+
+#*----- Standard library -----*#
+import os
+import sqlite3
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Tests =====***#
+def test_lru_eviction():
+    """ Make sure that the least recently used entry is evicted once the cache is full. """
+    cache = QueryCache(max_size=2)
+
+    cache.get_or_compute("v1", "a", lambda: 1)
+    cache.get_or_compute("v1", "b", lambda: 2)
+    assert cache.get_or_compute("v1", "a", lambda: None) == 1
+    cache.get_or_compute("v1", "c", lambda: 3)
+
+    assert cache.get_or_compute("v1", "b", lambda: "recomputed") == "recomputed"
+    assert cache.stats["evictions"] == 2
+    assert cache.stats["hits"] == 1
+
+def test_version_invalidation(tmp_path):
+    """ Make sure that entries of an old data version are discarded, including those on disk. """
+    cache = QueryCache(max_size=2, disk_path=tmp_path / "cache.sqlite")
+    cache.get_or_compute("v1", "a", lambda: 1)
+
+    # A second cache sharing the on-disk tier should find the entry.
+    other = QueryCache(max_size=2, disk_path=tmp_path / "cache.sqlite")
+    assert other.get_or_compute("v1", "a", lambda: None) == 1
+    assert other.stats["disk_hits"] == 1
+
+    assert cache.get_or_compute("v2", "a", lambda: 2) == 2
+    assert other.get_or_compute("v2", "a", lambda: None) == 2
+    assert cache.stats["invalidations"] == 1
+
+def test_version_swap(app, tmp_path):
+    """ Make sure that the version read through a connection to a replaced file isn't stored for the new file. """
+    db_path = tmp_path / "db.sqlite"
+    new_path = tmp_path / "new.sqlite"
+    app.config["DATABASE"] = str(db_path)
+
+    for (path, version) in [(db_path, "old"), (new_path, "new")]:
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE info (name TEXT, value TEXT)")
+        conn.execute("INSERT INTO info VALUES ('data_version', ?)", [version])
+        conn.commit()
+        conn.close()
+
+    with app.test_request_context():
+        # The connection of the request is opened before the database file is replaced.
+        database.get_db()
+        os.replace(new_path, db_path)
+        assert database.get_data_version() == "old"
+
+    with app.test_request_context():
+        assert database.get_data_version() == "new"
+
@@ -0,0 +1,48 @@
+""" A module for testing the database connections. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb.database.connections import SQLiteConnection, ConnectionPool, PoolTimeoutError
+
+#*----- Standard library -----*#
+import sqlite3
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Tests =====***#
+def test_pool_reuse(tmp_path):
+    """ Make sure that released connections are reused and that the pool waits for a free connection. """
+    path = tmp_path / "db.sqlite"
+    sqlite3.connect(path).close()
+
+    pool = ConnectionPool(lambda: SQLiteConnection(path, read_only=True), max_size=1, timeout=0.01)
+    connection = pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    pool.release(connection)
+    assert pool.acquire() is connection
+
+def test_pool_health_check(tmp_path):
+    """ Make sure that connections to a database file that has been replaced aren't reused. """
+    path = tmp_path / "db.sqlite"
+    sqlite3.connect(path).close()
+
+    pool = ConnectionPool(lambda: SQLiteConnection(path, read_only=True), max_size=1, timeout=0.01)
+    connection = pool.acquire()
+    pool.release(connection)
+
+    path.unlink()
+    sqlite3.connect(path).close()
+
+    assert not connection.is_healthy()
+    assert pool.acquire() is not connection
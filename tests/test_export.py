@@ -0,0 +1,52 @@
+""" A module for testing the file formats of the bulk exports of search results. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb.types import Field
+from prohistonedb.database.connections import SQLiteResult
+from prohistonedb.search import export
+
+#*----- Standard library -----*#
+import json
+import sqlite3
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Helper Functions =====***#
+def _results(rows: list[dict]) -> SQLiteResult:
+    """ Returns the rows as the result of an SQLite query with the columns of the exported fields. """
+    connection = sqlite3.connect(":memory:")
+    connection.row_factory = sqlite3.Row
+    columns = [field.db_name for field in export.EXPORT_FIELDS]
+
+    connection.execute(f"CREATE TABLE search ({', '.join(columns)})")
+    connection.executemany(f"INSERT INTO search VALUES ({', '.join(['?'] * len(columns))})", [[row.get(column) for column in columns] for row in rows])
+    return SQLiteResult(connection.execute("SELECT * FROM search"))
+
+#***===== Tests =====***#
+def test_export_formats():
+    """ Make sure that every format writes all rows and decodes the JSON lists of values. """
+    rows = [{"uniprot_id": f"A0A{i:06}", "sequence": "M" * 130, "protein_ids": json.dumps(["P1", "P2"]), "proteome_ids": None} for i in range(1201)]
+
+    fasta = "".join(export.export_results(_results(rows), "fasta"))
+    assert fasta.count(">") == 1201
+    assert fasta.startswith(">A0A000000\n" + "M" * 60 + "\n")
+
+    tsv = "".join(export.export_results(_results(rows), "tsv")).splitlines()
+    assert len(tsv) == 1202
+    assert tsv[1].split("\t")[export.EXPORT_FIELDS.index(Field.PROTEIN_IDS)] == "P1;P2"
+
+    ndjson = [json.loads(line) for line in "".join(export.export_results(_results(rows), "ndjson")).splitlines()]
+    assert ndjson[-1]["pid"] == ["P1", "P2"]
+    assert ndjson[-1]["pmid"] == []
+
+    with pytest.raises(ValueError):
+        export.export_results(_results(rows), "xml")
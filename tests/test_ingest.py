@@ -0,0 +1,124 @@
+""" A module for testing the incremental reading of the metadata files. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb import database
+from prohistonedb.database import ingest
+from prohistonedb.types import Field
+
+#*----- Standard library -----*#
+import bz2
+import json
+
+#*----- Flask & Flask Extenstions -----*#
+import flask
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Tests =====***#
+ENTRY = {
+    "uniprot": {
+        "organism": {"scientificName": "Thermococcus kodakarensis", "taxonId": 311400},
+        "sequence": {"value": "MAELPIAPV", "length": 9},
+        "lineages": [{"scientificName": "Archaea", "taxonId": 2157, "rank": "superkingdom", "hidden": False}],
+        "uniProtKBCrossReferences": [
+            {"database": "EMBL", "id": "AP006878", "properties": [{"key": "ProteinId", "value": "BAD85518.1"}]},
+            {"database": "Proteomes", "id": "UP000000536", "properties": [{"key": "Component", "value": "Chromosome"}]}
+        ]
+    },
+    "histoneDB": {
+        "category": "Nucleosomal", "multimer": {"monomer": True, "dimer": False, "nonamer": True},
+        "rankModel": {"monomer": {f"rank_{n}": f"model_{n}" for n in range(1, 6)}},
+        "PDB": [], "proteinNames": ["Histone"], "geneNames": ["hpkA"], "publications": [], "relPath": "TK"
+    }
+}
+
+ENTRIES = {f"A{i:05d}": {"uniprot": {"sequence": {"value": "MKR" * i}}, "histoneDB": {"PDB": [], "relPath": f"path/{i}"}} for i in range(10)}
+
+def test_object_batches(tmp_path, monkeypatch):
+    """ Make sure that the entries of a compressed JSON object are read in batches, even when they span multiple reads. """
+    monkeypatch.setattr(ingest, "_READ_SIZE", 4)
+    path = tmp_path / "db.json.bz2"
+    path.write_bytes(bz2.compress(json.dumps(ENTRIES, indent=2).encode()))
+
+    batches = list(ingest.read_entry_batches(path, batch_size=4))
+
+    assert [len(batch) for (batch, _) in batches] == [4, 4, 2]
+    assert dict(entry for (batch, _) in batches for entry in batch) == ENTRIES
+    assert batches[-1][1] == path.stat().st_size
+
+def test_lines(tmp_path):
+    """ Make sure that every line of a NDJSON file is read as an object of entries. """
+    path = tmp_path / "db.ndjson"
+    path.write_text("\n".join([json.dumps({uid: entry}) for (uid, entry) in ENTRIES.items()]) + "\n\n")
+
+    assert dict(entry for (batch, _) in ingest.read_entry_batches(path, batch_size=100) for entry in batch) == ENTRIES
+
+def test_unclosed_object(tmp_path):
+    """ Make sure that a truncated file isn't silently accepted. """
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps(ENTRIES)[:-20])
+
+    with pytest.raises(ValueError):
+        list(ingest.read_entry_batches(path, batch_size=100))
+
+def test_transform_batch():
+    """ Make sure that the single pass over an entry extracts the values of all the fields. """
+    transformed = ingest.transform_batch([("Q5JDH6", ENTRY)], kmer_size=8)
+    row = transformed.rows[0]
+
+    assert row[Field.ORGANISM.db_name] == "Thermococcus kodakarensis"
+    assert row[Field.ORGANISM_ID.db_name] == 311400
+    assert row[Field.SEQUENCE.db_name] == "MAELPIAPV"
+    assert row[Field.SEQUENCE_LEN.db_name] == 9
+    assert row[Field.CATEGORY.db_name] == "Nucleosomal"
+    assert row[Field.LINEAGE_SUPERKINGDOM.db_name] == "Archaea"
+    assert json.loads(row[Field.PROTEIN_IDS.db_name]) == ["BAD85518.1"]
+    assert json.loads(row[Field.PROTEOME_IDS.db_name]) == ["UP000000536"]
+    assert json.loads(row[Field.GENOME_IDS.db_name]) == ["AP006878"]
+    assert json.loads(row[Field.GENE_NAMES.db_name]) == ["hpkA"]
+    assert json.loads(row[Field.PROTEIN_NAMES.db_name]) == ["Histone"]
+
+    assert json.loads(row["ranks"]) == {"monomer": [1, 2, 3, 4, 5]}
+    assert sorted(transformed.kmers) == [("AELPIAPV", "Q5JDH6"), ("MAELPIAP", "Q5JDH6")]
+    assert transformed.lineages == {"311400": ENTRY["uniprot"]["lineages"]}
+    assert len(transformed.warnings) == 1
+
+def test_content_hashes():
+    """ Make sure that only the entries with new content are transformed. """
+    batch = [("Q5JDH6", ENTRY), ("Q5JDH7", ENTRY), ("Q5JDH8", ENTRY)]
+    hashes = {batch[0][0]: ingest.content_hash(batch[0][1]), batch[1][0]: "outdated"}
+
+    transformed = ingest.transform_batch(batch, kmer_size=None, content_hashes=hashes)
+
+    assert transformed.counts == {"unchanged": 1, "changed": 1, "added": 1}
+    assert [row[Field.UNIPROT_ID.db_name] for row in transformed.rows] == [batch[1][0], batch[2][0]]
+    assert transformed.uids == [uid for (uid, _) in batch]
+
+def test_unchanged_categories(app, tmp_path):
+    """ Make sure that only the categories that have been added or changed are counted, so an update without changes can be skipped. """
+    categories = {"Nucleosomal": {"preferredMultimer": "tetramer", "hasPage": True}, "Undefined": {"preferredMultimer": "monomer"}}
+    path = tmp_path / "categories.json"
+    path.write_text(json.dumps(categories))
+
+    with app.app_context():
+        flask.g.db = database.open_db(tmp_path / "db.sqlite")
+        database.init_db()
+
+        assert database.update_db_categories(path) == 2
+        version = database.get_data_version()
+        flask.g.pop("data_version")
+
+        assert database.update_db_categories(path) == 0
+        assert database.get_data_version() == version
+
+        categories["Undefined"]["shortName"] = "U"
+        path.write_text(json.dumps(categories))
+        assert database.update_db_categories(path) == 1
+
@@ -0,0 +1,47 @@
+""" A module for testing the compilation of motifs for motif searches. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb.search.motif import Motif
+
+#*----- Standard library -----*#
+import time
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Tests =====***#
+def test_prosite_motif():
+    """ Make sure that PROSITE patterns are compiled into the equivalent regular expression with their literal parts. """
+    motif = Motif("<C-x(2,4)-C-[ST]-{P}-H-H(2)-[DE>].")
+    assert motif.regex.pattern == "^C.{2,4}C[ST][^P]HH{2}(?:[DE]|$)"
+    assert motif.literals == ["C", "C", "HHH"]
+
+def test_regex_motif():
+    """ Make sure that restricted regular expressions are validated and that quantified amino acids aren't literal. """
+    motif = Motif("sal.{2}ADA?K{1,3}")
+    assert motif.regex.pattern == "SAL.{2}ADA?K{1,3}"
+    assert motif.literals == ["SAL", "AD", "K"]
+
+    for value in ["", "(SALAD)", "SA|LAD", "SAL**", "C-x(2,", "[ST"]:
+        with pytest.raises(ValueError):
+            Motif(value)
+
+def test_pathological_motif():
+    """ Make sure that motifs that could make matching take exponential time are rejected. """
+    for value in [".*.*.*.*.*.*.*.*.*.*.*.*Z", "SALAD+", "S.{2,}D", ".{0,50}.{0,50}Z", "x(0,50)-x(0,50)-Z", "x(51)", "C" * 101]:
+        with pytest.raises(ValueError):
+            Motif(value)
+
+    # The largest motifs that are allowed still fail quickly on a long sequence without a match.
+    motif = Motif(".{0,50}[^C]{0,4}Z")
+    start = time.perf_counter()
+    assert motif.regex.search("A" * 10000) is None
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,37 @@
+""" A module for testing the k-mer profiles and scores used by similarity searches. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb.database import profiles
+from prohistonedb.search.similarity import align_score
+
+#*----- Standard library -----*#
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+import numpy as np
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Tests =====***#
+def test_profiles_top():
+    """ Make sure that a sequence is most similar to itself and that non-standard amino acids are skipped. """
+    sequences = ["MKKLSALADAAAKRT", "GGGGGGGGGGGG", "MKKLSALADXAAKRT"]
+    matrix = np.array([profiles.sequence_profile(sequence, 2) for sequence in sequences])
+    all_profiles = profiles.Profiles(matrix, np.array(["A", "B", "C"]))
+
+    assert all_profiles.kmer_size == 2
+    assert np.linalg.norm(matrix[0]) == pytest.approx(1)
+    assert matrix[2].sum() < matrix[0].sum()
+    assert [uid for (uid, _) in all_profiles.top(sequences[0], 2)] == ["A", "C"]
+
+def test_align_score():
+    """ Make sure that local alignments are scored with the expected match, mismatch and gap scores. """
+    assert align_score("SALAD", "salad") == 10
+    assert align_score("SALAD", "XXSALXADXX") == 8
+    assert align_score("AAAA", "GGGG") == 0
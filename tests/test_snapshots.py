@@ -0,0 +1,122 @@
+""" A module for testing the replacement of the database file by a new build and rolling it back. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb import database
+
+#*----- Standard library -----*#
+import sqlite3
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Helper Functions =====***#
+def _create(path, name):
+    """ Creates a database file with a single entry that has the name as its UniProt ID. """
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE metadata (uniprot_id TEXT)")
+    conn.execute("INSERT INTO metadata VALUES (?)", [name])
+    conn.commit()
+    conn.close()
+
+def _read(path):
+    """ Returns the UniProt ID of the entry in a database file. """
+    conn = sqlite3.connect(path)
+    result = conn.execute("SELECT uniprot_id FROM metadata").fetchone()[0]
+    conn.close()
+    return result
+
+#***===== Tests =====***#
+def test_swap_and_rollback(app, tmp_path):
+    """ Make sure that a new database replaces the current one and that rolling back switches between both of them. """
+    db_path = tmp_path / "db.sqlite"
+    new_path = tmp_path / "new.sqlite"
+    app.config["DATABASE"] = str(db_path)
+
+    _create(db_path, "old")
+    _create(new_path, "new")
+
+    with app.app_context():
+        database.validate_db(new_path)
+        database.swap_db(new_path)
+        assert not new_path.exists()
+        assert _read(db_path) == "new"
+
+        database.rollback_db()
+        assert _read(db_path) == "old"
+
+        database.rollback_db()
+        assert _read(db_path) == "new"
+
+def test_validate_empty(app, tmp_path):
+    """ Make sure that a database without entries isn't accepted. """
+    db_path = tmp_path / "db.sqlite"
+    sqlite3.connect(db_path).execute("CREATE TABLE metadata (uniprot_id TEXT)").connection.close()
+
+    with app.app_context(), pytest.raises(ValueError):
+        database.validate_db(db_path)
+
+def test_swap_stale_wal(app, tmp_path):
+    """ Make sure that a write-ahead log next to the database file isn't applied to the file that replaces it. """
+    db_path = tmp_path / "db.sqlite"
+    new_path = tmp_path / "new.sqlite"
+    wal_path = tmp_path / "db.sqlite-wal"
+    app.config["DATABASE"] = str(db_path)
+
+    _create(db_path, "old")
+    _create(new_path, "new")
+
+    # Keep a copy of a non-empty log, which is removed when the connection closes.
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("UPDATE metadata SET uniprot_id = 'stale'")
+    conn.commit()
+    log = wal_path.read_bytes()
+    conn.close()
+
+    wal_path.write_bytes(log)
+    assert len(log) > 0
+
+    # A connection that still reads the file keeps the log from being removed when the checkpoint closes.
+    reader = sqlite3.connect(db_path)
+    assert reader.execute("SELECT uniprot_id FROM metadata").fetchone()[0] == "stale"
+
+    with app.app_context():
+        database.swap_db(new_path)
+
+    assert not wal_path.exists()
+    assert _read(db_path) == "new"
+    reader.close()
+
+def test_swap_open_reader(app, tmp_path):
+    """ Make sure that connections to the replaced file keep reading all of its data and that the new file has no write-ahead log. """
+    db_path = tmp_path / "db.sqlite"
+    new_path = tmp_path / "new.sqlite"
+    app.config["DATABASE"] = str(db_path)
+
+    _create(db_path, "old")
+    _create(new_path, "new")
+    sqlite3.connect(new_path).execute("PRAGMA journal_mode = WAL").connection.close()
+
+    reader = sqlite3.connect(db_path)
+    reader.execute("PRAGMA journal_mode = WAL")
+    reader.execute("INSERT INTO metadata VALUES ('kept')")
+    reader.commit()
+
+    with app.app_context():
+        database.swap_db(new_path)
+
+    assert reader.execute("SELECT COUNT(*) FROM metadata").fetchone()[0] == 2
+    reader.close()
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert conn.execute("SELECT uniprot_id FROM metadata").fetchone()[0] == "new"
+    conn.close()
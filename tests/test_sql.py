@@ -0,0 +1,161 @@
+""" A module for testing the generation of SQL queries from search filters. """
+#***===== Imports =====***#
+#*----- PyTest -----*#
+import pytest
+
+#*----- Main package imports -----*#
+from prohistonedb.types import Field
+from prohistonedb.search import sql
+from prohistonedb.database.models import FieldStatistics
+
+#*----- Standard library -----*#
+import sqlite3
+
+#*----- Flask & Flask Extenstions -----*#
+
+#*----- External packages -----*#
+
+#*----- Custom packages -----*#
+
+#*----- Local (test) imports -----*#
+
+#***===== Tests =====***#
+def test_fulltext_filter():
+    """ Make sure that text fields are searched through the full-text index when the value is long enough. """
+    condition = sql.Filter(Field.ORGANISM, 'Thermo"coccus')._sql_condition
+    assert "MATCH ?" in condition.str
+    assert condition.parameters == ['organism : "Thermo""coccus"']
+    assert condition.match_terms == condition.parameters
+
+    condition = sql.Filter(Field.ORGANISM, "Th")._sql_condition
+    assert "LIKE ?" in condition.str
+    assert condition.parameters == ["%Th%"]
+    assert condition.match_terms == []
+
+def test_kmer_condition():
+    """ Make sure that sequence searches intersect the posting lists of k-mers covering the value and verify the candidates. """
+    condition = sql._kmer_condition("saladas", 3)
+    assert condition.str.count("INTERSECT") == 2
+    assert condition.parameters == ["ADA", "DAS", "SAL", "%saladas%"]
+
+def test_member_filter():
+    """ Make sure that ID fields are matched against their separate values, with an optional prefix match. """
+    condition = sql.Filter(Field.PROTEIN_IDS, "BBI30458.1")._sql_condition
+    assert "value = ?" in condition.str
+    assert condition.parameters == ["protein_ids", "BBI30458.1"]
+
+    condition = sql.Filter(Field.PROTEIN_IDS, "BBI30*")._sql_condition
+    assert "value LIKE ?" in condition.str
+    assert condition.parameters == ["protein_ids", "BBI30%"]
+
+    # LIKE wildcards in the value are matched literally.
+    condition = sql.Filter(Field.PROTEIN_IDS, "_%*")._sql_condition
+    assert "ESCAPE" in condition.str
+    assert condition.parameters == ["protein_ids", "\\_\\%%"]
+
+    connection = sqlite3.connect(":memory:")
+    assert connection.execute(f"SELECT 'BBI30' LIKE ? ESCAPE '\\'", condition.parameters[1:]).fetchone()[0] == 0
+    assert connection.execute(f"SELECT '_%BBI30' LIKE ? ESCAPE '\\'", condition.parameters[1:]).fetchone()[0] == 1
+
+def test_ancestor_filter():
+    """ Make sure that lineage searches go through the taxonomy tables instead of the metadata table. """
+    condition = sql.Filter(Field.LINEAGE, "Archaea")._sql_condition
+    assert "taxon_closure" in condition.str
+    assert "name = ? COLLATE NOCASE" in condition.str
+    assert condition.parameters == ["Archaea", "Archaea"]
+
+    condition = sql.Filter(Field.LINEAGE, "Thermo_*")._sql_condition
+    assert "ESCAPE" in condition.str
+    assert condition.parameters == ["Thermo_*", "Thermo\\_%"]
+
+def test_any_filter(monkeypatch):
+    """ Make sure that an AnyFilter matches all full-text fields with a single full-text condition and sequences through the k-mer index. """
+    monkeypatch.setattr(sql, "get_kmer_size", lambda: 3)
+
+    condition = sql.AnyFilter("SALAD")._sql_condition
+    assert condition.str.count("MATCH ?") == 1
+    assert condition.match_terms == ['"SALAD"']
+    assert "sequence_kmers" in condition.str
+
+    with pytest.raises(ValueError):
+        sql.FullTextFilter("SA")
+
+    # IDs are still matched by any part of them, instead of only as a whole.
+    filters = {filter._field: filter for filter in sql.AnyFilter("BBI30")._filters}
+    assert isinstance(filters[Field.PROTEIN_IDS], sql.ContainsFilter)
+    assert filters[Field.PROTEIN_IDS]._sql_condition.parameters == ["protein_ids", "%BBI30%"]
+
+def test_cursor():
+    """ Make sure that cursors survive a round trip and that invalid cursors are rejected. """
+    values = [-1.25, "A0A000001"]
+    assert sql.decode_cursor(sql.encode_cursor(values)) == values
+
+    with pytest.raises(ValueError):
+        sql.decode_cursor("not a cursor")
+
+    with pytest.raises(ValueError):
+        sql.Query(after=sql.encode_cursor(values))
+
+def test_canonical_key():
+    """ Make sure that logically equal filters share a canonical key regardless of order and duplicates. """
+    a = sql.Filter(Field.CATEGORY_ID, "1")
+    b = sql.Filter(Field.CATEGORY_ID, "2")
+    c = sql.Filter(Field.ORGANISM, "Thermococcus")
+
+    assert sql.OrFilter([a, b])._canonical_key == sql.OrFilter([b, a, b])._canonical_key
+    assert sql.OrFilter([a, a])._canonical_key == a._canonical_key
+    assert sql.AndFilter([sql.AndFilter([a, b]), c])._canonical_key == sql.AndFilter([c, b, a])._canonical_key
+    assert sql.AndFilter([a, b])._canonical_key != sql.OrFilter([a, b])._canonical_key
+
+def test_selectivity():
+    """ Make sure that the selectivity of combined filters is estimated from the statistics of the fields. """
+    statistics = {
+        "cid": FieldStatistics("cid", 100, 100, 4, True),
+        "pid": FieldStatistics("pid", 100, 200, 100, True)
+    }
+    a = sql.Filter(Field.CATEGORY_ID, "1")
+    b = sql.Filter(Field.PROTEIN_IDS, "BBI30458.1")
+    c = sql.Filter(Field.ORGANISM, "Thermococcus")
+
+    assert a._selectivity(statistics) == 0.25
+    assert c._selectivity(statistics) == 1.0
+    assert sql.AndFilter([a, b])._selectivity(statistics) == pytest.approx(0.005)
+    assert sql.OrFilter([a, a, a, a, a])._selectivity(statistics) == 1.0
+
+def test_shared_sql():
+    """ Make sure that filters with the same structure share their SQL and only differ in their parameters. """
+    a = sql.AndFilter([sql.Filter(Field.CATEGORY_ID, "1"), sql.Filter(Field.ORGANISM_ID, "2157")])
+    b = sql.AndFilter([sql.Filter(Field.CATEGORY_ID, "2"), sql.Filter(Field.ORGANISM_ID, "2")])
+
+    assert a._sql_condition is a._sql_condition
+    assert a._sql_condition.str == b._sql_condition.str
+    assert a._sql_condition.parameters == ["1", "2157"]
+    assert b._sql_condition.parameters == ["2", "2"]
+
+def test_optimize():
+    """ Make sure that filter trees are simplified and equality filters on the same field are collapsed into a single IN condition. """
+    a = sql.Filter(Field.CATEGORY_ID, "1")
+    b = sql.Filter(Field.CATEGORY_ID, "2")
+    c = sql.Filter(Field.ORGANISM, "Thermococcus")
+
+    collapsed = sql.optimize(sql.OrFilter([a, sql.OrFilter([b, a]), c]))
+    assert isinstance(collapsed, sql.OrFilter)
+    assert isinstance(collapsed._filters[0], sql.InFilter)
+    assert collapsed._filters[0]._sql_condition.parameters == ['["1", "2"]']
+    assert collapsed._canonical_key == sql.OrFilter([a, b, c])._canonical_key
+
+    uids = [sql.Filter(Field.UNIPROT_ID, f"A0A{i:06}") for i in range(1000)]
+    assert len(sql.optimize(sql.OrFilter(uids))._sql_condition.parameters) == 1
+
+    assert sql.optimize(sql.OrFilter([a, sql.AndFilter([a, c])])) is a
+    assert sql.optimize(sql.NotFilter(sql.NotFilter(a))) is a
+    assert sql.NotFilter(a)._sql_condition.str == "NOT (category_id=?)"
+
+def test_lazy_scan():
+    """ Make sure that a query with a motif only scans the sequences once its SQL is needed, so cached results skip the scan. """
+    motif_filter = sql.MotifFilter("C-x(2)-C")
+    query = sql.Query(filter=sql.AndFilter([motif_filter, sql.Filter(Field.ORGANISM, "Thermococcus")]))
+
+    assert query.cache_key[1] == sql.AndFilter([sql.Filter(Field.ORGANISM, "Thermococcus"), motif_filter])._canonical_key
+    assert query._match_terms == ['organism : "Thermococcus"']
+    assert motif_filter._scans == {}